@@ -0,0 +1,71 @@
+"""Benchmark device lookup cost as the number of configured devices grows.
+
+Compares the indexed lookup used by the services with the linear scan over
+every config entry that it replaced.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_device_index
+"""
+from __future__ import annotations
+
+import random
+import timeit
+
+from custom_components.xiaozhi_api.registry import XiaozhiDeviceIndex
+
+DEVICE_COUNTS = (10, 100, 1000, 10000)
+LOOKUPS = 10000
+
+
+def _mac(number: int) -> str:
+    """Return a MAC address for a device number."""
+    raw = f"{number:012X}"
+    return ":".join(raw[i : i + 2] for i in range(0, 12, 2))
+
+
+def main() -> None:
+    """Run the benchmark and print ns per lookup."""
+    print(f"{'devices':>8} {'scan ns':>10} {'index ns':>10} {'index (mixed) ns':>17}")
+    for count in DEVICE_COUNTS:
+        entries = {
+            f"entry{number}": {"device_id": _mac(number)} for number in range(count)
+        }
+        index = XiaozhiDeviceIndex()
+        for entry_id, entry_data in entries.items():
+            index.add(entry_id, entry_data["device_id"], f"registry{entry_id}")
+
+        rng = random.Random(count)
+        keys = [_mac(rng.randrange(count)) for _ in range(LOOKUPS)]
+        mixed = [key.replace(":", "-").lower() for key in keys]
+
+        def scan(
+            keys: list[str] = keys, entries: dict[str, dict[str, str]] = entries
+        ) -> None:
+            for key in keys:
+                for entry_data in entries.values():
+                    if entry_data["device_id"] == key:
+                        break
+
+        def lookup(
+            keys: list[str] = keys, index: XiaozhiDeviceIndex = index
+        ) -> None:
+            for key in keys:
+                index.get(key)
+
+        def lookup_mixed(mixed: list[str] = mixed) -> None:
+            lookup(mixed)
+
+        scan_runs = 1 if count >= 1000 else 5
+        scan_ns = min(timeit.repeat(scan, number=1, repeat=scan_runs)) / LOOKUPS * 1e9
+        index_ns = min(timeit.repeat(lookup, number=1, repeat=5)) / LOOKUPS * 1e9
+        mixed_ns = (
+            min(timeit.repeat(lookup_mixed, number=1, repeat=5))
+            / LOOKUPS
+            * 1e9
+        )
+        print(f"{count:>8} {scan_ns:>10.0f} {index_ns:>10.0f} {mixed_ns:>17.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Relay failover, latency-based routing and hedging against local mock relays.
+
+Runs three scenarios, each with a primary and a fallback mock relay:
+
+- routing:  a slow primary and a fast fallback; commands should move to the
+            fallback once both have been measured
+- failover: the relay in use is stopped halfway; commands should continue on
+            the other one without errors
+- hedging:  a fast primary with a slow tail and a slower, steady fallback;
+            stop_music is sent with and without hedging to compare the tail
+
+and reports, per scenario and client configuration, the requests each relay
+received, errors, p50/p99 latency and the number of hedged commands.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_failover --commands 200
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from custom_components.xiaozhi_api.api import XiaozhiApiClient
+from custom_components.xiaozhi_api.const import CODE_OK
+from custom_components.xiaozhi_api.device import XiaozhiDevice
+from custom_components.xiaozhi_api.routing import XiaozhiRouter
+
+from .common import device_mac, percentile
+from .mock_relay import MockRelay
+
+API_KEY = "bench"
+
+
+def _report(
+    scenario: str,
+    client_name: str,
+    relays: tuple[MockRelay, MockRelay],
+    latencies: list[float],
+    errors: int,
+    hedged: int,
+) -> None:
+    """Print one result row; latencies are in seconds."""
+    primary, fallback = (sum(relay.requests.values()) for relay in relays)
+    print(
+        f"{scenario:>9} {client_name:>9} {primary:>8} {fallback:>9} {errors:>7} "
+        f"{percentile(latencies, 0.5) * 1000:>8.1f} "
+        f"{percentile(latencies, 0.99) * 1000:>8.1f} {hedged:>7}"
+    )
+
+
+async def _async_run(
+    scenario: str,
+    client_name: str,
+    relays: tuple[MockRelay, MockRelay],
+    commands: int,
+    router: bool,
+    hedge_delay: float = 0,
+    stop_halfway: MockRelay | None = None,
+) -> None:
+    """Send stop_music commands one after another through one client."""
+    urls = [await relay.async_start() for relay in relays]
+    latencies: list[float] = []
+    errors = 0
+    async with aiohttp.ClientSession() as session:
+        client = XiaozhiApiClient(
+            session,
+            urls[0],
+            API_KEY,
+            router=XiaozhiRouter(urls) if router else None,
+            hedge_delay=hedge_delay,
+        )
+        device = XiaozhiDevice(client, device_mac(0))
+        for number in range(commands):
+            if stop_halfway is not None and number == commands // 2:
+                await stop_halfway.async_stop()
+            start = time.monotonic()
+            result = await device.stop_music(force=True)
+            latencies.append(time.monotonic() - start)
+            if result.get("code") != CODE_OK:
+                errors += 1
+        _report(scenario, client_name, relays, latencies, errors, client.hedged)
+    for relay in relays:
+        await relay.async_stop()
+
+
+async def _async_main(args: argparse.Namespace) -> None:
+    """Run every scenario."""
+    # The failover scenario makes the single-URL client log every failure
+    logging.getLogger("custom_components.xiaozhi_api").setLevel(logging.CRITICAL)
+    print(
+        f"{'scenario':>9} {'client':>9} {'primary':>8} {'fallback':>9} "
+        f"{'errors':>7} {'p50 ms':>8} {'p99 ms':>8} {'hedged':>7}"
+    )
+    for name, router in (("single", False), ("routed", True)):
+        await _async_run(
+            "routing",
+            name,
+            (MockRelay(latency=0.1), MockRelay(latency=0.01)),
+            args.commands,
+            router,
+        )
+    for name, router in (("single", False), ("routed", True)):
+        primary = MockRelay()
+        await _async_run(
+            "failover",
+            name,
+            (primary, MockRelay(latency=0.01)),
+            args.commands,
+            router,
+            stop_halfway=primary,
+        )
+    for name, hedge_delay in (("routed", 0.0), ("hedged", args.hedge_delay)):
+        await _async_run(
+            "hedging",
+            name,
+            (
+                MockRelay(latency=0.01, slow_rate=0.05, slow_latency=1.0, seed=1),
+                MockRelay(latency=0.3),
+            ),
+            args.commands,
+            True,
+            hedge_delay=hedge_delay,
+        )
+
+
+def main() -> None:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commands", type=int, default=200)
+    parser.add_argument("--hedge-delay", type=float, default=0.1)
+    asyncio.run(_async_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
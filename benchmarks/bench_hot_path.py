@@ -0,0 +1,187 @@
+"""Per-call cost of the HTTP request path, before and after the lean path.
+
+Sends set_volume straight through the transport to a mock relay running in a
+separate process, so CPU time counts only the client side. For each path it
+reports CPU time per call (best and median of alternating rounds), the
+Python memory held per call during a concurrent burst (tracemalloc peak
+divided by the burst size), and what happens when the relay answers with a
+multi-megabyte JSON body that is not a result.
+
+"before" re-creates the previous path: a URL f-string, a new headers dict and
+ClientTimeout on every call, aiohttp's json= encoding and response.json().
+
+Run from the repository root:
+
+    python -m benchmarks.bench_hot_path --calls 1000 --rounds 5
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any
+
+import aiohttp
+
+from custom_components.xiaozhi_api.const import API_VOLUME, DEFAULT_REQUEST_TIMEOUT
+from custom_components.xiaozhi_api.transport import (
+    XiaozhiHttpTransport,
+    XiaozhiTransport,
+    orjson,
+)
+
+from .common import device_mac
+
+API_KEY = "bench"
+
+
+class LegacyHttpTransport(XiaozhiTransport):
+    """The request path as it was before the lean path."""
+
+    def __init__(self, session: aiohttp.ClientSession, api_key: str) -> None:
+        """Initialize the transport."""
+        self._session = session
+        self._api_key = api_key
+
+    def _get_headers(self) -> dict[str, str]:
+        """Get request headers."""
+        return {
+            "Authorization": f"Bearer {self._api_key}",
+            "Content-Type": "application/json",
+        }
+
+    async def async_request(
+        self,
+        base_url: str,
+        endpoint: str,
+        data: dict[str, Any],
+        timeout: aiohttp.ClientTimeout,
+    ) -> dict[str, Any]:
+        """Post a command and return the decoded response."""
+        async with self._session.post(
+            f"{base_url}{endpoint}",
+            json=data,
+            headers=self._get_headers(),
+            timeout=aiohttp.ClientTimeout(total=timeout.total),
+        ) as response:
+            if response.status >= 500:
+                response.raise_for_status()
+            return await response.json()
+
+
+@asynccontextmanager
+async def _async_relay(*args: str) -> AsyncIterator[str]:
+    """Run a mock relay in a child process and yield its API URL."""
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "benchmarks.mock_relay",
+        "--port",
+        "0",
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+    )
+    line = await process.stdout.readline()
+    try:
+        yield line.decode().split()[-1]
+    finally:
+        process.terminate()
+        await process.wait()
+
+
+async def _async_calls(
+    transport: XiaozhiTransport, url: str, calls: int
+) -> float:
+    """Return the CPU seconds one call takes, averaged over sequential calls."""
+    timeout = aiohttp.ClientTimeout(total=DEFAULT_REQUEST_TIMEOUT)
+    data = {"deviceId": device_mac(0), "volume": 50}
+    cpu = time.process_time()
+    for _ in range(calls):
+        await transport.async_request(url, API_VOLUME, data, timeout)
+    return (time.process_time() - cpu) / calls
+
+
+async def _async_memory(
+    transport: XiaozhiTransport, url: str, junk_url: str, concurrency: int
+) -> tuple[float, float, str]:
+    """Return the burst and junk-answer tracemalloc peaks and the junk outcome."""
+    timeout = aiohttp.ClientTimeout(total=DEFAULT_REQUEST_TIMEOUT)
+    data = {"deviceId": device_mac(0), "volume": 50}
+    tracemalloc.start()
+    await asyncio.gather(
+        *(
+            transport.async_request(url, API_VOLUME, data, timeout)
+            for _ in range(concurrency)
+        )
+    )
+    burst_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    try:
+        result: Any = await transport.async_request(
+            junk_url, API_VOLUME, data, timeout
+        )
+    except (aiohttp.ClientError, ValueError) as err:
+        outcome = f"raised {type(err).__name__}"
+    else:
+        outcome = (
+            f"code {result['code']}"
+            if isinstance(result, dict)
+            else f"returned {type(result).__name__}"
+        )
+    junk_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return burst_peak, junk_peak, outcome
+
+
+async def _async_main(args: argparse.Namespace) -> None:
+    """Run the benchmark for both paths."""
+    print(f"orjson: {'installed' if orjson is not None else 'not installed'}")
+    print(
+        f"{'path':>6} {'cpu us/call':>11} {'median':>7} {'KiB/in-flight':>13} "
+        f"{'junk MiB':>9}  junk outcome"
+    )
+    async with _async_relay() as url, _async_relay(
+        "--junk-size", str(args.junk_size)
+    ) as junk_url, aiohttp.ClientSession() as session:
+        transports: dict[str, XiaozhiTransport] = {
+            "before": LegacyHttpTransport(session, API_KEY),
+            "after": XiaozhiHttpTransport(session, API_KEY),
+        }
+        cpu: dict[str, list[float]] = {name: [] for name in transports}
+        for transport in transports.values():
+            await _async_calls(transport, url, 50)
+        # Alternate the paths so drift in the machine's load hits both
+        for _ in range(args.rounds):
+            for name, transport in transports.items():
+                cpu[name].append(await _async_calls(transport, url, args.calls))
+        for name, transport in transports.items():
+            burst_peak, junk_peak, outcome = await _async_memory(
+                transport, url, junk_url, args.concurrency
+            )
+            print(
+                f"{name:>6} {min(cpu[name]) * 1e6:>11.0f} "
+                f"{statistics.median(cpu[name]) * 1e6:>7.0f} "
+                f"{burst_peak / args.concurrency / 1024:>13.1f} "
+                f"{junk_peak / 1024 / 1024:>9.1f}  {outcome}"
+            )
+
+
+def main() -> None:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--junk-size", type=int, default=8_000_000)
+    asyncio.run(_async_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
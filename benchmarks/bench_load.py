@@ -0,0 +1,193 @@
+"""Load and latency benchmark against a local mock relay.
+
+Drives three layers at increasing device counts:
+
+- client:   XiaozhiDevice.set_volume over one shared XiaozhiApiClient
+- services: the xiaozhi_api.set_volume service fanned out to every device
+- entities: number.set_value on every volume entity
+
+and reports throughput, p50/p99 latency and peak RSS for each. The setup row
+shows how long adding the entries took and how many commands it sent.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_load --devices 1 10 100 1000 --latency 0.02
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+
+from custom_components.xiaozhi_api.api import XiaozhiApiClient
+from custom_components.xiaozhi_api.device import XiaozhiDevice
+from custom_components.xiaozhi_api.const import (
+    DOMAIN,
+    CONF_COALESCE_WINDOW,
+    CONF_RATE_LIMIT,
+)
+
+from .common import (
+    async_add_devices,
+    async_start_hass,
+    async_stop_hass,
+    device_mac,
+    peak_rss_mb,
+    percentile,
+)
+from .mock_relay import MockRelay
+
+API_KEY = "bench"
+
+
+def _report(
+    scenario: str, devices: int, latencies: list[float], elapsed: float
+) -> None:
+    """Print one result row; latencies are in seconds."""
+    print(
+        f"{scenario:>9} {devices:>7} {len(latencies):>8} "
+        f"{len(latencies) / elapsed:>9.0f} "
+        f"{percentile(latencies, 0.5) * 1000:>8.1f} "
+        f"{percentile(latencies, 0.99) * 1000:>8.1f} "
+        f"{peak_rss_mb():>8.1f}"
+    )
+
+
+async def _async_bench_client(url: str, devices: int, rounds: int) -> None:
+    """Send set_volume from every device concurrently."""
+    latencies: list[float] = []
+    async with aiohttp.ClientSession() as session:
+        client = XiaozhiApiClient(session, url, API_KEY)
+        targets = [
+            XiaozhiDevice(client, device_mac(number)) for number in range(devices)
+        ]
+
+        async def _async_run(device: XiaozhiDevice) -> None:
+            for volume in range(rounds):
+                start = time.monotonic()
+                await device.set_volume(volume)
+                latencies.append(time.monotonic() - start)
+
+        start = time.monotonic()
+        await asyncio.gather(*(_async_run(device) for device in targets))
+        _report("client", devices, latencies, time.monotonic() - start)
+
+
+async def _async_bench_services(
+    hass: HomeAssistant, devices: int, rounds: int
+) -> None:
+    """Call the set_volume service for all devices, once per round."""
+    latencies: list[float] = []
+    start = time.monotonic()
+    for volume in range(rounds):
+        response = await hass.services.async_call(
+            DOMAIN,
+            "set_volume",
+            {"device_id": "all", "volume": volume, "max_concurrency": 100},
+            blocking=True,
+            return_response=True,
+        )
+        latencies.extend(
+            result["latency_ms"] / 1000 for result in response["results"]
+        )
+    _report("services", devices, latencies, time.monotonic() - start)
+
+
+async def _async_bench_entities(
+    hass: HomeAssistant, devices: int, rounds: int
+) -> None:
+    """Set every volume entity through number.set_value, once per round."""
+    entity_ids = [
+        entry.entity_id
+        for entry in er.async_get(hass).entities.values()
+        if entry.platform == DOMAIN and entry.unique_id.endswith("_volume")
+    ]
+    latencies: list[float] = []
+
+    async def _async_set(entity_id: str, volume: int) -> None:
+        start = time.monotonic()
+        await hass.services.async_call(
+            "number",
+            "set_value",
+            {"entity_id": entity_id, "value": volume},
+            blocking=True,
+        )
+        latencies.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    for volume in range(rounds):
+        await asyncio.gather(
+            *(_async_set(entity_id, volume) for entity_id in entity_ids)
+        )
+    _report("entities", devices, latencies, time.monotonic() - start)
+
+
+async def _async_main(args: argparse.Namespace) -> None:
+    """Run every scenario for every device count."""
+    relay = MockRelay(
+        api_key=API_KEY,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle=args.throttle,
+    )
+    url = await relay.async_start()
+    print(
+        f"{'scenario':>9} {'devices':>7} {'requests':>8} {'req/s':>9} "
+        f"{'p50 ms':>8} {'p99 ms':>8} {'rss MiB':>8}"
+    )
+    try:
+        for devices in args.devices:
+            await _async_bench_client(url, devices, args.rounds)
+
+            hass = await async_start_hass()
+            sent = sum(relay.requests.values())
+            start = time.monotonic()
+            await async_add_devices(
+                hass,
+                url,
+                API_KEY,
+                devices,
+                {CONF_RATE_LIMIT: args.rate_limit, CONF_COALESCE_WINDOW: 0},
+            )
+            print(
+                f"{'setup':>9} {devices:>7} "
+                f"{sum(relay.requests.values()) - sent:>8} "
+                f"{time.monotonic() - start:>18.2f}s"
+            )
+            await _async_bench_services(hass, devices, args.rounds)
+            await _async_bench_entities(hass, devices, args.rounds)
+            await async_stop_hass(hass)
+    finally:
+        await relay.async_stop()
+    print(
+        f"relay: {sum(relay.requests.values())} requests, "
+        f"{relay.errors} errors, {relay.throttled} throttled"
+    )
+
+
+def main() -> None:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle", type=float, default=0.0)
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=0,
+        help="integration rate limit in requests per second (0 disables it)",
+    )
+    asyncio.run(_async_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
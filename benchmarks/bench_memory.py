@@ -0,0 +1,83 @@
+"""Memory and setup-time benchmark for many config entries.
+
+For each device count, starts a fresh Home Assistant, adds one config entry
+per device against a local mock relay and reports the total setup time and
+the memory allocated per device (integration objects, entities, registry
+entries and states), measured with tracemalloc in a second, traced run so
+tracing does not distort the timing.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_memory --devices 10 100 500
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from custom_components.xiaozhi_api.const import CONF_RATE_LIMIT
+
+from .common import async_add_devices, async_start_hass, async_stop_hass
+from .mock_relay import MockRelay
+
+API_KEY = "bench"
+
+
+async def _async_setup_time(url: str, devices: int) -> tuple[float, int]:
+    """Return the setup time and entity count for a number of entries."""
+    hass = await async_start_hass()
+    start = time.monotonic()
+    await async_add_devices(hass, url, API_KEY, devices, {CONF_RATE_LIMIT: 0})
+    elapsed = time.monotonic() - start
+    entities = len(hass.states.async_all())
+    await async_stop_hass(hass)
+    return elapsed, entities
+
+
+async def _async_setup_bytes(url: str, devices: int) -> int:
+    """Return the bytes still allocated after setting up the entries."""
+    hass = await async_start_hass()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    await async_add_devices(hass, url, API_KEY, devices, {CONF_RATE_LIMIT: 0})
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    await async_stop_hass(hass)
+    return sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+
+async def _async_main(args: argparse.Namespace) -> None:
+    """Run the benchmark for every device count."""
+    relay = MockRelay(api_key=API_KEY)
+    url = await relay.async_start()
+    print(
+        f"{'devices':>7} {'entities':>8} {'setup s':>8} "
+        f"{'ms/device':>9} {'KiB total':>10} {'bytes/device':>12}"
+    )
+    try:
+        for devices in args.devices:
+            elapsed, entities = await _async_setup_time(url, devices)
+            allocated = await _async_setup_bytes(url, devices)
+            print(
+                f"{devices:>7} {entities:>8} {elapsed:>8.2f} "
+                f"{elapsed * 1000 / devices:>9.2f} {allocated / 1024:>10.0f} "
+                f"{allocated / devices:>12.0f}"
+            )
+    finally:
+        await relay.async_stop()
+
+
+def main() -> None:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, nargs="+", default=[10, 100, 500])
+    asyncio.run(_async_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""HTTP versus WebSocket transport against a local mock relay.
+
+Sends set_volume from many devices at once through one shared client, first
+over the HTTP transport and then over the multiplexed WebSocket transport,
+and reports throughput, p50/p99 latency, CPU time per command and the number
+of connections the relay saw. The mock relay runs in the same process, so
+CPU time includes its side of every request.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_transport --devices 10 100 --rounds 20
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from custom_components.xiaozhi_api.api import XiaozhiApiClient
+from custom_components.xiaozhi_api.device import XiaozhiDevice
+from custom_components.xiaozhi_api.transport import (
+    XiaozhiTransport,
+    XiaozhiWebSocketTransport,
+)
+
+from .common import device_mac, percentile
+from .mock_relay import MockRelay
+
+API_KEY = "bench"
+
+
+async def _async_bench(
+    name: str, latency: float, devices: int, rounds: int
+) -> None:
+    """Run every device's commands over one transport and print a row."""
+    relay = MockRelay(latency=latency)
+    url = await relay.async_start()
+    latencies: list[float] = []
+    async with aiohttp.ClientSession() as session:
+        transport: XiaozhiTransport | None = None
+        if name == "websocket":
+            transport = XiaozhiWebSocketTransport(session, API_KEY)
+        client = XiaozhiApiClient(session, url, API_KEY, transport=transport)
+        targets = [
+            XiaozhiDevice(client, device_mac(number)) for number in range(devices)
+        ]
+
+        async def _async_run(device: XiaozhiDevice) -> None:
+            for volume in range(rounds):
+                start = time.monotonic()
+                await device.set_volume(volume)
+                latencies.append(time.monotonic() - start)
+
+        cpu = time.process_time()
+        start = time.monotonic()
+        await asyncio.gather(*(_async_run(device) for device in targets))
+        elapsed = time.monotonic() - start
+        cpu = time.process_time() - cpu
+        await client.transport.async_close()
+    await relay.async_stop()
+
+    commands = len(latencies)
+    print(
+        f"{name:>9} {devices:>7} {commands:>8} {commands / elapsed:>9.0f} "
+        f"{percentile(latencies, 0.5) * 1000:>8.1f} "
+        f"{percentile(latencies, 0.99) * 1000:>8.1f} "
+        f"{cpu * 1e6 / commands:>8.0f} {len(relay.peers):>5}"
+    )
+
+
+async def _async_main(args: argparse.Namespace) -> None:
+    """Run the benchmark for every device count and transport."""
+    print(
+        f"{'transport':>9} {'devices':>7} {'commands':>8} {'cmd/s':>9} "
+        f"{'p50 ms':>8} {'p99 ms':>8} {'cpu us':>8} {'conns':>5}"
+    )
+    for devices in args.devices:
+        for name in ("http", "websocket"):
+            await _async_bench(name, args.latency, devices, args.rounds)
+
+
+def main() -> None:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0)
+    asyncio.run(_async_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
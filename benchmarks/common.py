@@ -0,0 +1,115 @@
+"""Shared helpers for the benchmark scripts."""
+from __future__ import annotations
+
+from collections.abc import Sequence
+import os
+from pathlib import Path
+import resource
+import shutil
+import tempfile
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntries, ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import (
+    area_registry as ar,
+    device_registry as dr,
+    entity as entity_helper,
+    entity_registry as er,
+    restore_state,
+)
+
+from custom_components.xiaozhi_api.const import (
+    DOMAIN,
+    CONF_API_KEY,
+    CONF_API_URL,
+    CONF_DEVICE_ID,
+    CONF_DEVICE_NAME,
+)
+
+COMPONENT_DIR = Path(__file__).resolve().parent.parent / "custom_components" / DOMAIN
+
+
+def device_mac(number: int) -> str:
+    """Return a MAC address for a device number."""
+    raw = f"{number:012X}"
+    return ":".join(raw[i : i + 2] for i in range(0, 12, 2))
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    """Return the nearest-rank percentile of the samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_rss_mb() -> float:
+    """Return the peak resident set size of this process in MiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def async_start_hass() -> HomeAssistant:
+    """Start a minimal Home Assistant that can load this integration.
+
+    The instance lives in a throwaway config directory that links the
+    integration under custom_components/.
+    """
+    config_dir = tempfile.mkdtemp(prefix="xiaozhi_bench_")
+    os.makedirs(os.path.join(config_dir, "custom_components"))
+    os.symlink(COMPONENT_DIR, os.path.join(config_dir, "custom_components", DOMAIN))
+
+    # Imported here: importing the loader before the core is circular.
+    from homeassistant import loader  # pylint: disable=import-outside-toplevel
+
+    hass = HomeAssistant(config_dir)
+    hass.config.skip_pip = True
+    if hasattr(loader, "async_setup"):
+        loader.async_setup(hass)
+    entity_helper.async_setup(hass)
+    await restore_state.async_load(hass)
+    await ar.async_load(hass)
+    await dr.async_load(hass)
+    await er.async_load(hass)
+    hass.config_entries = ConfigEntries(hass, {})
+    await hass.config_entries.async_initialize()
+    await hass.async_start()
+    return hass
+
+
+async def async_stop_hass(hass: HomeAssistant) -> None:
+    """Stop Home Assistant and remove its config directory."""
+    await hass.async_stop()
+    shutil.rmtree(hass.config.config_dir, ignore_errors=True)
+
+
+async def async_add_devices(
+    hass: HomeAssistant,
+    api_url: str,
+    api_key: str,
+    count: int,
+    options: dict[str, Any] | None = None,
+) -> list[ConfigEntry]:
+    """Add and set up one config entry per simulated device."""
+    entries = []
+    for number in range(count):
+        mac = device_mac(number)
+        entry = ConfigEntry(
+            version=1,
+            minor_version=1,
+            domain=DOMAIN,
+            title=mac,
+            data={
+                CONF_API_URL: api_url,
+                CONF_API_KEY: api_key,
+                CONF_DEVICE_ID: mac,
+                CONF_DEVICE_NAME: f"Bench {number}",
+            },
+            source="user",
+            options=options or {},
+            unique_id=mac,
+        )
+        await hass.config_entries.async_add(entry)
+        entries.append(entry)
+    await hass.async_block_till_done()
+    return entries
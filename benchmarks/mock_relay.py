@@ -0,0 +1,252 @@
+"""Local stand-in for the Xiaozhi relay.
+
+Implements every command endpoint the integration uses, over HTTP and over
+the multiplexed WebSocket transport, with configurable latency, slow-request
+tail, error rate and throttling, so the client can be measured without a
+real relay or device.
+
+Run standalone and point a config entry's API URL at the printed address:
+
+    python -m benchmarks.mock_relay --port 8099 --latency 0.05 --error-rate 0.01
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections import Counter
+import random
+import time
+from typing import Any
+
+from aiohttp import WSMsgType, web
+
+from custom_components.xiaozhi_api.const import (
+    API_BRIGHTNESS,
+    API_NEXT_MUSIC,
+    API_PLAY_MUSIC,
+    API_PLAYER_MODE,
+    API_PREV_MUSIC,
+    API_RESUME_MUSIC,
+    API_SEND_CHAT,
+    API_SEND_IDLE,
+    API_STOP_MUSIC,
+    API_THEME,
+    API_VOLUME,
+    API_WEBSOCKET,
+)
+
+BASE_PATH = "/Xiaozhi"
+ENDPOINTS = (
+    API_SEND_CHAT,
+    API_SEND_IDLE,
+    API_PLAY_MUSIC,
+    API_STOP_MUSIC,
+    API_RESUME_MUSIC,
+    API_NEXT_MUSIC,
+    API_PREV_MUSIC,
+    API_PLAYER_MODE,
+    API_VOLUME,
+    API_BRIGHTNESS,
+    API_THEME,
+)
+
+
+class MockRelay:
+    """Xiaozhi relay stand-in served by aiohttp."""
+
+    def __init__(
+        self,
+        *,
+        api_key: str = "bench",
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        throttle: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 1.0,
+        junk_size: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int | None = None,
+    ) -> None:
+        """Initialize the relay.
+
+        latency and jitter are in seconds; throttle is the sustained number of
+        requests per second accepted before answering 429 (0 disables it). A
+        slow_rate fraction of requests takes slow_latency seconds longer. With
+        junk_size, HTTP commands are answered with a JSON array of about that
+        many bytes instead of a result, like a misbehaving proxy.
+        """
+        self.api_key = api_key
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle = throttle
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.junk_size = junk_size
+        self.requests: Counter[str] = Counter()
+        self.throttled = 0
+        self.errors = 0
+        self.peers: set[Any] = set()
+        self._host = host
+        self._port = port
+        self._random = random.Random(seed)
+        self._tokens = throttle
+        self._updated = time.monotonic()
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+
+        self.app = web.Application()
+        for endpoint in ENDPOINTS:
+            self.app.router.add_post(f"{BASE_PATH}{endpoint}", self._async_handle)
+        self.app.router.add_get(f"{BASE_PATH}{API_WEBSOCKET}", self._async_handle_ws)
+
+    async def async_start(self) -> str:
+        """Start serving and return the API URL."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self._host, self._port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{self._host}:{port}{BASE_PATH}"
+        return self.url
+
+    async def async_stop(self) -> None:
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _allow(self) -> bool:
+        """Take a throttle token if one is available."""
+        if self.throttle <= 0:
+            return True
+        now = time.monotonic()
+        self._tokens = min(
+            self.throttle, self._tokens + (now - self._updated) * self.throttle
+        )
+        self._updated = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _seen(self, request: web.Request) -> None:
+        """Count the connection a request arrived on."""
+        if request.transport is not None:
+            self.peers.add(request.transport.get_extra_info("peername"))
+
+    def _authorized(self, request: web.Request) -> bool:
+        """Return True if the request carries the relay's API key."""
+        return request.headers.get("Authorization") == f"Bearer {self.api_key}"
+
+    async def _async_answer(
+        self, endpoint: str, data: dict[str, Any]
+    ) -> tuple[int, dict[str, Any]]:
+        """Return the HTTP status and body the relay answers a command with."""
+        self.requests[endpoint] += 1
+        if not self._allow():
+            self.throttled += 1
+            return 429, {"code": 429, "message": "Too many requests"}
+
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if self.slow_rate and self._random.random() < self.slow_rate:
+            delay += self.slow_latency
+        if delay:
+            await asyncio.sleep(delay)
+        if not data.get("deviceId"):
+            return 200, {"code": 400, "message": "deviceId is required"}
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            return 200, {"code": 500, "message": "Simulated failure"}
+        return 200, {"code": 200, "message": "success"}
+
+    async def _async_handle(self, request: web.Request) -> web.Response:
+        """Answer a command the way the relay does."""
+        endpoint = request.path[len(BASE_PATH) :]
+        self._seen(request)
+        if not self._authorized(request):
+            self.requests[endpoint] += 1
+            return web.json_response({"code": 401, "message": "Unauthorized"})
+        status, body = await self._async_answer(endpoint, await request.json())
+        if self.junk_size:
+            return web.Response(
+                body=b"[" + b"0," * (self.junk_size // 2) + b"0]",
+                content_type="application/json",
+            )
+        return web.json_response(body, status=status)
+
+    async def _async_handle_ws(self, request: web.Request) -> web.StreamResponse:
+        """Answer commands multiplexed over one WebSocket, each as it completes."""
+        if not self._authorized(request):
+            return web.json_response(
+                {"code": 401, "message": "Unauthorized"}, status=401
+            )
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+        self._seen(request)
+        tasks: set[asyncio.Task[None]] = set()
+
+        async def _async_reply(message: dict[str, Any]) -> None:
+            if message.get("endpoint") not in ENDPOINTS:
+                body = {"code": 404, "message": "Unknown endpoint"}
+            else:
+                _, body = await self._async_answer(
+                    message["endpoint"], message.get("data") or {}
+                )
+            if not socket.closed:
+                await socket.send_json({"id": message.get("id"), **body})
+
+        async for message in socket:
+            if message.type == WSMsgType.TEXT:
+                task = asyncio.create_task(_async_reply(message.json()))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        for task in tasks:
+            task.cancel()
+        return socket
+
+
+async def _async_serve(args: argparse.Namespace) -> None:
+    """Serve until interrupted."""
+    relay = MockRelay(
+        api_key=args.api_key,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle=args.throttle,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        junk_size=args.junk_size,
+        host=args.host,
+        port=args.port,
+    )
+    print(f"Mock relay listening on {await relay.async_start()}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await relay.async_stop()
+
+
+def main() -> None:
+    """Run the mock relay from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--api-key", default="bench")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--junk-size", type=int, default=0)
+    try:
+        asyncio.run(_async_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,100 @@
 """The Xiaozhi API integration."""
 from __future__ import annotations
 
+from functools import partial
 import logging
-from typing import Any
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant, ServiceCall
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr
 
 from .const import (
     DOMAIN,
+    DATA_DEVICE_INDEX,
+    DATA_RAMPS,
+    DATA_RELAYS,
     CONF_API_URL,
     CONF_API_KEY,
     CONF_DEVICE_ID,
-    PLAYER_MODES,
+    CONF_DEVICE_NAME,
+    CONF_COALESCE_WINDOW,
+    CONF_FIRE_AND_FORGET,
+    DEFAULT_COALESCE_WINDOW,
+    EVENT_COMMAND_COMPLETED,
 )
-from .api import XiaozhiApiClient
+from .coalescer import XiaozhiWriteCoalescer
+from .device import XiaozhiDevice
+from .dispatcher import XiaozhiCommandDispatcher
+from .ramp import XiaozhiRampScheduler
+from .registry import XiaozhiDeviceIndex
+from .relay import (
+    RelayKey,
+    XiaozhiRelay,
+    async_acquire_relay,
+    async_release_relay,
+    relay_key,
+    relay_options,
+)
+from .services import async_setup_services
+from .store import XiaozhiStateStore
 
 _LOGGER = logging.getLogger(__name__)
 
 PLATFORMS: list[Platform] = [
+    Platform.BINARY_SENSOR,
     Platform.BUTTON,
     Platform.NUMBER,
     Platform.SELECT,
+    Platform.SENSOR,
     Platform.TEXT,
 ]
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    """Set up Xiaozhi API from a config entry."""
-    session = async_get_clientsession(hass)
-
-    client = XiaozhiApiClient(
-        session=session,
-        api_url=entry.data[CONF_API_URL],
-        api_key=entry.data[CONF_API_KEY],
-        device_id=entry.data[CONF_DEVICE_ID],
+    """Set up Xiaozhi API from a config entry.
+
+    Setup makes no network requests; entities start from the stored state and
+    the relay is checked in the background.
+    """
+    relay = async_acquire_relay(hass, entry)
+    await relay.async_load()
+    device_id = entry.data[CONF_DEVICE_ID]
+
+    device = XiaozhiDevice(
+        relay.client,
+        device_id,
+        entry.data.get(CONF_DEVICE_NAME),
+        relay=relay,
+        dispatcher=XiaozhiCommandDispatcher(),
+        coalescer=XiaozhiWriteCoalescer(
+            entry.options.get(CONF_COALESCE_WINDOW, DEFAULT_COALESCE_WINDOW)
+        ),
+        outbox=relay.outbox,
+        ramps=hass.data.setdefault(DATA_RAMPS, XiaozhiRampScheduler()),
+        fire_and_forget=entry.options.get(CONF_FIRE_AND_FORGET, False),
+        state=relay.state_store.device(device_id),
+        on_state_change=relay.state_store.async_schedule_save,
+        on_command=partial(hass.bus.async_fire, EVENT_COMMAND_COMPLETED),
+    )
+    relay.devices[device_id] = device
+    device.music_queue.async_start(device.async_play_queued)
+
+    device_entry = dr.async_get(hass).async_get_or_create(
+        config_entry_id=entry.entry_id, **device.device_info
     )
 
     hass.data.setdefault(DOMAIN, {})
-    hass.data[DOMAIN][entry.entry_id] = {
-        "client": client,
-        "device_id": entry.data[CONF_DEVICE_ID],
-    }
+    hass.data[DOMAIN][entry.entry_id] = device
+    hass.data.setdefault(DATA_DEVICE_INDEX, XiaozhiDeviceIndex()).add(
+        entry.entry_id, device_id, device_entry.id
+    )
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
 
     # Register services
-    await _async_setup_services(hass)
+    await async_setup_services(hass)
 
     return True
 
@@ -56,64 +102,52 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
-        hass.data[DOMAIN].pop(entry.entry_id)
+        device: XiaozhiDevice = hass.data[DOMAIN].pop(entry.entry_id)
+        device.shutdown()
+        if device.relay is not None:
+            device.relay.devices.pop(device.device_id, None)
+        hass.data[DATA_DEVICE_INDEX].remove(entry.entry_id)
+        await async_release_relay(hass, entry)
 
     return unload_ok
 
 
-async def _async_setup_services(hass: HomeAssistant) -> None:
-    """Set up services for Xiaozhi API."""
-
-    async def _get_client(call: ServiceCall) -> XiaozhiApiClient | None:
-        """Get client from service call."""
-        device_id = call.data.get("device_id")
-        for entry_data in hass.data[DOMAIN].values():
-            if entry_data["device_id"] == device_id:
-                return entry_data["client"]
-        _LOGGER.error("Device not found: %s", device_id)
-        return None
-
-    async def send_chat_message(call: ServiceCall) -> None:
-        """Send chat message service."""
-        client = await _get_client(call)
-        if client:
-            await client.send_chat_message(call.data["message"])
-
-    async def play_music(call: ServiceCall) -> None:
-        """Play music service."""
-        client = await _get_client(call)
-        if client:
-            await client.play_music(call.data["keywords"])
-
-    async def set_volume(call: ServiceCall) -> None:
-        """Set volume service."""
-        client = await _get_client(call)
-        if client:
-            await client.set_volume(call.data["volume"])
-
-    async def set_brightness(call: ServiceCall) -> None:
-        """Set brightness service."""
-        client = await _get_client(call)
-        if client:
-            await client.set_brightness(call.data["brightness"])
-
-    async def set_player_mode(call: ServiceCall) -> None:
-        """Set player mode service."""
-        client = await _get_client(call)
-        if client:
-            mode = PLAYER_MODES.get(call.data["mode"], call.data["mode"])
-            await client.set_player_mode(mode)
-
-    async def set_theme(call: ServiceCall) -> None:
-        """Set theme service."""
-        client = await _get_client(call)
-        if client:
-            await client.set_theme(call.data["theme"])
-
-    if not hass.services.has_service(DOMAIN, "send_chat_message"):
-        hass.services.async_register(DOMAIN, "send_chat_message", send_chat_message)
-        hass.services.async_register(DOMAIN, "play_music", play_music)
-        hass.services.async_register(DOMAIN, "set_volume", set_volume)
-        hass.services.async_register(DOMAIN, "set_brightness", set_brightness)
-        hass.services.async_register(DOMAIN, "set_player_mode", set_player_mode)
-        hass.services.async_register(DOMAIN, "set_theme", set_theme)
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Forget the stored state of a removed device."""
+    key = relay_key(entry.data[CONF_API_URL], entry.data[CONF_API_KEY])
+    relays: dict[RelayKey, XiaozhiRelay] = hass.data.get(DATA_RELAYS, {})
+    if (relay := relays.get(key)) is not None:
+        store = relay.state_store
+    else:
+        store = XiaozhiStateStore(hass, *key)
+    await store.async_remove_device(entry.data[CONF_DEVICE_ID])
+
+
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the entry when its options change.
+
+    Relay-wide options are shared by every entry on the relay. When they
+    change, they are copied to the other entries and all of them are
+    reloaded together, so the relay is rebuilt with the new settings.
+    """
+    key = relay_key(entry.data[CONF_API_URL], entry.data[CONF_API_KEY])
+    relay: XiaozhiRelay | None = hass.data.get(DATA_RELAYS, {}).get(key)
+    options = relay_options(entry.options)
+    if relay is None or relay.options == options:
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+    entries = [
+        other
+        for other in hass.config_entries.async_entries(DOMAIN)
+        if other.entry_id in relay.entry_ids or other.entry_id == entry.entry_id
+    ]
+    for other in entries:
+        await hass.config_entries.async_unload(other.entry_id)
+    for other in entries:
+        if other.entry_id != entry.entry_id:
+            # Unloaded, so this does not trigger the entry's own listener
+            hass.config_entries.async_update_entry(
+                other, options={**other.options, **options}
+            )
+        await hass.config_entries.async_setup(other.entry_id)
+
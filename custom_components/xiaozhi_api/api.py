@@ -1,147 +1,315 @@
 """API client for Xiaozhi devices."""
 from __future__ import annotations
 
+import asyncio
 import aiohttp
 import logging
-from typing import Any
+import random
+import time
+from typing import TYPE_CHECKING, Any
 
+from .breaker import XiaozhiCircuitBreaker
+from .metrics import XiaozhiMetrics
+from .ratelimit import XiaozhiRateLimiter
+from .routing import XiaozhiRouter
+from .tracing import XiaozhiTracer
+from .transport import XiaozhiHttpTransport, XiaozhiTransport
 from .const import (
-    API_SEND_CHAT,
     API_SEND_IDLE,
-    API_PLAY_MUSIC,
-    API_STOP_MUSIC,
-    API_RESUME_MUSIC,
-    API_NEXT_MUSIC,
-    API_PREV_MUSIC,
-    API_PLAYER_MODE,
-    API_VOLUME,
-    API_BRIGHTNESS,
-    API_THEME,
+    API_TIMEOUTS,
+    DEFAULT_REQUEST_TIMEOUT,
+    HEDGED_ENDPOINTS,
+    IDEMPOTENT_ENDPOINTS,
+    RETRY_ATTEMPTS,
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_MAX,
+    RELAY_PROBE_TIMEOUT,
+    CODE_OK,
+    CODE_CLIENT_ERROR,
+    CODE_TIMEOUT,
+    CODE_CIRCUIT_OPEN,
+    CODE_UNREACHABLE,
+    OVERLOAD_CODES,
 )
 
+if TYPE_CHECKING:
+    from .broadcast import XiaozhiBarrier
+
 _LOGGER = logging.getLogger(__name__)
 
+_DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=DEFAULT_REQUEST_TIMEOUT)
+_TIMEOUTS = {
+    endpoint: aiohttp.ClientTimeout(total=total)
+    for endpoint, total in API_TIMEOUTS.items()
+}
+_PROBE_TIMEOUT = aiohttp.ClientTimeout(total=RELAY_PROBE_TIMEOUT)
+
 
 class XiaozhiApiClient:
-    """API client for Xiaozhi devices."""
+    """API client for a Xiaozhi relay account, shared by all of its devices."""
 
     def __init__(
         self,
         session: aiohttp.ClientSession,
         api_url: str,
         api_key: str,
-        device_id: str,
+        breaker: XiaozhiCircuitBreaker | None = None,
+        limiter: XiaozhiRateLimiter | None = None,
+        metrics: XiaozhiMetrics | None = None,
+        router: XiaozhiRouter | None = None,
+        hedge_delay: float = 0,
+        transport: XiaozhiTransport | None = None,
+        tracer: XiaozhiTracer | None = None,
     ) -> None:
-        """Initialize the API client."""
-        self._session = session
-        self._api_url = api_url.rstrip("/")
-        self._api_key = api_key
-        self._device_id = device_id
-
-    def _get_headers(self) -> dict[str, str]:
-        """Get request headers."""
-        return {
-            "Authorization": f"Bearer {self._api_key}",
-            "Content-Type": "application/json",
-        }
+        """Initialize the API client.
 
-    async def _request(self, endpoint: str, data: dict[str, Any]) -> dict[str, Any]:
-        """Make API request."""
-        url = f"{self._api_url}{endpoint}"
-        try:
-            async with self._session.post(
-                url, json=data, headers=self._get_headers()
-            ) as response:
-                result = await response.json()
-                if result.get("code") != 200:
+        Without a router every request goes to api_url. With one, requests go
+        to the URL it picks, and hedged commands are also sent to a second
+        URL when the first has not answered within hedge_delay seconds.
+        Commands travel as HTTP requests on the session unless another
+        transport is given. A tracer must be the one attached to the
+        session; it then times every command.
+        """
+        self.transport = (
+            XiaozhiHttpTransport(session, api_key) if transport is None else transport
+        )
+        self.api_url = api_url.rstrip("/")
+        self.breaker = breaker
+        self.limiter = limiter
+        self.metrics = XiaozhiMetrics() if metrics is None else metrics
+        self.router = router
+        self.hedge_delay = hedge_delay
+        self.hedged = 0
+        self.tracer = tracer
+
+    async def async_send(
+        self,
+        device_id: str,
+        endpoint: str,
+        data: dict[str, Any],
+        device_metrics: XiaozhiMetrics | None = None,
+        barrier: XiaozhiBarrier | None = None,
+    ) -> dict[str, Any]:
+        """Send a command for a device to the relay, tracing it if enabled."""
+        if self.tracer is None:
+            return await self._async_send(
+                device_id, endpoint, data, device_metrics, barrier
+            )
+        with self.tracer.trace(device_id, endpoint) as trace:
+            result = await self._async_send(
+                device_id, endpoint, data, device_metrics, barrier
+            )
+            trace.code = result.get("code")
+        return result
+
+    async def async_probe(self, device_id: str) -> dict[str, Any]:
+        """Check the relay URL and key by sending a device the idle command.
+
+        Meant for a device being added, like the original connection test;
+        a command without a device id is never sent, as the relay might
+        apply it to every device on the account. Bypasses the breaker,
+        limiter and retries. Raises asyncio.TimeoutError or
+        aiohttp.ClientError when the relay gives no answer.
+        """
+        return await self.transport.async_request(
+            self.api_url, API_SEND_IDLE, {"deviceId": device_id}, _PROBE_TIMEOUT
+        )
+
+    async def _async_send(
+        self,
+        device_id: str,
+        endpoint: str,
+        data: dict[str, Any],
+        device_metrics: XiaozhiMetrics | None = None,
+        barrier: XiaozhiBarrier | None = None,
+    ) -> dict[str, Any]:
+        """Send a command for a device to the relay.
+
+        Idempotent commands are retried with jittered exponential backoff.
+        Transport failures are reported to the relay's circuit breaker, which
+        fails requests fast while it is open. Every attempt waits for a token
+        from the relay's rate limiter; its outcome feeds the limiter and the
+        device and relay metrics. With a barrier, the first attempt waits
+        for the rest of its broadcast just before it is sent.
+        """
+        timeout = _TIMEOUTS.get(endpoint, _DEFAULT_TIMEOUT)
+        attempts = RETRY_ATTEMPTS if endpoint in IDEMPOTENT_ENDPOINTS else 1
+        result: dict[str, Any] = {}
+
+        for attempt in range(attempts):
+            if attempt:
+                await asyncio.sleep(
+                    random.uniform(
+                        0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2**attempt)
+                    )
+                )
+            if self.breaker is not None and not self.breaker.allow_request():
+                return {"code": CODE_CIRCUIT_OPEN, "message": "Relay unavailable"}
+            if self.limiter is not None:
+                await self.limiter.async_acquire(device_id)
+            if barrier is not None:
+                await barrier.async_wait(device_id)
+                barrier = None
+            start = time.monotonic()
+            try:
+                result = await self._async_route(endpoint, data, timeout)
+            except asyncio.TimeoutError:
+                result = {"code": CODE_TIMEOUT, "message": "Request timed out"}
+                reached = False
+                overloaded = True
+            except aiohttp.ClientConnectorError as err:
+                result = {"code": CODE_UNREACHABLE, "message": str(err)}
+                reached = overloaded = False
+            except aiohttp.ClientError as err:
+                result = {"code": CODE_CLIENT_ERROR, "message": str(err)}
+                reached = False
+                overloaded = (
+                    isinstance(err, aiohttp.ClientResponseError) and err.status >= 500
+                )
+            else:
+                reached = True
+                code = result.get("code")
+                overloaded = code in OVERLOAD_CODES or (
+                    isinstance(code, int) and code >= 500
+                )
+            self._record(
+                endpoint,
+                reached,
+                overloaded,
+                result,
+                time.monotonic() - start,
+                device_metrics,
+            )
+            if reached:
+                if result.get("code") != CODE_OK:
                     _LOGGER.error(
                         "API request failed: %s - %s",
                         result.get("code"),
                         result.get("message"),
                     )
                 return result
-        except aiohttp.ClientError as err:
-            _LOGGER.error("API request error: %s", err)
-            return {"code": -1, "message": str(err)}
-
-    async def test_connection(self) -> bool:
-        """Test API connection."""
-        result = await self.send_idle()
-        return result.get("code") == 200
-
-    async def send_chat_message(self, message: str) -> dict[str, Any]:
-        """Send chat message to device."""
-        return await self._request(
-            API_SEND_CHAT,
-            {"deviceId": self._device_id, "message": message},
-        )
 
-    async def send_idle(self) -> dict[str, Any]:
-        """Send idle command to device."""
-        return await self._request(
-            API_SEND_IDLE,
-            {"deviceId": self._device_id},
-        )
-
-    async def play_music(self, keywords: str) -> dict[str, Any]:
-        """Play music by keywords."""
-        return await self._request(
-            API_PLAY_MUSIC,
-            {"deviceId": self._device_id, "keywords": keywords},
-        )
+        _LOGGER.error("API request error: %s", result["message"])
+        return result
 
-    async def stop_music(self) -> dict[str, Any]:
-        """Stop music playback."""
-        return await self._request(
-            API_STOP_MUSIC,
-            {"deviceId": self._device_id},
-        )
+    def _record(
+        self,
+        endpoint: str,
+        reached: bool,
+        overloaded: bool,
+        result: dict[str, Any],
+        latency: float,
+        device_metrics: XiaozhiMetrics | None,
+    ) -> None:
+        """Report a request's outcome to the breaker, limiter and metrics.
 
-    async def resume_music(self) -> dict[str, Any]:
-        """Resume music playback."""
-        return await self._request(
-            API_RESUME_MUSIC,
-            {"deviceId": self._device_id},
-        )
+        overloaded marks a timeout, 429 or server error; only those and slow
+        answers slow the limiter down, not errors for a single device.
+        """
+        ok = reached and result.get("code") == CODE_OK
+        if self.breaker is not None:
+            if reached:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+        if self.limiter is not None:
+            self.limiter.record(overloaded, latency)
+        if device_metrics is not None:
+            device_metrics.record(endpoint, latency, ok)
+        self.metrics.record(endpoint, latency, ok)
 
-    async def next_track(self) -> dict[str, Any]:
-        """Play next track."""
-        return await self._request(
-            API_NEXT_MUSIC,
-            {"deviceId": self._device_id},
-        )
+    async def _async_route(
+        self, endpoint: str, data: dict[str, Any], timeout: aiohttp.ClientTimeout
+    ) -> dict[str, Any]:
+        """Post a command to the best relay URL.
 
-    async def previous_track(self) -> dict[str, Any]:
-        """Play previous track."""
-        return await self._request(
-            API_PREV_MUSIC,
-            {"deviceId": self._device_id},
-        )
+        A URL that refuses the connection never saw the command, so it is
+        sent to the next URL straight away.
+        """
+        if (router := self.router) is None:
+            return await self.transport.async_request(
+                self.api_url, endpoint, data, timeout
+            )
+        url = router.select() or self.api_url
+        if (
+            self.hedge_delay
+            and endpoint in HEDGED_ENDPOINTS
+            and (second := router.select(exclude=url)) is not None
+        ):
+            return await self._async_hedge(
+                router, url, second, endpoint, data, timeout
+            )
+        try:
+            return await self._async_post_routed(router, url, endpoint, data, timeout)
+        except aiohttp.ClientConnectorError:
+            if (second := router.select(exclude=url)) is None:
+                raise
+            return await self._async_post_routed(
+                router, second, endpoint, data, timeout
+            )
 
-    async def set_player_mode(self, mode: str) -> dict[str, Any]:
-        """Set player mode."""
-        return await self._request(
-            API_PLAYER_MODE,
-            {"deviceId": self._device_id, "playerMode": mode},
-        )
+    async def _async_hedge(
+        self,
+        router: XiaozhiRouter,
+        url: str,
+        second: str,
+        endpoint: str,
+        data: dict[str, Any],
+        timeout: aiohttp.ClientTimeout,
+    ) -> dict[str, Any]:
+        """Duplicate a command to a second URL if the first is slow or fails.
 
-    async def set_volume(self, volume: int) -> dict[str, Any]:
-        """Set volume (0-100)."""
-        return await self._request(
-            API_VOLUME,
-            {"deviceId": self._device_id, "value": volume},
-        )
+        Only used for commands that are harmless to receive twice; the first
+        answer wins and the other request is cancelled.
+        """
+        pending = {
+            asyncio.ensure_future(
+                self._async_post_routed(router, url, endpoint, data, timeout)
+            )
+        }
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
 
-    async def set_brightness(self, brightness: int) -> dict[str, Any]:
-        """Set brightness (0-100)."""
-        return await self._request(
-            API_BRIGHTNESS,
-            {"deviceId": self._device_id, "value": brightness},
-        )
+            self.hedged += 1
+            pending.add(
+                asyncio.ensure_future(
+                    self._async_post_routed(router, second, endpoint, data, timeout)
+                )
+            )
+            while True:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                if not pending:
+                    # Both failed: raise one of their errors
+                    return done.pop().result()
+        finally:
+            for task in pending:
+                task.cancel()
 
-    async def set_theme(self, theme: str) -> dict[str, Any]:
-        """Set theme (light/dark)."""
-        return await self._request(
-            API_THEME,
-            {"deviceId": self._device_id, "value": theme},
-        )
+    async def _async_post_routed(
+        self,
+        router: XiaozhiRouter,
+        url: str,
+        endpoint: str,
+        data: dict[str, Any],
+        timeout: aiohttp.ClientTimeout,
+    ) -> dict[str, Any]:
+        """Post a command to one relay URL and report the outcome to the router."""
+        start = time.monotonic()
+        try:
+            result = await self.transport.async_request(url, endpoint, data, timeout)
+        except aiohttp.ClientConnectorError:
+            router.record(url, time.monotonic() - start, False, refused=True)
+            raise
+        except (asyncio.TimeoutError, aiohttp.ClientError):
+            router.record(url, time.monotonic() - start, False)
+            raise
+        router.record(url, time.monotonic() - start, True)
+        return result
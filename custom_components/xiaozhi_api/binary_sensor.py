@@ -0,0 +1,71 @@
+"""Binary sensor platform for Xiaozhi API."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.binary_sensor import (
+    BinarySensorDeviceClass,
+    BinarySensorEntity,
+    BinarySensorEntityDescription,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from .breaker import XiaozhiCircuitBreaker
+from .const import DOMAIN
+from .device import XiaozhiDevice
+
+RELAY_DESCRIPTION = BinarySensorEntityDescription(
+    key="relay",
+    translation_key="relay",
+    device_class=BinarySensorDeviceClass.CONNECTIVITY,
+    entity_category=EntityCategory.DIAGNOSTIC,
+)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Set up Xiaozhi binary sensors."""
+    device: XiaozhiDevice = hass.data[DOMAIN][entry.entry_id]
+
+    async_add_entities([XiaozhiRelaySensor(device, RELAY_DESCRIPTION)])
+
+
+class XiaozhiRelaySensor(BinarySensorEntity):
+    """Relay reachability as seen by the circuit breaker."""
+
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+
+    def __init__(
+        self, device: XiaozhiDevice, description: BinarySensorEntityDescription
+    ) -> None:
+        """Initialize the binary sensor."""
+        self._breaker: XiaozhiCircuitBreaker = device.client.breaker
+        self.entity_description = description
+        self._attr_unique_id = f"{device.device_id}_{description.key}"
+        self._attr_device_info = device.device_info
+
+    async def async_added_to_hass(self) -> None:
+        """Follow breaker state changes."""
+        self.async_on_remove(
+            self._breaker.async_add_listener(self.async_write_ha_state)
+        )
+
+    @property
+    def is_on(self) -> bool:
+        """Return True while the relay is reachable."""
+        return self._breaker.available
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return breaker details."""
+        return {
+            "breaker_state": self._breaker.state,
+            "consecutive_failures": self._breaker.failures,
+        }
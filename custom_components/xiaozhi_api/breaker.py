@@ -0,0 +1,99 @@
+"""Circuit breaker for Xiaozhi relays."""
+from __future__ import annotations
+
+from collections.abc import Callable
+import time
+
+from .const import BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class XiaozhiCircuitBreaker:
+    """Fail fast while a relay is unreachable.
+
+    The breaker opens after consecutive transport failures. Once the reset
+    timeout has passed a single trial request is let through; its outcome
+    closes the breaker again or re-opens it.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+    ) -> None:
+        """Initialize the breaker."""
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._listeners: list[Callable[[], None]] = []
+
+    @property
+    def state(self) -> str:
+        """Return the breaker state."""
+        return self._state
+
+    @property
+    def failures(self) -> int:
+        """Return the number of consecutive failures."""
+        return self._failures
+
+    @property
+    def available(self) -> bool:
+        """Return True unless the breaker is open."""
+        return self._state != STATE_OPEN
+
+    def allow_request(self) -> bool:
+        """Return True if a request may be sent to the relay."""
+        if self._state == STATE_CLOSED:
+            return True
+        # A trial that never reports back must not block the relay forever,
+        # so another one is allowed after each reset timeout.
+        now = time.monotonic()
+        if now - self._opened_at >= self._reset_timeout:
+            self._opened_at = now
+            self._set_state(STATE_HALF_OPEN)
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """Record a request that reached the relay."""
+        self._failures = 0
+        self._set_state(STATE_CLOSED)
+
+    def record_failure(self) -> None:
+        """Record a request that failed to reach the relay."""
+        self._failures += 1
+        if (
+            self._state == STATE_HALF_OPEN
+            or self._failures >= self._failure_threshold
+        ):
+            self._opened_at = time.monotonic()
+            self._set_state(STATE_OPEN)
+
+    def trip(self) -> None:
+        """Open the breaker without waiting for the failure threshold."""
+        self._failures = max(self._failures, 1)
+        self._opened_at = time.monotonic()
+        self._set_state(STATE_OPEN)
+
+    def _set_state(self, state: str) -> None:
+        """Update the state and notify listeners on change."""
+        if state == self._state:
+            return
+        self._state = state
+        for listener in list(self._listeners):
+            listener()
+
+    def async_add_listener(self, listener: Callable[[], None]) -> Callable[[], None]:
+        """Listen for state changes; returns a callable that removes the listener."""
+        self._listeners.append(listener)
+
+        def _remove() -> None:
+            self._listeners.remove(listener)
+
+        return _remove
@@ -0,0 +1,63 @@
+"""Synchronized broadcast for Xiaozhi devices."""
+from __future__ import annotations
+
+import asyncio
+import time
+
+
+class XiaozhiBarrier:
+    """Hold a broadcast's requests until every device is ready to send.
+
+    Each device's request waits here once it has cleared its queue, the
+    breaker and the rate limiter, so all requests go out in the same loop
+    iteration. Devices that drop out before sending leave the barrier; if
+    some never arrive, the others are released after the timeout.
+    """
+
+    __slots__ = ("_parties", "_arrived", "_left", "_released", "_deadline", "sent_at")
+
+    def __init__(self, parties: int, timeout: float) -> None:
+        """Initialize the barrier for a number of devices."""
+        self._parties = parties
+        self._arrived: set[str] = set()
+        self._left: set[str] = set()
+        self._released = asyncio.Event()
+        self._deadline = time.monotonic() + timeout
+        self.sent_at: dict[str, float] = {}
+
+    async def async_wait(self, device_id: str) -> None:
+        """Wait until all devices have arrived, then record the send time."""
+        self._arrived.add(device_id)
+        self._check()
+        if not self._released.is_set():
+            try:
+                await asyncio.wait_for(
+                    self._released.wait(), max(0.0, self._deadline - time.monotonic())
+                )
+            except asyncio.TimeoutError:
+                self._released.set()
+        self.sent_at[device_id] = time.monotonic()
+
+    def leave(self, device_id: str) -> None:
+        """Stop counting on a device that did not arrive."""
+        if device_id not in self._arrived and device_id not in self._left:
+            self._left.add(device_id)
+            self._check()
+
+    def _check(self) -> None:
+        """Release the waiting devices once no one else is expected."""
+        if len(self._arrived) + len(self._left) >= self._parties:
+            self._released.set()
+
+    @property
+    def skew(self) -> float | None:
+        """Return the spread between the first and last send, in seconds."""
+        if not self.sent_at:
+            return None
+        return max(self.sent_at.values()) - min(self.sent_at.values())
+
+    def offset(self, device_id: str) -> float | None:
+        """Return how long after the first send a device's request went out."""
+        if (sent_at := self.sent_at.get(device_id)) is None:
+            return None
+        return sent_at - min(self.sent_at.values())
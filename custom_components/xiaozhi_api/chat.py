@@ -0,0 +1,132 @@
+"""Sentence chunking and streamed text sources for Xiaozhi chat messages."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator, Iterable
+import re
+
+from homeassistant.core import Event, HomeAssistant, callback
+
+from .const import CHAT_SPEECH_RATE, EVENT_DATA_END, EVENT_DATA_TEXT
+
+# A sentence ends at CJK or ASCII terminal punctuation, a newline, or a period
+# followed by whitespace, plus any closing quotes or brackets.
+_SENTENCE_END = re.compile(
+    r"(?:[。！？；…!?;\n]+|\.(?=\s))[\"'”’」』）)\]]*"
+)
+# Preferred places to cut a sentence that is too long for one chunk
+_SOFT_BREAK = re.compile(r"[，、,：:\s]")
+
+
+class SentenceSplitter:
+    """Split text that arrives in pieces into sentences as soon as they end."""
+
+    def __init__(self, max_length: int) -> None:
+        """Initialize the splitter."""
+        self._max_length = max_length
+        self._buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        """Add text and return the sentences it completed."""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            sentences.extend(self._cut(self._buffer[start : match.end()]))
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        while len(self._buffer) > self._max_length:
+            head, self._buffer = self._split_long(self._buffer)
+            sentences.append(head)
+        return sentences
+
+    def flush(self) -> list[str]:
+        """Return whatever text is left."""
+        rest, self._buffer = self._buffer, ""
+        return self._cut(rest) if rest.strip() else []
+
+    def _cut(self, sentence: str) -> list[str]:
+        """Cut a sentence into pieces that fit in one chunk."""
+        pieces = []
+        while len(sentence) > self._max_length:
+            head, sentence = self._split_long(sentence)
+            pieces.append(head)
+        if sentence:
+            pieces.append(sentence)
+        return pieces
+
+    def _split_long(self, text: str) -> tuple[str, str]:
+        """Split off a head of at most max_length, at a soft break if possible."""
+        cut = self._max_length
+        for match in _SOFT_BREAK.finditer(text, 0, self._max_length):
+            cut = match.end()
+        return text[:cut], text[cut:]
+
+
+def speech_seconds(text: str) -> float:
+    """Estimate how long the device takes to speak a text."""
+    weight = sum(
+        1 if ord(char) >= 0x2E80 else 1 / 3 for char in text if not char.isspace()
+    )
+    return weight / CHAT_SPEECH_RATE
+
+
+async def async_iterate(texts: Iterable[str]) -> AsyncIterator[str]:
+    """Turn already available text into a stream source."""
+    for text in texts:
+        yield text
+
+
+class EventTextSource:
+    """Text streamed through Home Assistant events, readable by many devices.
+
+    Listening starts when the source is created, so devices that begin
+    reading later still get every piece. The stream ends with an event whose
+    data sets "end", when no event arrives within the timeout, or on close().
+    """
+
+    def __init__(self, hass: HomeAssistant, event_type: str, timeout: float) -> None:
+        """Initialize the source and start listening."""
+        self._timeout = timeout
+        self._texts: list[str] = []
+        self._ended = False
+        self._changed = asyncio.Event()
+        self._unsub = hass.bus.async_listen(event_type, self._async_handle_event)
+
+    @callback
+    def _async_handle_event(self, event: Event) -> None:
+        """Buffer an event's text."""
+        if text := event.data.get(EVENT_DATA_TEXT):
+            self._texts.append(str(text))
+        if event.data.get(EVENT_DATA_END):
+            self.close()
+        else:
+            self._notify()
+
+    def _notify(self) -> None:
+        """Wake every reader."""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    @callback
+    def close(self) -> None:
+        """Stop listening and end the stream."""
+        if self._ended:
+            return
+        self._ended = True
+        self._unsub()
+        self._notify()
+
+    async def iterate(self) -> AsyncIterator[str]:
+        """Yield every piece of text from the start of the stream."""
+        index = 0
+        while True:
+            while index < len(self._texts):
+                yield self._texts[index]
+                index += 1
+            if self._ended:
+                return
+            try:
+                await asyncio.wait_for(self._changed.wait(), self._timeout)
+            except asyncio.TimeoutError:
+                self.close()
@@ -0,0 +1,110 @@
+"""Write coalescing for Xiaozhi devices."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from .const import DEFAULT_COALESCE_WINDOW
+
+SendCallback = Callable[[Any], Awaitable[dict[str, Any]]]
+
+
+class _Slot:
+    """Pending write and in-flight state for one coalescing key."""
+
+    __slots__ = ("pending", "waiters", "task", "submitted", "sent", "dropped")
+
+    def __init__(self) -> None:
+        """Initialize the slot."""
+        self.pending: tuple[Any, SendCallback] | None = None
+        self.waiters: list[asyncio.Future[dict[str, Any]]] = []
+        self.task: asyncio.Task[None] | None = None
+        self.submitted = 0
+        self.sent = 0
+        self.dropped = 0
+
+
+class XiaozhiWriteCoalescer:
+    """Coalesce rapid writes so only the newest value per key is sent.
+
+    While a write is in flight, or during the pacing window after it, newer
+    values overwrite the pending slot. Callers whose value was overwritten
+    receive the result of the write that replaced it.
+    """
+
+    __slots__ = ("_window", "_slots")
+
+    def __init__(self, window: float = DEFAULT_COALESCE_WINDOW) -> None:
+        """Initialize the coalescer."""
+        self._window = window
+        self._slots: dict[Hashable, _Slot] = {}
+
+    async def async_submit(
+        self, key: Hashable, value: Any, send: SendCallback
+    ) -> dict[str, Any]:
+        """Queue a write and wait for the write that carries it."""
+        if (slot := self._slots.get(key)) is None:
+            slot = self._slots[key] = _Slot()
+
+        slot.submitted += 1
+        if slot.pending is not None:
+            slot.dropped += 1
+        slot.pending = (value, send)
+
+        future: asyncio.Future[dict[str, Any]] = (
+            asyncio.get_running_loop().create_future()
+        )
+        slot.waiters.append(future)
+        if slot.task is None:
+            slot.task = asyncio.get_running_loop().create_task(self._async_drain(slot))
+        return await future
+
+    async def _async_drain(self, slot: _Slot) -> None:
+        """Send pending values until the slot stays empty for a window."""
+        try:
+            while slot.pending is not None:
+                value, send = slot.pending
+                waiters = slot.waiters
+                slot.pending = None
+                slot.waiters = []
+                slot.sent += 1
+                try:
+                    result = await send(value)
+                except asyncio.CancelledError:
+                    for waiter in waiters:
+                        waiter.cancel()
+                    raise
+                except Exception as err:  # pylint: disable=broad-except
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_exception(err)
+                else:
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_result(result)
+                if self._window > 0:
+                    await asyncio.sleep(self._window)
+        finally:
+            slot.task = None
+
+    def stats(self, key: Hashable) -> dict[str, int]:
+        """Return write counters for a key."""
+        if (slot := self._slots.get(key)) is None:
+            return {"submitted": 0, "sent": 0, "dropped": 0}
+        return {
+            "submitted": slot.submitted,
+            "sent": slot.sent,
+            "dropped": slot.dropped,
+        }
+
+    def shutdown(self) -> None:
+        """Cancel pending writes."""
+        for slot in self._slots.values():
+            if slot.task is not None:
+                slot.task.cancel()
+            for waiter in slot.waiters:
+                if not waiter.done():
+                    waiter.cancel()
+            slot.pending = None
+            slot.waiters = []
@@ -1,8 +1,8 @@
 """Config flow for Xiaozhi API integration."""
 from __future__ import annotations
 
+import asyncio
 import voluptuous as vol
-import aiohttp
 import logging
 from typing import Any
 
@@ -10,16 +10,53 @@ from homeassistant import config_entries
 from homeassistant.core import callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.selector import TextSelector, TextSelectorConfig
 
 from .const import (
     DOMAIN,
+    DATA_RELAYS,
     CONF_API_URL,
     CONF_API_KEY,
     CONF_DEVICE_ID,
     CONF_DEVICE_NAME,
+    CONF_DEVICES,
+    CONF_FIRE_AND_FORGET,
+    CONF_IMPORT_FORMAT,
+    CONF_COALESCE_WINDOW,
+    CONF_CONNECTION_LIMIT,
+    CONF_DEDICATED_SESSION,
+    CONF_FALLBACK_URLS,
+    CONF_HEDGE_DELAY,
+    CONF_OUTBOX,
+    CONF_OUTBOX_EXPIRY,
+    CONF_RATE_BURST,
+    CONF_RATE_LIMIT,
+    CONF_TRACE,
+    CONF_TRACE_THRESHOLD,
+    CONF_TRANSPORT,
     DEFAULT_API_URL,
+    DEFAULT_COALESCE_WINDOW,
+    DEFAULT_CONNECTION_LIMIT,
+    DEFAULT_HEDGE_DELAY,
+    DEFAULT_OUTBOX_EXPIRY,
+    DEFAULT_RATE_BURST,
+    DEFAULT_RATE_LIMIT,
+    DEFAULT_TRACE_THRESHOLD,
+    DEFAULT_TRANSPORT,
+    IMPORT_FORMAT_LIST,
+    IMPORT_FORMATS,
+    TRANSPORTS,
 )
-from .api import XiaozhiApiClient
+from .onboarding import (
+    async_check_account,
+    async_validate_devices,
+    check_devices,
+    format_failures,
+    is_mac,
+    parse_devices,
+)
+from .registry import normalize_mac
+from .relay import RelayKey, XiaozhiRelay, relay_key, split_urls
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -33,6 +70,14 @@ class XiaozhiApiConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
         """Handle the initial step."""
+        return self.async_show_menu(
+            step_id="user", menu_options=["device", "bulk_import"]
+        )
+
+    async def async_step_device(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Add one device."""
         errors: dict[str, str] = {}
 
         if user_input is not None:
@@ -40,31 +85,29 @@ class XiaozhiApiConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             await self.async_set_unique_id(user_input[CONF_DEVICE_ID])
             self._abort_if_unique_id_configured()
 
-            # Test connection
+            # Like the original connection test, this idles the device
             session = async_get_clientsession(self.hass)
-            client = XiaozhiApiClient(
-                session=session,
-                api_url=user_input[CONF_API_URL],
-                api_key=user_input[CONF_API_KEY],
-                device_id=user_input[CONF_DEVICE_ID],
-            )
-
             try:
-                if await client.test_connection():
+                if not is_mac(user_input[CONF_DEVICE_ID]):
+                    errors[CONF_DEVICE_ID] = "invalid_mac"
+                elif error := await async_check_account(
+                    session,
+                    user_input[CONF_API_URL],
+                    user_input[CONF_API_KEY],
+                    user_input[CONF_DEVICE_ID],
+                ):
+                    errors["base"] = error
+                else:
                     return self.async_create_entry(
                         title=user_input.get(CONF_DEVICE_NAME, user_input[CONF_DEVICE_ID]),
                         data=user_input,
                     )
-                else:
-                    errors["base"] = "cannot_connect"
-            except aiohttp.ClientError:
-                errors["base"] = "cannot_connect"
             except Exception:  # pylint: disable=broad-except
                 _LOGGER.exception("Unexpected exception")
                 errors["base"] = "unknown"
 
         return self.async_show_form(
-            step_id="user",
+            step_id="device",
             data_schema=vol.Schema(
                 {
                     vol.Required(CONF_API_URL, default=DEFAULT_API_URL): str,
@@ -76,6 +119,94 @@ class XiaozhiApiConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             errors=errors,
         )
 
+    async def async_step_bulk_import(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Add every device of a pasted list, CSV or YAML at once.
+
+        All relay accounts are validated concurrently before any entry is
+        created; devices that fail are listed in the result and the rest
+        are added.
+        """
+        errors: dict[str, str] = {}
+        placeholders = {"failures": "", "error": ""}
+
+        if user_input is not None:
+            try:
+                rows = parse_devices(
+                    user_input[CONF_DEVICES],
+                    user_input[CONF_IMPORT_FORMAT],
+                    user_input[CONF_API_URL],
+                    user_input[CONF_API_KEY],
+                )
+            except ValueError as err:
+                errors[CONF_DEVICES] = "invalid_import"
+                placeholders["error"] = str(err)
+            else:
+                check_devices(
+                    rows,
+                    {
+                        normalize_mac(entry.data[CONF_DEVICE_ID])
+                        for entry in self._async_current_entries(include_ignore=False)
+                    },
+                )
+                await async_validate_devices(async_get_clientsession(self.hass), rows)
+                valid = [row for row in rows if row.error is None]
+                placeholders["failures"] = format_failures(rows)
+                if not rows:
+                    errors[CONF_DEVICES] = "no_devices"
+                elif not valid:
+                    errors["base"] = "no_devices_imported"
+                else:
+                    await asyncio.gather(
+                        *(
+                            self.hass.config_entries.flow.async_init(
+                                DOMAIN,
+                                context={"source": config_entries.SOURCE_IMPORT},
+                                data=row.entry_data(),
+                            )
+                            for row in valid
+                        )
+                    )
+                    return self.async_abort(
+                        reason="bulk_imported",
+                        description_placeholders={
+                            "imported": str(len(valid)),
+                            "failed": str(len(rows) - len(valid)),
+                            **placeholders,
+                        },
+                    )
+
+        return self.async_show_form(
+            step_id="bulk_import",
+            data_schema=self.add_suggested_values_to_schema(
+                vol.Schema(
+                    {
+                        vol.Required(CONF_API_URL, default=DEFAULT_API_URL): str,
+                        vol.Required(CONF_API_KEY): str,
+                        vol.Required(
+                            CONF_IMPORT_FORMAT, default=IMPORT_FORMAT_LIST
+                        ): vol.In(IMPORT_FORMATS),
+                        vol.Required(CONF_DEVICES): TextSelector(
+                            TextSelectorConfig(multiline=True)
+                        ),
+                    }
+                ),
+                user_input,
+            ),
+            errors=errors,
+            description_placeholders=placeholders,
+        )
+
+    async def async_step_import(self, import_data: dict[str, Any]) -> FlowResult:
+        """Add a device validated by a bulk import."""
+        await self.async_set_unique_id(import_data[CONF_DEVICE_ID])
+        self._abort_if_unique_id_configured()
+        return self.async_create_entry(
+            title=import_data.get(CONF_DEVICE_NAME, import_data[CONF_DEVICE_ID]),
+            data=import_data,
+        )
+
     @staticmethod
     @callback
     def async_get_options_flow(
@@ -95,9 +226,28 @@ class XiaozhiApiOptionsFlow(config_entries.OptionsFlow):
     async def async_step_init(
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
-        """Manage the options."""
+        """Manage the options.
+
+        Relay-wide settings show the values the relay is running with, which
+        may come from another entry on the same relay.
+        """
+        errors: dict[str, str] = {}
+        options = dict(self.config_entry.options)
+        relays: dict[RelayKey, XiaozhiRelay] = self.hass.data.get(DATA_RELAYS, {})
+        key = relay_key(
+            self.config_entry.data[CONF_API_URL], self.config_entry.data[CONF_API_KEY]
+        )
+        if (relay := relays.get(key)) is not None:
+            options.update(relay.options)
+
         if user_input is not None:
-            return self.async_create_entry(title="", data=user_input)
+            if any(
+                not url.startswith(("http://", "https://"))
+                for url in split_urls(user_input.get(CONF_FALLBACK_URLS, ""))
+            ):
+                errors[CONF_FALLBACK_URLS] = "invalid_url"
+            else:
+                return self.async_create_entry(title="", data=user_input)
 
         return self.async_show_form(
             step_id="init",
@@ -111,6 +261,79 @@ class XiaozhiApiOptionsFlow(config_entries.OptionsFlow):
                         CONF_API_KEY,
                         default=self.config_entry.data.get(CONF_API_KEY, ""),
                     ): str,
+                    vol.Optional(
+                        CONF_COALESCE_WINDOW,
+                        default=options.get(
+                            CONF_COALESCE_WINDOW, DEFAULT_COALESCE_WINDOW
+                        ),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=5)),
+                    vol.Optional(
+                        CONF_FIRE_AND_FORGET,
+                        default=options.get(
+                            CONF_FIRE_AND_FORGET, False
+                        ),
+                    ): bool,
+                    vol.Optional(
+                        CONF_DEDICATED_SESSION,
+                        default=options.get(
+                            CONF_DEDICATED_SESSION, False
+                        ),
+                    ): bool,
+                    vol.Optional(
+                        CONF_CONNECTION_LIMIT,
+                        default=options.get(
+                            CONF_CONNECTION_LIMIT, DEFAULT_CONNECTION_LIMIT
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=200)),
+                    vol.Optional(
+                        CONF_RATE_LIMIT,
+                        default=options.get(
+                            CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT
+                        ),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=1000)),
+                    vol.Optional(
+                        CONF_RATE_BURST,
+                        default=options.get(
+                            CONF_RATE_BURST, DEFAULT_RATE_BURST
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=1000)),
+                    vol.Optional(
+                        CONF_OUTBOX,
+                        default=options.get(CONF_OUTBOX, False),
+                    ): bool,
+                    vol.Optional(
+                        CONF_OUTBOX_EXPIRY,
+                        default=options.get(
+                            CONF_OUTBOX_EXPIRY, DEFAULT_OUTBOX_EXPIRY
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=1440)),
+                    vol.Optional(
+                        CONF_FALLBACK_URLS,
+                        default=options.get(CONF_FALLBACK_URLS, ""),
+                    ): str,
+                    vol.Optional(
+                        CONF_HEDGE_DELAY,
+                        default=options.get(
+                            CONF_HEDGE_DELAY, DEFAULT_HEDGE_DELAY
+                        ),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=5)),
+                    vol.Optional(
+                        CONF_TRANSPORT,
+                        default=options.get(
+                            CONF_TRANSPORT, DEFAULT_TRANSPORT
+                        ),
+                    ): vol.In(TRANSPORTS),
+                    vol.Optional(
+                        CONF_TRACE,
+                        default=options.get(CONF_TRACE, False),
+                    ): bool,
+                    vol.Optional(
+                        CONF_TRACE_THRESHOLD,
+                        default=options.get(
+                            CONF_TRACE_THRESHOLD, DEFAULT_TRACE_THRESHOLD
+                        ),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=60)),
                 }
             ),
+            errors=errors,
         )
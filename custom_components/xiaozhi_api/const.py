@@ -1,13 +1,112 @@
 """Constants for Xiaozhi API integration."""
 
 DOMAIN = "xiaozhi_api"
+DATA_DEVICE_INDEX = f"{DOMAIN}_device_index"
+DATA_RELAYS = f"{DOMAIN}_relays"
+DATA_PROFILES = f"{DOMAIN}_profiles"
+DATA_RAMPS = f"{DOMAIN}_ramps"
 
 CONF_API_URL = "api_url"
 CONF_API_KEY = "api_key"
 CONF_DEVICE_ID = "device_id"
 CONF_DEVICE_NAME = "device_name"
+CONF_COALESCE_WINDOW = "coalesce_window"
+CONF_DEDICATED_SESSION = "dedicated_session"
+CONF_CONNECTION_LIMIT = "connection_limit"
+CONF_RATE_LIMIT = "rate_limit"
+CONF_RATE_BURST = "rate_burst"
+CONF_OUTBOX = "outbox"
+CONF_OUTBOX_EXPIRY = "outbox_expiry"
+CONF_FALLBACK_URLS = "fallback_urls"
+CONF_HEDGE_DELAY = "hedge_delay"
+CONF_TRANSPORT = "transport"
+CONF_TRACE = "trace"
+CONF_TRACE_THRESHOLD = "trace_threshold"
+CONF_FIRE_AND_FORGET = "fire_and_forget"
+CONF_DEVICES = "devices"
+CONF_IMPORT_FORMAT = "import_format"
 
 DEFAULT_API_URL = "http://101.35.234.159/Xiaozhi"
+DEFAULT_COALESCE_WINDOW = 0.2
+DEFAULT_MAX_CONCURRENCY = 10
+DEFAULT_CONNECTION_LIMIT = 20
+DEFAULT_RATE_LIMIT = 0
+DEFAULT_RATE_BURST = 20
+DEFAULT_OUTBOX_EXPIRY = 60  # minutes
+DEFAULT_HEDGE_DELAY = 0  # seconds; 0 disables hedging
+DEFAULT_TRACE_THRESHOLD = 1.0  # seconds
+
+# Transports: one HTTP request per command, or one multiplexed WebSocket
+# per relay URL (served at API_WEBSOCKET) carrying every device's commands
+TRANSPORT_HTTP = "http"
+TRANSPORT_WEBSOCKET = "websocket"
+TRANSPORTS = [TRANSPORT_HTTP, TRANSPORT_WEBSOCKET]
+DEFAULT_TRANSPORT = TRANSPORT_HTTP
+WEBSOCKET_HEARTBEAT = 30
+
+# Volume and brightness ramps: shortest step interval and the multiple of
+# the relay's step latency left between steps (seconds), and the weight of
+# each step in the smoothed latency
+RAMP_MIN_INTERVAL = 0.5
+RAMP_LATENCY_FACTOR = 2
+RAMP_LATENCY_WEIGHT = 0.2
+RAMP_MAX_DURATION = 7200
+
+# Bulk import: formats of the pasted device list, and relay accounts
+# checked at once while validating it
+IMPORT_FORMAT_LIST = "list"
+IMPORT_FORMAT_CSV = "csv"
+IMPORT_FORMAT_YAML = "yaml"
+IMPORT_FORMATS = [IMPORT_FORMAT_LIST, IMPORT_FORMAT_CSV, IMPORT_FORMAT_YAML]
+IMPORT_VALIDATION_CONCURRENCY = 10
+
+# Local music queue per device: key in the device's stored state, longest
+# queue and number of played songs remembered
+STATE_MUSIC_QUEUE = "music_queue"
+MUSIC_QUEUE_MAX = 50
+MUSIC_HISTORY_SIZE = 20
+MUSIC_TRACK_MAX_DURATION = 3600
+
+# Slow commands kept per relay while tracing
+TRACE_BUFFER_SIZE = 50
+
+# Dedicated relay session tuning (seconds)
+RELAY_DNS_CACHE_TTL = 300
+RELAY_KEEPALIVE_TIMEOUT = 60
+
+# Background relay reachability probe (seconds)
+RELAY_PROBE_TIMEOUT = 10
+
+# Device state store
+STATE_STORE_VERSION = 1
+STATE_SAVE_DELAY = 10
+
+# Named profiles store
+PROFILE_STORE_VERSION = 1
+
+# Offline outbox per relay: commands kept while the relay is unreachable
+OUTBOX_STORE_VERSION = 1
+OUTBOX_SAVE_DELAY = 5
+OUTBOX_MAX_COMMANDS = 200
+# Reachability checks while commands wait: first delay, doubled up to the max
+OUTBOX_RETRY_DELAY = 5
+OUTBOX_RETRY_MAX_DELAY = 300
+
+# Service attributes
+ATTR_DEVICE_ID = "device_id"
+ATTR_AREA_ID = "area_id"
+ATTR_MAX_CONCURRENCY = "max_concurrency"
+ATTR_FORCE = "force"
+ATTR_PROFILE = "profile"
+ATTR_NAME = "name"
+ATTR_EVENT_TYPE = "event_type"
+ATTR_TIMEOUT = "timeout"
+ATTR_CLEAR = "clear"
+ATTR_DURATION = "duration"
+ATTR_CURVE = "curve"
+ATTR_START = "start"
+ATTR_COMMAND_STATUS = "command_status"
+ALL_DEVICES = "all"
 
 # API Endpoints
 API_SEND_CHAT = "/api/xiaozhi/SendChatMessage"
@@ -21,6 +120,140 @@ API_PLAYER_MODE = "/api/xiaozhi/SendPlayerModeMessage"
 API_VOLUME = "/api/xiaozhi/SendVolumeMessage"
 API_BRIGHTNESS = "/api/xiaozhi/SendBrightnessMessage"
 API_THEME = "/api/xiaozhi/SendThemeMessage"
+API_WEBSOCKET = "/api/xiaozhi/ws"
+
+# Command names reported in completion events
+COMMAND_NAMES = {
+    API_SEND_CHAT: "send_chat_message",
+    API_SEND_IDLE: "idle",
+    API_PLAY_MUSIC: "play_music",
+    API_STOP_MUSIC: "stop_music",
+    API_RESUME_MUSIC: "resume_music",
+    API_NEXT_MUSIC: "next_track",
+    API_PREV_MUSIC: "previous_track",
+    API_PLAYER_MODE: "set_player_mode",
+    API_VOLUME: "set_volume",
+    API_BRIGHTNESS: "set_brightness",
+    API_THEME: "set_theme",
+}
+
+# Fired when a device command completes, with one of these outcomes (or
+# pending, as an entity's command_status while it waits): acknowledged by
+# the relay, failed, or held in the offline outbox
+EVENT_COMMAND_COMPLETED = f"{DOMAIN}_command_completed"
+COMMAND_PENDING = "pending"
+COMMAND_ACKED = "acked"
+COMMAND_FAILED = "failed"
+COMMAND_QUEUED = "queued"
+
+# Largest relay response body that is read (bytes)
+MAX_RESPONSE_BYTES = 64 * 1024
+# Characters of an unexpected response body kept in the result message
+RESPONSE_SNIPPET_LENGTH = 200
+
+# Request timeouts (seconds)
+DEFAULT_REQUEST_TIMEOUT = 5
+API_TIMEOUTS = {
+    API_SEND_CHAT: 10,
+    API_PLAY_MUSIC: 10,
+}
+
+# Commands that are safe to retry because resending leaves the same state
+IDEMPOTENT_ENDPOINTS = frozenset(
+    {API_PLAYER_MODE, API_VOLUME, API_BRIGHTNESS, API_THEME}
+)
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_MAX = 5
+
+# State-setting commands: endpoint -> (state key, payload field)
+STATE_ENDPOINTS = {
+    API_VOLUME: ("volume", "value"),
+    API_BRIGHTNESS: ("brightness", "value"),
+    API_THEME: ("theme", "value"),
+    API_PLAYER_MODE: ("player_mode", "playerMode"),
+}
+
+# Per-device dispatch: priority lane and commands that make queued ones stale
+HIGH_PRIORITY_ENDPOINTS = frozenset({API_SEND_IDLE, API_STOP_MUSIC})
+SUPERSEDED_BY = {
+    API_PLAY_MUSIC: frozenset({API_PLAY_MUSIC}),
+    API_STOP_MUSIC: frozenset(
+        {API_PLAY_MUSIC, API_RESUME_MUSIC, API_NEXT_MUSIC, API_PREV_MUSIC}
+    ),
+    API_SEND_IDLE: frozenset({API_SEND_CHAT}),
+}
+
+# Long chat messages: chunk size (characters), speech pace (CJK characters per
+# second; other characters count as a third) and streamed event text
+CHAT_CHUNK_MAX_LENGTH = 200
+CHAT_SPEECH_RATE = 4.0
+CHAT_STREAM_TIMEOUT = 30
+EVENT_DATA_TEXT = "text"
+EVENT_DATA_END = "end"
+
+# Longest wait (seconds) for every device of a broadcast to be ready to send
+BROADCAST_TIMEOUT = 10
+
+# Commands worth delivering late; momentary controls such as stop or next
+# track are not
+OUTBOX_ENDPOINTS = frozenset(
+    {
+        API_SEND_CHAT,
+        API_PLAY_MUSIC,
+        API_PLAYER_MODE,
+        API_VOLUME,
+        API_BRIGHTNESS,
+        API_THEME,
+    }
+)
+
+# Relay URL selection: smoothing weight of each new sample, error rate above
+# which a URL is avoided, and seconds a URL that refused connections is
+# skipped or an idle URL waits before it is checked again
+ROUTE_EWMA_WEIGHT = 0.1
+ROUTE_MAX_ERROR_RATE = 0.5
+ROUTE_COOLDOWN = 30
+ROUTE_REFRESH_INTERVAL = 60
+# Commands duplicated to a second relay URL when the first is slow to answer
+HEDGED_ENDPOINTS = frozenset({API_SEND_IDLE, API_STOP_MUSIC})
+
+# Circuit breaker
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30
+
+# Adaptive (AIMD) rate limiting per relay account; relay answers meaning it
+# is overloaded (besides server errors)
+OVERLOAD_CODES = frozenset({429})
+RATE_LIMIT_MIN_FRACTION = 0.1
+RATE_LIMIT_INCREASE_STEPS = 20
+RATE_LIMIT_DECREASE_FACTOR = 0.5
+RATE_LIMIT_DECREASE_INTERVAL = 1.0
+RATE_LIMIT_SLOW_LATENCY = 2.0
+
+# Latency histogram bucket upper bounds (seconds)
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Result codes produced locally when the relay gives no usable answer, or
+# the command is refused before it is sent
+CODE_OK = 200
+CODE_CLIENT_ERROR = -1
+CODE_TIMEOUT = -2
+CODE_CIRCUIT_OPEN = -3
+CODE_SUPERSEDED = -4
+CODE_BAD_RESPONSE = -5
+CODE_QUEUE_FULL = -6
+CODE_UNREACHABLE = -7
+CODE_STREAM_WAITING = -8
+# Relay answers rejecting the API key
+AUTH_FAILURE_CODES = frozenset({401, 403})
+# Relay answer showing the URL has a mistyped path
+PROBE_NOT_FOUND_CODE = 404
+# Results meaning the command never left: no connection, or the breaker open
+UNSENT_CODES = frozenset({CODE_UNREACHABLE, CODE_CIRCUIT_OPEN})
+# Results meaning the relay may not have got the command; after a timeout or
+# server error it may still have acted on it
+UNDELIVERED_CODES = UNSENT_CODES | {CODE_CLIENT_ERROR, CODE_TIMEOUT}
 
 # Player modes
 PLAYER_MODES = {
@@ -0,0 +1,612 @@
+"""Per-device command context for Xiaozhi devices."""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import AsyncIterable, Callable
+from functools import partial
+import logging
+import time
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.helpers.entity import DeviceInfo
+
+from .api import XiaozhiApiClient
+from .chat import SentenceSplitter, async_iterate, speech_seconds
+from .coalescer import XiaozhiWriteCoalescer
+from .dispatcher import XiaozhiCommandDispatcher
+from .metrics import XiaozhiMetrics
+from .music_queue import XiaozhiMusicQueue
+from .outbox import XiaozhiOutbox, can_redeliver
+from .const import (
+    DOMAIN,
+    API_SEND_CHAT,
+    API_SEND_IDLE,
+    API_PLAY_MUSIC,
+    API_STOP_MUSIC,
+    API_RESUME_MUSIC,
+    API_NEXT_MUSIC,
+    API_PREV_MUSIC,
+    API_PLAYER_MODE,
+    API_VOLUME,
+    API_BRIGHTNESS,
+    API_THEME,
+    CHAT_CHUNK_MAX_LENGTH,
+    CODE_OK,
+    CODE_QUEUE_FULL,
+    CODE_STREAM_WAITING,
+    COMMAND_ACKED,
+    COMMAND_FAILED,
+    COMMAND_NAMES,
+    COMMAND_QUEUED,
+    CODE_SUPERSEDED,
+    IDEMPOTENT_ENDPOINTS,
+    OUTBOX_ENDPOINTS,
+    STATE_ENDPOINTS,
+    SUPERSEDED_BY,
+    UNDELIVERED_CODES,
+)
+
+if TYPE_CHECKING:
+    from .broadcast import XiaozhiBarrier
+    from .ramp import XiaozhiRampScheduler
+    from .relay import XiaozhiRelay
+
+# Settings accepted by async_apply: state key -> setter method
+SETTERS = {
+    "volume": "set_volume",
+    "brightness": "set_brightness",
+    "theme": "set_theme",
+    "player_mode": "set_player_mode",
+}
+_LOGGER = logging.getLogger(__name__)
+
+# Settings whose writes go through the coalescer, like the number entities
+COALESCED_SETTINGS = frozenset({"volume", "brightness"})
+
+
+def command_status(result: dict[str, Any]) -> str:
+    """Return whether a command's result was acked, failed or queued."""
+    if result.get("code") == CODE_OK:
+        return COMMAND_ACKED
+    if result.get("queued"):
+        return COMMAND_QUEUED
+    return COMMAND_FAILED
+
+
+def _release(
+    future: asyncio.Future[dict[str, Any]],
+    result: dict[str, Any],
+    chunks: int,
+    streaming: bool = True,
+) -> None:
+    """Hand a chat stream's result so far to its caller, if not done already."""
+    if not future.done():
+        future.set_result({**result, "chunks": chunks, "streaming": streaming})
+
+
+class XiaozhiDevice:
+    """One device multiplexed over its relay's shared API client.
+
+    Everything a config entry's entities and services need is kept here, once
+    per device, so entities hold a single reference.
+    """
+
+    __slots__ = (
+        "client",
+        "relay",
+        "device_id",
+        "device_info",
+        "dispatcher",
+        "coalescer",
+        "outbox",
+        "ramps",
+        "music_queue",
+        "fire_and_forget",
+        "metrics",
+        "state",
+        "skipped",
+        "merged",
+        "_on_state_change",
+        "_on_command",
+        "_inflight",
+        "_pending_state",
+        "_chat_lock",
+        "_chat_epoch",
+        "_chat_tasks",
+    )
+
+    def __init__(
+        self,
+        client: XiaozhiApiClient,
+        device_id: str,
+        name: str | None = None,
+        *,
+        relay: XiaozhiRelay | None = None,
+        dispatcher: XiaozhiCommandDispatcher | None = None,
+        coalescer: XiaozhiWriteCoalescer | None = None,
+        outbox: XiaozhiOutbox | None = None,
+        ramps: XiaozhiRampScheduler | None = None,
+        fire_and_forget: bool = False,
+        state: dict[str, Any] | None = None,
+        on_state_change: Callable[[], None] | None = None,
+        on_command: Callable[[dict[str, Any]], None] | None = None,
+    ) -> None:
+        """Initialize the device.
+
+        on_command is called with the outcome and timing of every command.
+        """
+        self.client = client
+        self.relay = relay
+        self.device_id = device_id
+        self.device_info = DeviceInfo(
+            identifiers={(DOMAIN, device_id)},
+            name=name or device_id,
+            manufacturer="Xiaozhi",
+            model="Smart Device",
+        )
+        self.dispatcher = dispatcher
+        self.coalescer = coalescer
+        self.outbox = outbox
+        self.ramps = ramps
+        # Entity actions return before their command is answered
+        self.fire_and_forget = fire_and_forget
+        self.metrics = XiaozhiMetrics()
+        self.state: dict[str, Any] = {} if state is None else state
+        self.music_queue = XiaozhiMusicQueue(self.state, on_state_change)
+        self.skipped = 0
+        self.merged = 0
+        self._on_state_change = on_state_change
+        self._on_command = on_command
+        self._inflight: dict[tuple[Any, ...], asyncio.Future[dict[str, Any]]] = {}
+        self._pending_state: dict[str, int] = {}
+        self._chat_lock: asyncio.Lock | None = None
+        self._chat_epoch = 0
+        self._chat_tasks: set[asyncio.Task[None]] = set()
+
+    def shutdown(self) -> None:
+        """Cancel ramps, pending writes, queued commands, chats and music timer."""
+        self.music_queue.shutdown()
+        for task in self._chat_tasks:
+            task.cancel()
+        if self.ramps is not None:
+            self.ramps.cancel_device(self.device_id)
+        if self.coalescer is not None:
+            self.coalescer.shutdown()
+        if self.dispatcher is not None:
+            self.dispatcher.shutdown()
+
+    async def _request(
+        self,
+        endpoint: str,
+        data: dict[str, Any],
+        force: bool = False,
+        barrier: XiaozhiBarrier | None = None,
+    ) -> dict[str, Any]:
+        """Make API request and report its outcome."""
+        start = time.monotonic()
+        result = await self._async_request(endpoint, data, force, barrier)
+        self._report(endpoint, data, result, start)
+        return result
+
+    def _report(
+        self,
+        endpoint: str,
+        data: dict[str, Any],
+        result: dict[str, Any],
+        start: float,
+    ) -> None:
+        """Pass a completed command to the command listener."""
+        if self._on_command is None:
+            return
+        self._on_command(
+            {
+                "device_id": self.device_id,
+                "command": COMMAND_NAMES.get(endpoint, endpoint),
+                "parameters": {
+                    key: value for key, value in data.items() if key != "deviceId"
+                },
+                "status": command_status(result),
+                "code": result.get("code"),
+                "message": result.get("message"),
+                "latency_ms": round((time.monotonic() - start) * 1000, 1),
+            }
+        )
+
+    async def _async_request(
+        self,
+        endpoint: str,
+        data: dict[str, Any],
+        force: bool = False,
+        barrier: XiaozhiBarrier | None = None,
+    ) -> dict[str, Any]:
+        """Send a command unless it is redundant.
+
+        Unless forced, a state-setting command whose value matches the last
+        acknowledged one is skipped, and a setting identical to one already
+        in flight shares that request's result instead of sending its own.
+        Other commands, such as chat and track changes, act on every send
+        and are never merged. Broadcast commands are always sent, held at
+        their barrier.
+        """
+        data = {"deviceId": self.device_id, **data}
+        if API_SEND_CHAT in SUPERSEDED_BY.get(endpoint, ()):
+            # Also ends chat streams between chunks
+            self._chat_epoch += 1
+        if force or barrier is not None:
+            return await self._dispatch(endpoint, data, barrier=barrier)
+
+        state_field = STATE_ENDPOINTS.get(endpoint)
+        if state_field is not None:
+            key, field = state_field
+            if (
+                not self._pending_state.get(key)
+                and key in self.state
+                and self.state[key] == data[field]
+            ):
+                self.skipped += 1
+                return {"code": CODE_OK, "message": "Unchanged"}
+
+        if endpoint not in IDEMPOTENT_ENDPOINTS:
+            return await self._dispatch(endpoint, data)
+
+        inflight_key = (endpoint, *sorted(data.items()))
+        if (inflight := self._inflight.get(inflight_key)) is not None:
+            self.merged += 1
+            return await asyncio.shield(inflight)
+
+        inflight = asyncio.ensure_future(self._dispatch(endpoint, data))
+        self._inflight[inflight_key] = inflight
+        inflight.add_done_callback(lambda _: self._inflight.pop(inflight_key, None))
+        return await asyncio.shield(inflight)
+
+    async def async_replay(self, endpoint: str, data: dict[str, Any]) -> dict[str, Any]:
+        """Send a command from the outbox without queueing it again."""
+        start = time.monotonic()
+        result = await self._dispatch(endpoint, data, queue=False)
+        self._report(endpoint, data, result, start)
+        return result
+
+    async def _dispatch(
+        self,
+        endpoint: str,
+        data: dict[str, Any],
+        queue: bool = True,
+        barrier: XiaozhiBarrier | None = None,
+    ) -> dict[str, Any]:
+        """Send a command through the device's dispatcher, if any.
+
+        Acknowledged state-setting commands update the device's known state
+        and notify the state listener when it changed. With an outbox, a
+        command that did not reach the relay is queued for later delivery;
+        see can_redeliver.
+        """
+        if (state_field := STATE_ENDPOINTS.get(endpoint)) is None:
+            result = await self._dispatch_command(endpoint, data, barrier)
+        else:
+            key, field = state_field
+            self._pending_state[key] = self._pending_state.get(key, 0) + 1
+            try:
+                result = await self._dispatch_command(endpoint, data)
+            finally:
+                self._pending_state[key] -= 1
+            if result.get("code") == CODE_OK and self.state.get(key) != data[field]:
+                self.state[key] = data[field]
+                if self._on_state_change is not None:
+                    self._on_state_change()
+
+        if self.outbox is None or not queue:
+            return result
+        if result.get("code") == CODE_OK:
+            # Newer than anything queued for the same setting
+            self.outbox.supersede(self.device_id, endpoint)
+            self.outbox.async_kick()
+        elif (code := result.get("code")) in UNDELIVERED_CODES:
+            if endpoint in OUTBOX_ENDPOINTS and can_redeliver(endpoint, code):
+                self.outbox.add(self.device_id, endpoint, data)
+                return {**result, "queued": True}
+            # A stop or idle that never arrived still cancels queued commands
+            self.outbox.supersede(self.device_id, endpoint)
+        return result
+
+    async def _dispatch_command(
+        self,
+        endpoint: str,
+        data: dict[str, Any],
+        barrier: XiaozhiBarrier | None = None,
+    ) -> dict[str, Any]:
+        """Hand a command to the dispatcher, or send it directly."""
+        send = partial(
+            self.client.async_send,
+            self.device_id,
+            endpoint,
+            data,
+            self.metrics,
+            barrier,
+        )
+        if self.dispatcher is None:
+            return await send()
+        return await self.dispatcher.async_submit(endpoint, send)
+
+    async def async_apply(
+        self, settings: dict[str, Any], force: bool = False
+    ) -> dict[str, Any]:
+        """Bring several settings to the given relay values in one operation.
+
+        Only settings that differ from the known state are sent, all at once
+        rather than one after another. The combined result carries a status
+        per setting under "fields". Ramps on the settings are stopped first,
+        so their next step cannot undo the value applied.
+        """
+        if self.ramps is not None:
+            for key in settings:
+                self.ramps.cancel(self.device_id, key)
+        changed = {
+            key: value
+            for key, value in settings.items()
+            if force
+            or self._pending_state.get(key)
+            or key not in self.state
+            or self.state[key] != value
+        }
+        results = await asyncio.gather(
+            *(self._async_set(key, value, force) for key, value in changed.items())
+        )
+        sent = dict(zip(changed, results, strict=True))
+        fields = {}
+        for key in settings:
+            result = sent.get(key, {"code": CODE_OK, "message": "Unchanged"})
+            fields[key] = {
+                "ok": result.get("code") == CODE_OK,
+                "code": result.get("code"),
+                "message": result.get("message"),
+            }
+
+        if failed := [field for field in fields.values() if not field["ok"]]:
+            return {
+                "code": failed[0]["code"],
+                "message": failed[0]["message"],
+                "fields": fields,
+            }
+        return {
+            "code": CODE_OK,
+            "message": f"{len(changed)} changed",
+            "fields": fields,
+        }
+
+    async def _async_set(self, key: str, value: Any, force: bool) -> dict[str, Any]:
+        """Send one setting, coalescing it with entity and service writes."""
+        setter = getattr(self, SETTERS[key])
+        if key in COALESCED_SETTINGS and self.coalescer is not None:
+            return await self.coalescer.async_submit(
+                key, value, partial(setter, force=force)
+            )
+        return await setter(value, force)
+
+    async def test_connection(self) -> bool:
+        """Test API connection."""
+        result = await self.send_idle()
+        return result.get("code") == CODE_OK
+
+    async def send_chat_message(
+        self,
+        message: str,
+        force: bool = False,
+        barrier: XiaozhiBarrier | None = None,
+    ) -> dict[str, Any]:
+        """Send chat message to device."""
+        return await self._request(
+            API_SEND_CHAT, {"message": message}, force, barrier
+        )
+
+    async def async_send_chat_text(
+        self, text: str, force: bool = False
+    ) -> dict[str, Any]:
+        """Send a chat message, streaming it sentence by sentence if it is long."""
+        if len(text) <= CHAT_CHUNK_MAX_LENGTH:
+            return await self.send_chat_message(text, force)
+        return await self.async_send_chat_stream(async_iterate([text]), force)
+
+    async def async_send_chat_stream(
+        self, source: AsyncIterable[str], force: bool = False
+    ) -> dict[str, Any]:
+        """Speak streamed text in sentence-sized chat messages.
+
+        Sentences are sent as soon as they are complete, so the device starts
+        speaking before the source has finished. Each chunk waits until the
+        previous one has probably been spoken; sentences that arrive in the
+        meantime are joined into the next chunk. Streams to the same device
+        run one after another; an idle command ends the current stream.
+
+        The waiting happens in the background: this returns once the last
+        chunk is acknowledged, or as soon as the stream has to wait after
+        sending a chunk or for the device's previous stream; in that last
+        case nothing is sent yet and the result is queued, not acked.
+        "streaming" in the result tells whether the stream goes on; its
+        later chunks are reported through the command completed event.
+        """
+        loop = asyncio.get_running_loop()
+        released: asyncio.Future[dict[str, Any]] = loop.create_future()
+        task = loop.create_task(self._async_chat_stream(source, force, released))
+        self._chat_tasks.add(task)
+        task.add_done_callback(self._chat_tasks.discard)
+        return await asyncio.shield(released)
+
+    async def _async_chat_stream(
+        self,
+        source: AsyncIterable[str],
+        force: bool,
+        released: asyncio.Future[dict[str, Any]],
+    ) -> None:
+        """Run a stream once the device's previous one has finished."""
+        if self._chat_lock is None:
+            self._chat_lock = asyncio.Lock()
+        try:
+            if self._chat_lock.locked():
+                # Nothing is sent yet, so the caller must not see an ack
+                _release(
+                    released,
+                    {
+                        "code": CODE_STREAM_WAITING,
+                        "message": "Waiting for the previous stream",
+                        "queued": True,
+                    },
+                    0,
+                )
+            async with self._chat_lock:
+                result = await self._async_run_chat_stream(source, force, released)
+            _release(released, result, result["chunks"], False)
+        except Exception as err:  # pylint: disable=broad-except
+            if released.done():
+                _LOGGER.exception("Chat stream failed for %s", self.device_id)
+            else:
+                released.set_exception(err)
+            return
+        finally:
+            if not released.done():
+                released.cancel()
+
+    async def _async_run_chat_stream(
+        self,
+        source: AsyncIterable[str],
+        force: bool,
+        released: asyncio.Future[dict[str, Any]],
+    ) -> dict[str, Any]:
+        """Feed a source through the splitter and send paced chunks."""
+        loop = asyncio.get_running_loop()
+        epoch = self._chat_epoch
+        sentences: deque[str] = deque()
+        arrived = asyncio.Event()
+
+        async def _async_produce() -> None:
+            splitter = SentenceSplitter(CHAT_CHUNK_MAX_LENGTH)
+            try:
+                async for text in source:
+                    sentences.extend(splitter.feed(text))
+                    arrived.set()
+                sentences.extend(splitter.flush())
+            finally:
+                sentences.append("")
+                arrived.set()
+
+        producer = loop.create_task(_async_produce())
+        result: dict[str, Any] = {"code": CODE_OK, "message": "Nothing to send"}
+        chunks = 0
+        ready_at = 0.0
+        try:
+            while True:
+                if (delay := ready_at - loop.time()) > 0:
+                    _release(released, result, chunks)
+                    await asyncio.sleep(delay)
+                if not sentences:
+                    if chunks:
+                        _release(released, result, chunks)
+                    arrived.clear()
+                    await arrived.wait()
+                    continue
+                if self._chat_epoch != epoch:
+                    result = {
+                        "code": CODE_SUPERSEDED,
+                        "message": "Superseded by a newer command",
+                    }
+                    break
+                if not sentences[0]:
+                    break
+                chunk = sentences.popleft()
+                while (
+                    sentences
+                    and sentences[0]
+                    and len(chunk) + len(sentences[0]) <= CHAT_CHUNK_MAX_LENGTH
+                ):
+                    chunk += sentences.popleft()
+                if not (chunk := chunk.strip()):
+                    continue
+                result = await self.send_chat_message(chunk, force)
+                chunks += 1
+                if result.get("code") != CODE_OK:
+                    break
+                ready_at = loop.time() + speech_seconds(chunk)
+        finally:
+            if not producer.done():
+                producer.cancel()
+        if producer.done() and not producer.cancelled():
+            producer.result()
+        return {**result, "chunks": chunks}
+
+    async def send_idle(self, force: bool = False) -> dict[str, Any]:
+        """Send idle command to device."""
+        return await self._request(API_SEND_IDLE, {}, force)
+
+    async def play_music(
+        self,
+        keywords: str,
+        force: bool = False,
+        barrier: XiaozhiBarrier | None = None,
+    ) -> dict[str, Any]:
+        """Play music by keywords, ahead of any queued songs."""
+        self.music_queue.played(keywords)
+        return await self._request(
+            API_PLAY_MUSIC, {"keywords": keywords}, force, barrier
+        )
+
+    async def async_enqueue_music(
+        self, keywords: str, duration: float | None = None
+    ) -> dict[str, Any]:
+        """Add a song to the local queue, playing it now if nothing is playing.
+
+        With a duration, the next queued song starts once it has played that
+        many seconds; otherwise the next track command starts it.
+        """
+        if (position := self.music_queue.add(keywords, duration)) is None:
+            return {"code": CODE_QUEUE_FULL, "message": "Music queue is full"}
+        if self.music_queue.current is None:
+            return {**await self.async_play_queued(), "position": 0}
+        return {"code": CODE_OK, "message": "Queued", "position": position + 1}
+
+    async def async_play_queued(self) -> dict[str, Any]:
+        """Play the next song in the local queue."""
+        if (keywords := self.music_queue.advance()) is None:
+            return {"code": CODE_OK, "message": "Music queue is empty"}
+        return await self._request(API_PLAY_MUSIC, {"keywords": keywords})
+
+    def clear_music_queue(self) -> dict[str, Any]:
+        """Drop the songs waiting in the local queue."""
+        dropped = self.music_queue.clear()
+        return {"code": CODE_OK, "message": f"{dropped} removed"}
+
+    async def stop_music(self, force: bool = False) -> dict[str, Any]:
+        """Stop music playback; queued songs wait for the next play."""
+        self.music_queue.stopped()
+        return await self._request(API_STOP_MUSIC, {}, force)
+
+    async def resume_music(self, force: bool = False) -> dict[str, Any]:
+        """Resume music playback."""
+        return await self._request(API_RESUME_MUSIC, {}, force)
+
+    async def next_track(self, force: bool = False) -> dict[str, Any]:
+        """Play the next queued song, or the relay playlist's next track."""
+        if self.music_queue.pending:
+            return await self.async_play_queued()
+        return await self._request(API_NEXT_MUSIC, {}, force)
+
+    async def previous_track(self, force: bool = False) -> dict[str, Any]:
+        """Play previous track."""
+        return await self._request(API_PREV_MUSIC, {}, force)
+
+    async def set_player_mode(self, mode: str, force: bool = False) -> dict[str, Any]:
+        """Set player mode."""
+        return await self._request(API_PLAYER_MODE, {"playerMode": mode}, force)
+
+    async def set_volume(self, volume: int, force: bool = False) -> dict[str, Any]:
+        """Set volume (0-100)."""
+        return await self._request(API_VOLUME, {"value": volume}, force)
+
+    async def set_brightness(
+        self, brightness: int, force: bool = False
+    ) -> dict[str, Any]:
+        """Set brightness (0-100)."""
+        return await self._request(API_BRIGHTNESS, {"value": brightness}, force)
+
+    async def set_theme(self, theme: str, force: bool = False) -> dict[str, Any]:
+        """Set theme (light/dark)."""
+        return await self._request(API_THEME, {"value": theme}, force)
@@ -0,0 +1,63 @@
+"""Diagnostics support for Xiaozhi API."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, CONF_API_KEY
+from .device import XiaozhiDevice
+
+TO_REDACT = {CONF_API_KEY}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    device: XiaozhiDevice = hass.data[DOMAIN][entry.entry_id]
+    dispatcher = device.dispatcher
+    relay = device.relay
+
+    return {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": async_redact_data(entry.options, TO_REDACT),
+        },
+        "device": {
+            "queue": {
+                "depth": dispatcher.depth,
+                "dispatched": dispatcher.dispatched,
+                "superseded": dispatcher.superseded,
+                "last_wait": dispatcher.last_wait,
+                "max_wait": dispatcher.max_wait,
+            },
+            "state": device.state,
+            "skipped_unchanged": device.skipped,
+            "merged_in_flight": device.merged,
+            "ramps": (
+                None if device.ramps is None else device.ramps.active(device.device_id)
+            ),
+            "requests": device.metrics.as_dict(),
+        },
+        "relay": {
+            "api_url": relay.api_url,
+            "entries": len(relay.entry_ids),
+            "breaker": {
+                "state": relay.breaker.state,
+                "consecutive_failures": relay.breaker.failures,
+            },
+            "rate_limit": (
+                None
+                if relay.limiter is None
+                else {"rate": relay.limiter.rate, "waiting": relay.limiter.waiting}
+            ),
+            "requests": relay.metrics.as_dict(),
+            "outbox": None if relay.outbox is None else relay.outbox.as_dict(),
+            "routes": None if relay.router is None else relay.router.as_dict(),
+            "hedged": relay.client.hedged,
+            "tracing": None if relay.tracer is None else relay.tracer.as_dict(),
+        },
+    }
@@ -0,0 +1,131 @@
+"""Ordered command dispatch for Xiaozhi devices."""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import Awaitable, Callable
+import time
+from typing import Any
+
+from .const import CODE_SUPERSEDED, HIGH_PRIORITY_ENDPOINTS, SUPERSEDED_BY
+
+SendCallback = Callable[[], Awaitable[dict[str, Any]]]
+
+
+class _Command:
+    """A queued command."""
+
+    __slots__ = ("endpoint", "send", "future", "queued_at")
+
+    def __init__(
+        self,
+        endpoint: str,
+        send: SendCallback,
+        future: asyncio.Future[dict[str, Any]],
+    ) -> None:
+        """Initialize the command."""
+        self.endpoint = endpoint
+        self.send = send
+        self.future = future
+        self.queued_at = time.monotonic()
+
+
+class XiaozhiCommandDispatcher:
+    """Send one device's commands one at a time, in submission order.
+
+    Commands in HIGH_PRIORITY_ENDPOINTS jump ahead of queued normal traffic.
+    Submitting a command drops queued commands it supersedes (SUPERSEDED_BY);
+    their callers get a CODE_SUPERSEDED result instead of a relay response.
+    """
+
+    __slots__ = (
+        "_high",
+        "_normal",
+        "_task",
+        "dispatched",
+        "superseded",
+        "last_wait",
+        "max_wait",
+    )
+
+    def __init__(self) -> None:
+        """Initialize the dispatcher."""
+        self._high: deque[_Command] = deque()
+        self._normal: deque[_Command] = deque()
+        self._task: asyncio.Task[None] | None = None
+        self.dispatched = 0
+        self.superseded = 0
+        self.last_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def depth(self) -> int:
+        """Return the number of queued commands."""
+        return len(self._high) + len(self._normal)
+
+    async def async_submit(self, endpoint: str, send: SendCallback) -> dict[str, Any]:
+        """Queue a command and wait for its result."""
+        if stale := SUPERSEDED_BY.get(endpoint):
+            self._supersede(stale)
+
+        loop = asyncio.get_running_loop()
+        command = _Command(endpoint, send, loop.create_future())
+        if endpoint in HIGH_PRIORITY_ENDPOINTS:
+            self._high.append(command)
+        else:
+            self._normal.append(command)
+        if self._task is None:
+            self._task = loop.create_task(self._async_run())
+        return await command.future
+
+    def _supersede(self, endpoints: frozenset[str]) -> None:
+        """Resolve queued commands for the given endpoints without sending them."""
+        for lane in (self._high, self._normal):
+            kept = [command for command in lane if command.endpoint not in endpoints]
+            if len(kept) == len(lane):
+                continue
+            for command in lane:
+                if command.endpoint in endpoints and not command.future.done():
+                    command.future.set_result(
+                        {
+                            "code": CODE_SUPERSEDED,
+                            "message": "Superseded by a newer command",
+                        }
+                    )
+                    self.superseded += 1
+            lane.clear()
+            lane.extend(kept)
+
+    async def _async_run(self) -> None:
+        """Send queued commands until both lanes are empty."""
+        try:
+            while self._high or self._normal:
+                command = (self._high or self._normal).popleft()
+                if command.future.done():
+                    continue
+                wait = time.monotonic() - command.queued_at
+                self.last_wait = wait
+                self.max_wait = max(self.max_wait, wait)
+                self.dispatched += 1
+                try:
+                    result = await command.send()
+                except asyncio.CancelledError:
+                    command.future.cancel()
+                    raise
+                except Exception as err:  # pylint: disable=broad-except
+                    if not command.future.done():
+                        command.future.set_exception(err)
+                else:
+                    if not command.future.done():
+                        command.future.set_result(result)
+        finally:
+            self._task = None
+
+    def shutdown(self) -> None:
+        """Cancel queued and in-flight commands."""
+        if self._task is not None:
+            self._task.cancel()
+        for lane in (self._high, self._normal):
+            for command in lane:
+                command.future.cancel()
+            lane.clear()
@@ -0,0 +1,111 @@
+"""Base entity for Xiaozhi API."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+import logging
+from typing import Any
+
+from homeassistant.helpers.entity import Entity, EntityDescription
+
+from .const import (
+    ATTR_COMMAND_STATUS,
+    CODE_CLIENT_ERROR,
+    COMMAND_ACKED,
+    COMMAND_FAILED,
+    COMMAND_PENDING,
+)
+from .device import XiaozhiDevice, command_status
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class XiaozhiEntity(Entity):
+    """A Xiaozhi entity whose actions send commands to its device.
+
+    The value an action sets is shown at once and rolled back to the last
+    acknowledged one if the command fails. With the device's fire-and-forget
+    option the action returns as soon as the command is queued; the outcome
+    arrives later as the command_status attribute, and as the device's
+    EVENT_COMMAND_COMPLETED event. Only the newest action's outcome changes
+    the entity.
+    """
+
+    _attr_has_entity_name = True
+    # Attribute holding the value actions set, if the entity has one
+    _value_attr: str | None = None
+
+    def __init__(self, device: XiaozhiDevice, description: EntityDescription) -> None:
+        """Initialize the entity."""
+        self._device = device
+        self.entity_description = description
+        self._attr_unique_id = f"{device.device_id}_{description.key}"
+        self._attr_device_info = device.device_info
+        self._command_status: str | None = None
+        # Actions numbered in order, those still waiting, and the newest
+        # acknowledged one with its value
+        self._actions = 0
+        self._inflight = 0
+        self._acked_action = 0
+        self._acked_value: Any = None
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return the outcome of the newest action."""
+        return {ATTR_COMMAND_STATUS: self._command_status}
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Stop tracking commands still in flight."""
+        for task in self._tasks:
+            task.cancel()
+
+    async def _async_act(
+        self, send: Callable[[], Awaitable[dict[str, Any]]], value: Any = None
+    ) -> None:
+        """Show an action's value and send its command."""
+        self._actions += 1
+        action = self._actions
+        if self._value_attr is not None:
+            if not self._inflight:
+                # With nothing in flight the value shown is the confirmed one
+                self._acked_action = action - 1
+                self._acked_value = getattr(self, self._value_attr)
+            setattr(self, self._value_attr, value)
+        self._inflight += 1
+        self._command_status = COMMAND_PENDING
+        if not self._device.fire_and_forget:
+            await self._async_track(action, send, value)
+            return
+        self.async_write_ha_state()
+        task = self.hass.async_create_task(
+            self._async_track(action, send, value),
+            f"{self.entity_id} command",
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _async_track(
+        self,
+        action: int,
+        send: Callable[[], Awaitable[dict[str, Any]]],
+        value: Any,
+    ) -> None:
+        """Wait for a command and report how it ended."""
+        try:
+            result = await send()
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.exception("Command for %s failed", self.entity_id)
+            result = {"code": CODE_CLIENT_ERROR, "message": str(err)}
+        finally:
+            self._inflight -= 1
+        status = command_status(result)
+        if status == COMMAND_ACKED and action > self._acked_action:
+            self._acked_action = action
+            self._acked_value = value
+        if action == self._actions:
+            self._command_status = status
+            if status == COMMAND_FAILED and self._value_attr is not None:
+                setattr(self, self._value_attr, self._acked_value)
+            self.async_write_ha_state()
+
@@ -0,0 +1,97 @@
+"""Request metrics for Xiaozhi devices and relays."""
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Any
+
+from .const import LATENCY_BUCKETS
+
+
+class EndpointStats:
+    """Request and error counters with a fixed-bucket latency histogram."""
+
+    __slots__ = ("requests", "errors", "latency_sum", "buckets")
+
+    def __init__(self) -> None:
+        """Initialize the counters."""
+        self.requests = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        # One bucket per upper bound plus one for anything slower.
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, latency: float, ok: bool) -> None:
+        """Count one request."""
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+        self.latency_sum += latency
+        self.buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def merge(self, other: EndpointStats) -> None:
+        """Add another endpoint's counters to these."""
+        self.requests += other.requests
+        self.errors += other.errors
+        self.latency_sum += other.latency_sum
+        for index, count in enumerate(other.buckets):
+            self.buckets[index] += count
+
+    def quantile(self, fraction: float) -> float | None:
+        """Return the upper bound of the bucket holding the given quantile.
+
+        Requests slower than the last bound are reported as that bound.
+        """
+        if not self.requests:
+            return None
+        rank = fraction * self.requests
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return LATENCY_BUCKETS[min(index, len(LATENCY_BUCKETS) - 1)]
+        return LATENCY_BUCKETS[-1]
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the counters as plain data."""
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_avg": (
+                self.latency_sum / self.requests if self.requests else None
+            ),
+            "latency_p50": self.quantile(0.5),
+            "latency_p95": self.quantile(0.95),
+            "latency_p99": self.quantile(0.99),
+            "buckets": dict(
+                zip([*map(str, LATENCY_BUCKETS), "inf"], self.buckets, strict=True)
+            ),
+        }
+
+
+class XiaozhiMetrics:
+    """Request metrics per endpoint."""
+
+    __slots__ = ("endpoints",)
+
+    def __init__(self) -> None:
+        """Initialize the metrics."""
+        self.endpoints: dict[str, EndpointStats] = {}
+
+    def record(self, endpoint: str, latency: float, ok: bool) -> None:
+        """Count one request to an endpoint."""
+        if (stats := self.endpoints.get(endpoint)) is None:
+            stats = self.endpoints[endpoint] = EndpointStats()
+        stats.record(latency, ok)
+
+    def total(self) -> EndpointStats:
+        """Return the counters summed over all endpoints."""
+        total = EndpointStats()
+        for stats in self.endpoints.values():
+            total.merge(stats)
+        return total
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return per-endpoint counters as plain data."""
+        return {
+            endpoint: stats.as_dict() for endpoint, stats in self.endpoints.items()
+        }
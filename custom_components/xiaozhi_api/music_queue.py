@@ -0,0 +1,183 @@
+"""Local music request queue for Xiaozhi devices."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+import time
+from typing import Any
+
+from .const import MUSIC_HISTORY_SIZE, MUSIC_QUEUE_MAX, STATE_MUSIC_QUEUE
+
+QueueListener = Callable[[], None]
+
+
+class XiaozhiMusicQueue:
+    """Songs waiting to play on one device, and those played recently.
+
+    The queue lives in the device's stored state as plain lists, so it is
+    saved with the rest of the state by the relay's batched store and
+    survives restarts: pending songs as [keywords, duration], the song now
+    playing as [keywords, duration, started] and at most MUSIC_HISTORY_SIZE
+    played songs as [keywords, started], with wall-clock times in seconds.
+    A song with a duration starts the next one when it is over; otherwise
+    the queue waits for the next track command.
+    """
+
+    __slots__ = (
+        "_state",
+        "_data",
+        "_on_change",
+        "_on_due",
+        "_timer",
+        "_task",
+        "_listeners",
+    )
+
+    def __init__(
+        self, state: dict[str, Any], on_change: Callable[[], None] | None = None
+    ) -> None:
+        """Initialize the queue from the device's stored state."""
+        self._state = state
+        # Only added to the state once the queue is used
+        self._data: dict[str, Any] = state.get(STATE_MUSIC_QUEUE) or {
+            "pending": [],
+            "current": None,
+            "history": [],
+        }
+        self._on_change = on_change
+        self._on_due: Callable[[], Awaitable[Any]] | None = None
+        self._timer: asyncio.TimerHandle | None = None
+        self._task: asyncio.Task[Any] | None = None
+        self._listeners: list[QueueListener] = []
+
+    @property
+    def pending(self) -> list[str]:
+        """Return the keywords of the songs waiting to play."""
+        return [keywords for keywords, _ in self._data["pending"]]
+
+    @property
+    def current(self) -> str | None:
+        """Return the keywords of the song playing, if known."""
+        if (current := self._data["current"]) is None:
+            return None
+        return current[0]
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the queue for entity attributes and service responses."""
+        return {
+            "now_playing": self.current,
+            "queue": self.pending,
+            "recently_played": [
+                keywords for keywords, _ in reversed(self._data["history"])
+            ],
+        }
+
+    def async_start(self, on_due: Callable[[], Awaitable[Any]]) -> None:
+        """Resume the stored queue; on_due plays the next song when one ends.
+
+        A restored song that should still be playing keeps its timer; one
+        that ended while Home Assistant was stopped is moved to the history
+        rather than starting the next song at startup.
+        """
+        self._on_due = on_due
+        if (current := self._data["current"]) is None or current[1] is None:
+            return
+        if (remaining := current[2] + current[1] - time.time()) > 0:
+            self._arm(remaining)
+        else:
+            self._retire()
+            self._changed()
+
+    def shutdown(self) -> None:
+        """Stop waiting for the song playing to end."""
+        self._cancel_timer()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def async_add_listener(self, listener: QueueListener) -> Callable[[], None]:
+        """Listen for changes; returns a callable that removes the listener."""
+        self._listeners.append(listener)
+
+        def _remove() -> None:
+            self._listeners.remove(listener)
+
+        return _remove
+
+    def add(self, keywords: str, duration: float | None = None) -> int | None:
+        """Queue a song; returns its position, or None if the queue is full."""
+        if len(self._data["pending"]) >= MUSIC_QUEUE_MAX:
+            return None
+        self._data["pending"].append([keywords, duration])
+        self._changed()
+        return len(self._data["pending"]) - 1
+
+    def clear(self) -> int:
+        """Drop every waiting song; returns how many were dropped."""
+        dropped = len(self._data["pending"])
+        if dropped:
+            self._data["pending"].clear()
+            self._changed()
+        return dropped
+
+    def advance(self) -> str | None:
+        """Make the first waiting song the current one and return its keywords."""
+        if not self._data["pending"]:
+            return None
+        keywords, duration = self._data["pending"].pop(0)
+        self._retire()
+        self._data["current"] = [keywords, duration, round(time.time())]
+        if duration is not None:
+            self._arm(duration)
+        self._changed()
+        return keywords
+
+    def played(self, keywords: str) -> None:
+        """Record a song played directly, which takes the current one's place."""
+        self._retire()
+        self._data["current"] = [keywords, None, round(time.time())]
+        self._changed()
+
+    def stopped(self) -> None:
+        """Record that playback stopped; waiting songs stay queued."""
+        if self._data["current"] is not None:
+            self._retire()
+            self._changed()
+
+    def _retire(self) -> None:
+        """Move the current song, if any, to the bounded history."""
+        self._cancel_timer()
+        if (current := self._data["current"]) is None:
+            return
+        history = self._data["history"]
+        history.append([current[0], current[2]])
+        del history[:-MUSIC_HISTORY_SIZE]
+        self._data["current"] = None
+
+    def _arm(self, delay: float) -> None:
+        """Start the next song after delay seconds."""
+        self._cancel_timer()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._due)
+
+    def _cancel_timer(self) -> None:
+        """Stop waiting for the current song to end."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _due(self) -> None:
+        """Play the next waiting song, or note that the queue has finished."""
+        self._timer = None
+        if self._data["pending"] and self._on_due is not None:
+            self._task = asyncio.get_running_loop().create_task(self._on_due())
+            return
+        self._retire()
+        self._changed()
+
+    def _changed(self) -> None:
+        """Save the queue and tell the listeners."""
+        self._state[STATE_MUSIC_QUEUE] = self._data
+        if self._on_change is not None:
+            self._on_change()
+        for listener in list(self._listeners):
+            listener()
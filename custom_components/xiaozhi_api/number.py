@@ -1,13 +1,17 @@
 """Number platform for Xiaozhi API."""
 from __future__ import annotations
 
+from functools import partial
+from typing import Any
+
 from homeassistant.components.number import NumberEntity, NumberEntityDescription, NumberMode
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
-from .const import DOMAIN, CONF_DEVICE_ID, CONF_DEVICE_NAME
+from .const import DOMAIN
+from .device import XiaozhiDevice
+from .entity import XiaozhiEntity
 
 NUMBER_DESCRIPTIONS = [
     NumberEntityDescription(
@@ -35,51 +39,73 @@ async def async_setup_entry(
     async_add_entities: AddEntitiesCallback,
 ) -> None:
     """Set up Xiaozhi numbers."""
-    data = hass.data[DOMAIN][entry.entry_id]
-    client = data["client"]
-    device_id = entry.data[CONF_DEVICE_ID]
-    device_name = entry.data.get(CONF_DEVICE_NAME, device_id)
+    device: XiaozhiDevice = hass.data[DOMAIN][entry.entry_id]
 
     entities = [
-        XiaozhiNumber(client, device_id, device_name, description)
-        for description in NUMBER_DESCRIPTIONS
+        XiaozhiNumber(device, description) for description in NUMBER_DESCRIPTIONS
     ]
     async_add_entities(entities)
 
 
-class XiaozhiNumber(NumberEntity):
+class XiaozhiNumber(XiaozhiEntity, NumberEntity):
     """Xiaozhi number entity."""
 
-    _attr_has_entity_name = True
+    entity_description: NumberEntityDescription
+    _value_attr = "_attr_native_value"
     _attr_mode = NumberMode.SLIDER
 
     def __init__(
-        self,
-        client,
-        device_id: str,
-        device_name: str,
-        description: NumberEntityDescription,
+        self, device: XiaozhiDevice, description: NumberEntityDescription
     ) -> None:
         """Initialize the number."""
-        self._client = client
-        self._device_id = device_id
-        self.entity_description = description
-        self._attr_unique_id = f"{device_id}_{description.key}"
-        self._attr_native_value = 50
-        self._attr_device_info = DeviceInfo(
-            identifiers={(DOMAIN, device_id)},
-            name=device_name,
-            manufacturer="Xiaozhi",
-            model="Smart Device",
-        )
+        super().__init__(device, description)
+        self._attr_native_value = device.state.get(description.key)
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the value while a ramp moves it."""
+        if (ramps := self._device.ramps) is not None:
+            self.async_on_remove(
+                ramps.async_add_listener(
+                    self._device.device_id,
+                    self.entity_description.key,
+                    self._async_ramp_step,
+                )
+            )
+
+    @callback
+    def _async_ramp_step(self, value: int) -> None:
+        """Show a value a ramp has set."""
+        self._attr_native_value = value
+        self.async_write_ha_state()
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return coalesced write counters."""
+        stats = self._device.coalescer.stats(self.entity_description.key)
+        return {
+            **super().extra_state_attributes,
+            "writes_submitted": stats["submitted"],
+            "writes_sent": stats["sent"],
+            "writes_dropped": stats["dropped"],
+        }
 
     async def async_set_native_value(self, value: float) -> None:
-        """Set the value."""
+        """Set the value.
+
+        Slider drags are coalesced so only the newest value reaches the device.
+        Setting a value by hand stops any ramp on it.
+        """
         int_value = int(value)
         key = self.entity_description.key
         if key == "volume":
-            await self._client.set_volume(int_value)
+            send = self._device.set_volume
         elif key == "brightness":
-            await self._client.set_brightness(int_value)
-        self._attr_native_value = int_value
-        self.async_write_ha_state()
+            send = self._device.set_brightness
+        else:
+            return
+        if self._device.ramps is not None:
+            self._device.ramps.cancel(self._device.device_id, key)
+        await self._async_act(
+            partial(self._device.coalescer.async_submit, key, int_value, send),
+            int_value,
+        )
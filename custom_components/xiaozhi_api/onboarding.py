@@ -0,0 +1,264 @@
+"""Bulk import of Xiaozhi devices."""
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import re
+from typing import Any
+
+import aiohttp
+import yaml
+
+from .api import XiaozhiApiClient
+from .const import (
+    AUTH_FAILURE_CODES,
+    CONF_API_KEY,
+    CONF_API_URL,
+    CONF_DEVICE_ID,
+    CONF_DEVICE_NAME,
+    IMPORT_FORMAT_CSV,
+    IMPORT_FORMAT_YAML,
+    IMPORT_VALIDATION_CONCURRENCY,
+    PROBE_NOT_FOUND_CODE,
+)
+from .registry import normalize_mac
+
+# Accepted CSV header and YAML key names -> config entry field
+_FIELDS = {
+    "device_id": CONF_DEVICE_ID,
+    "mac": CONF_DEVICE_ID,
+    "device_name": CONF_DEVICE_NAME,
+    "name": CONF_DEVICE_NAME,
+    "api_url": CONF_API_URL,
+    "api_key": CONF_API_KEY,
+}
+# CSV columns without a header
+_COLUMNS = (CONF_DEVICE_ID, CONF_DEVICE_NAME, CONF_API_URL, CONF_API_KEY)
+
+_MAC = re.compile(r"[0-9a-f]{12}")
+_LIST_SEPARATOR = re.compile(r"[\s,;]+")
+
+
+class XiaozhiImportRow:
+    """One device read from a bulk import and why it cannot be added."""
+
+    __slots__ = ("row", "device_id", "device_name", "api_url", "api_key", "error")
+
+    def __init__(
+        self,
+        row: int,
+        device_id: str,
+        device_name: str | None,
+        api_url: str,
+        api_key: str,
+    ) -> None:
+        """Initialize the row."""
+        self.row = row
+        self.device_id = device_id
+        self.device_name = device_name
+        self.api_url = api_url
+        self.api_key = api_key
+        self.error: str | None = None
+
+    def entry_data(self) -> dict[str, Any]:
+        """Return the config entry data for the device."""
+        data = {
+            CONF_API_URL: self.api_url,
+            CONF_API_KEY: self.api_key,
+            CONF_DEVICE_ID: self.device_id,
+        }
+        if self.device_name:
+            data[CONF_DEVICE_NAME] = self.device_name
+        return data
+
+
+def parse_devices(
+    text: str, import_format: str, api_url: str, api_key: str
+) -> list[XiaozhiImportRow]:
+    """Read devices from a pasted list, CSV or YAML.
+
+    Rows are numbered by line, or by list item for YAML. Devices without
+    their own API URL or key use the ones given. Raises ValueError if the
+    text cannot be read in that format.
+    """
+    if import_format == IMPORT_FORMAT_CSV:
+        records = _read_csv(text)
+    elif import_format == IMPORT_FORMAT_YAML:
+        records = _read_yaml(text)
+    else:
+        records = _read_list(text)
+    rows = []
+    for row, record in records:
+        if not (device_id := str(record.get(CONF_DEVICE_ID) or "").strip()):
+            continue
+        rows.append(
+            XiaozhiImportRow(
+                row,
+                device_id,
+                str(record.get(CONF_DEVICE_NAME) or "").strip() or None,
+                str(record.get(CONF_API_URL) or "").strip() or api_url,
+                str(record.get(CONF_API_KEY) or "").strip() or api_key,
+            )
+        )
+    return rows
+
+
+def _read_list(text: str) -> list[tuple[int, dict[str, Any]]]:
+    """Read one MAC per line, optionally followed by a name."""
+    records = []
+    for row, line in enumerate(text.splitlines(), 1):
+        if not (line := line.strip()) or line.startswith("#"):
+            continue
+        fields = _LIST_SEPARATOR.split(line, maxsplit=1)
+        records.append(
+            (row, dict(zip((CONF_DEVICE_ID, CONF_DEVICE_NAME), fields, strict=False)))
+        )
+    return records
+
+
+def _read_csv(text: str) -> list[tuple[int, dict[str, Any]]]:
+    """Read CSV rows, with a header naming the columns or in _COLUMNS order."""
+    reader = csv.reader(io.StringIO(text.strip()))
+    columns: tuple[str, ...] | None = None
+    records = []
+    try:
+        for cells in reader:
+            cells = [cell.strip() for cell in cells]
+            if not any(cells):
+                continue
+            if columns is None:
+                if cells[0].lower() in _FIELDS:
+                    if unknown := [c for c in cells if c.lower() not in _FIELDS]:
+                        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+                    columns = tuple(_FIELDS[cell.lower()] for cell in cells)
+                    continue
+                columns = _COLUMNS
+            # Short rows leave the last columns out; extra cells are ignored
+            records.append((reader.line_num, dict(zip(columns, cells, strict=False))))
+    except csv.Error as err:
+        raise ValueError(str(err)) from err
+    return records
+
+
+def _read_yaml(text: str) -> list[tuple[int, dict[str, Any]]]:
+    """Read a list of MACs or device mappings, or a mapping of MAC to name."""
+    try:
+        # Every scalar stays a string, so MACs are not read as numbers
+        data = yaml.load(text, Loader=yaml.BaseLoader)
+    except yaml.YAMLError as err:
+        raise ValueError(str(err)) from err
+    if isinstance(data, dict):
+        data = [
+            {CONF_DEVICE_ID: mac, CONF_DEVICE_NAME: name}
+            for mac, name in data.items()
+        ]
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of devices or a mapping of MAC to name")
+    records = []
+    for row, item in enumerate(data, 1):
+        if isinstance(item, dict):
+            item = {
+                _FIELDS[key.lower()]: value
+                for key, value in item.items()
+                if key.lower() in _FIELDS and isinstance(value, str)
+            }
+        elif isinstance(item, str):
+            item = {CONF_DEVICE_ID: item}
+        else:
+            raise ValueError(f"Item {row} is not a device")
+        records.append((row, item))
+    return records
+
+
+def is_mac(device_id: str) -> bool:
+    """Return True if a device id is a MAC address in any common notation."""
+    return _MAC.fullmatch(normalize_mac(device_id)) is not None
+
+
+def check_devices(rows: list[XiaozhiImportRow], configured: set[str]) -> None:
+    """Flag rows that are not MACs, repeat a MAC or are configured already.
+
+    configured holds the normalized MACs of existing entries.
+    """
+    seen: set[str] = set()
+    for row in rows:
+        mac = normalize_mac(row.device_id)
+        if not is_mac(mac):
+            row.error = "invalid_mac"
+        elif mac in configured:
+            row.error = "already_configured"
+        elif mac in seen:
+            row.error = "duplicate"
+        seen.add(mac)
+
+
+async def async_check_account(
+    session: aiohttp.ClientSession, api_url: str, api_key: str, device_id: str
+) -> str | None:
+    """Probe a relay account through one of its devices.
+
+    Returns None or the config flow error for the account. The relay at
+    DEFAULT_API_URL is only known to answer a command for a registered
+    device with {"code": 200, "message": "success"}, which the original
+    connection test required; its answers for offline or unknown devices
+    are not documented. So any JSON answer counts as reachable except an
+    auth failure, a 404 from a mistyped path, a server error, or a page
+    that is not JSON (a negative code from the transport).
+    """
+    client = XiaozhiApiClient(session, api_url, api_key)
+    try:
+        result = await client.async_probe(device_id)
+    except (asyncio.TimeoutError, aiohttp.ClientError):
+        return "cannot_connect"
+    code = result.get("code")
+    if code in AUTH_FAILURE_CODES:
+        return "invalid_auth"
+    if isinstance(code, int) and (
+        code == PROBE_NOT_FOUND_CODE or code >= 500 or code < 0
+    ):
+        return "cannot_connect"
+    return None
+
+
+async def async_validate_devices(
+    session: aiohttp.ClientSession,
+    rows: list[XiaozhiImportRow],
+    limit: int = IMPORT_VALIDATION_CONCURRENCY,
+) -> None:
+    """Check the relay account of every row still valid, limit at a time.
+
+    Each distinct URL and key is probed once on the shared session through
+    the first of its devices, which is sent the idle command; rows whose
+    account fails get its error.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def _async_check(account: tuple[str, str], device_id: str) -> str | None:
+        async with semaphore:
+            return await async_check_account(session, *account, device_id)
+
+    # Account -> the device it is probed through
+    accounts: dict[tuple[str, str], str] = {}
+    for row in rows:
+        if row.error is None:
+            accounts.setdefault((row.api_url, row.api_key), row.device_id)
+    errors = dict(
+        zip(
+            accounts,
+            await asyncio.gather(*(_async_check(*item) for item in accounts.items())),
+            strict=True,
+        )
+    )
+    for row in rows:
+        if row.error is None:
+            row.error = errors[(row.api_url, row.api_key)]
+
+
+def format_failures(rows: list[XiaozhiImportRow]) -> str:
+    """Return one line per row that cannot be added, for the flow's result."""
+    return "\n".join(
+        f"- {row.row}: {row.device_id} ({row.error})"
+        for row in rows
+        if row.error is not None
+    )
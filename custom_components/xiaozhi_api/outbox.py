@@ -0,0 +1,251 @@
+"""Offline outbox for Xiaozhi relays."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+import logging
+import time
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    DOMAIN,
+    OUTBOX_MAX_COMMANDS,
+    OUTBOX_RETRY_DELAY,
+    OUTBOX_RETRY_MAX_DELAY,
+    OUTBOX_SAVE_DELAY,
+    OUTBOX_STORE_VERSION,
+    STATE_ENDPOINTS,
+    SUPERSEDED_BY,
+    UNDELIVERED_CODES,
+    UNSENT_CODES,
+)
+from .store import relay_storage_key
+
+_LOGGER = logging.getLogger(__name__)
+
+# Sends a replayed command; returns None if the device is not set up
+ReplayCallback = Callable[[str, str, dict[str, Any]], Awaitable[dict[str, Any] | None]]
+# Checks whether the relay answers, without sending a device command
+ProbeCallback = Callable[[], Awaitable[bool]]
+
+
+def can_redeliver(endpoint: str, code: Any) -> bool:
+    """Return True if a command that failed with a code may be sent again.
+
+    A timeout or server error can come after the relay acted on a command,
+    so only settings, which are harmless to repeat, are resent then; other
+    commands only if they never left.
+    """
+    return code in UNSENT_CODES or (
+        code in UNDELIVERED_CODES and endpoint in STATE_ENDPOINTS
+    )
+
+
+class XiaozhiOutbox:
+    """Commands that could not reach a relay, kept on disk for later delivery.
+
+    Commands are replayed in order once the relay is reachable again. A new
+    command for a device drops the queued ones it makes stale, so only the
+    latest value of each setting is replayed. While commands wait, the relay
+    is checked with a backoff from OUTBOX_RETRY_DELAY to
+    OUTBOX_RETRY_MAX_DELAY seconds, so they are delivered even if nothing
+    else is sent. The outbox is bounded, drops commands older than the
+    expiry and batches its disk writes.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        api_url: str,
+        api_key: str,
+        expiry: float,
+        replay: ReplayCallback,
+        probe: ProbeCallback,
+    ) -> None:
+        """Initialize the outbox; expiry is in seconds."""
+        self._hass = hass
+        self._store: Store[list[dict[str, Any]]] = Store(
+            hass,
+            OUTBOX_STORE_VERSION,
+            relay_storage_key("outbox", api_url, api_key),
+        )
+        self._expiry = expiry
+        self._replay = replay
+        self._probe = probe
+        self._commands: list[dict[str, Any]] = []
+        self._load_task: asyncio.Task[None] | None = None
+        self._replay_task: asyncio.Task[None] | None = None
+        self._unsub_retry: CALLBACK_TYPE | None = None
+        self._retry_delay: float = OUTBOX_RETRY_DELAY
+        self._save_pending = False
+        self.replayed = 0
+        self.expired = 0
+        self.dropped = 0
+
+    @property
+    def pending(self) -> int:
+        """Return the number of queued commands."""
+        return len(self._commands)
+
+    async def async_load(self) -> None:
+        """Load the queued commands; concurrent and repeated calls share one read."""
+        if self._load_task is None:
+            self._load_task = asyncio.ensure_future(self._async_load())
+        await asyncio.shield(self._load_task)
+
+    async def _async_load(self) -> None:
+        """Read the outbox file."""
+        if stored := await self._store.async_load():
+            self._commands[:0] = stored
+            self._expire()
+            self._schedule_retry()
+
+    @callback
+    def add(self, device_id: str, endpoint: str, data: dict[str, Any]) -> None:
+        """Queue a command that did not reach the relay."""
+        self.supersede(device_id, endpoint)
+        self._commands.append(
+            {
+                "device_id": device_id,
+                "endpoint": endpoint,
+                "data": data,
+                "queued_at": time.time(),
+            }
+        )
+        if (excess := len(self._commands) - OUTBOX_MAX_COMMANDS) > 0:
+            del self._commands[:excess]
+            self.dropped += excess
+        self._schedule_save()
+        self._schedule_retry()
+
+    @callback
+    def supersede(self, device_id: str, endpoint: str) -> None:
+        """Drop queued commands for a device that a newer command makes stale."""
+        stale = set(SUPERSEDED_BY.get(endpoint, ()))
+        if endpoint in STATE_ENDPOINTS:
+            stale.add(endpoint)
+        if not stale or not self._commands:
+            return
+        kept = [
+            command
+            for command in self._commands
+            if command["device_id"] != device_id or command["endpoint"] not in stale
+        ]
+        if len(kept) != len(self._commands):
+            self._commands = kept
+            self._schedule_save()
+
+    @callback
+    def async_kick(self) -> None:
+        """Start replaying queued commands unless already doing so."""
+        if not self._commands or self._replay_task is not None:
+            return
+        self._replay_task = self._hass.async_create_background_task(
+            self._async_replay(), f"{DOMAIN} outbox replay"
+        )
+
+    async def _async_replay(self) -> None:
+        """Send queued commands in order until one fails to reach the relay."""
+        delivered = False
+        try:
+            self._expire()
+            for command in list(self._commands):
+                if command not in self._commands:
+                    continue  # superseded while replaying
+                result = await self._replay(
+                    command["device_id"], command["endpoint"], command["data"]
+                )
+                if result is None:
+                    continue  # device not set up (yet); keep the command
+                if (code := result.get("code")) in UNDELIVERED_CODES:
+                    if (
+                        not can_redeliver(command["endpoint"], code)
+                        and command in self._commands
+                    ):
+                        # It may have arrived; sending it again could repeat it
+                        self._commands.remove(command)
+                        self.dropped += 1
+                        self._schedule_save()
+                    break
+                if command in self._commands:
+                    self._commands.remove(command)
+                    self._schedule_save()
+                self.replayed += 1
+                delivered = True
+        finally:
+            self._replay_task = None
+        if delivered:
+            self._retry_delay = OUTBOX_RETRY_DELAY
+        self._schedule_retry()
+        _LOGGER.debug("Outbox replay done, %s commands left", len(self._commands))
+
+    @callback
+    def _schedule_retry(self) -> None:
+        """Check the relay later if commands are waiting and nothing else will."""
+        if (
+            not self._commands
+            or self._unsub_retry is not None
+            or self._replay_task is not None
+        ):
+            return
+        self._unsub_retry = async_call_later(
+            self._hass, self._retry_delay, self._async_retry
+        )
+
+    async def _async_retry(self, now: datetime) -> None:
+        """Replay the waiting commands if the relay answers, then back off."""
+        self._unsub_retry = None
+        if not self._commands:
+            return
+        reachable = await self._probe()
+        self._retry_delay = min(self._retry_delay * 2, OUTBOX_RETRY_MAX_DELAY)
+        if reachable:
+            self.async_kick()
+        self._schedule_retry()
+
+    def _expire(self) -> None:
+        """Drop commands older than the expiry."""
+        cutoff = time.time() - self._expiry
+        kept = [command for command in self._commands if command["queued_at"] >= cutoff]
+        if expired := len(self._commands) - len(kept):
+            self._commands = kept
+            self.expired += expired
+            self._schedule_save()
+
+    def _schedule_save(self) -> None:
+        """Save the outbox after a short delay."""
+        self._save_pending = True
+        self._store.async_delay_save(self._data_to_save, OUTBOX_SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self) -> list[dict[str, Any]]:
+        """Return the queued commands."""
+        self._save_pending = False
+        return list(self._commands)
+
+    async def async_flush(self) -> None:
+        """Write a save that is still waiting for its delay."""
+        if self._save_pending:
+            await self._store.async_save(self._data_to_save())
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return counters for diagnostics."""
+        return {
+            "pending": len(self._commands),
+            "replayed": self.replayed,
+            "expired": self.expired,
+            "dropped": self.dropped,
+        }
+
+    def shutdown(self) -> None:
+        """Stop replaying and checking the relay; queued commands stay on disk."""
+        if self._unsub_retry is not None:
+            self._unsub_retry()
+            self._unsub_retry = None
+        if self._replay_task is not None:
+            self._replay_task.cancel()
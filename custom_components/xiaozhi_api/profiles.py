@@ -0,0 +1,40 @@
+"""Named device profiles for Xiaozhi devices."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, PROFILE_STORE_VERSION
+
+
+class XiaozhiProfileStore:
+    """Named sets of device settings, shared by all devices."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the store."""
+        self._store: Store[dict[str, dict[str, Any]]] = Store(
+            hass, PROFILE_STORE_VERSION, f"{DOMAIN}.profiles"
+        )
+        self.profiles: dict[str, dict[str, Any]] = {}
+
+    async def async_load(self) -> None:
+        """Load the stored profiles."""
+        self.profiles = await self._store.async_load() or {}
+
+    def get(self, name: str) -> dict[str, Any] | None:
+        """Return a profile's settings."""
+        return self.profiles.get(name)
+
+    async def async_save_profile(self, name: str, settings: dict[str, Any]) -> None:
+        """Create or replace a profile."""
+        self.profiles[name] = settings
+        await self._store.async_save(self.profiles)
+
+    async def async_delete_profile(self, name: str) -> bool:
+        """Delete a profile; returns False if it did not exist."""
+        if self.profiles.pop(name, None) is None:
+            return False
+        await self._store.async_save(self.profiles)
+        return True
@@ -0,0 +1,305 @@
+"""Volume and brightness ramps for Xiaozhi devices."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+import heapq
+import itertools
+import logging
+import time
+from typing import TYPE_CHECKING, Any
+
+from .const import (
+    API_BRIGHTNESS,
+    API_VOLUME,
+    CODE_OK,
+    CODE_SUPERSEDED,
+    RAMP_LATENCY_FACTOR,
+    RAMP_LATENCY_WEIGHT,
+    RAMP_MIN_INTERVAL,
+)
+
+if TYPE_CHECKING:
+    from .device import XiaozhiDevice
+
+_LOGGER = logging.getLogger(__name__)
+
+# Progress 0..1 over time -> progress 0..1 between the start and target values
+CURVES: dict[str, Callable[[float], float]] = {
+    "linear": lambda x: x,
+    "ease_in": lambda x: x * x,
+    "ease_out": lambda x: 1 - (1 - x) ** 2,
+    "ease_in_out": lambda x: x * x * (3 - 2 * x),
+}
+
+# Ramped setting -> (endpoint, device setter)
+RAMPED_SETTINGS = {
+    "volume": (API_VOLUME, "set_volume"),
+    "brightness": (API_BRIGHTNESS, "set_brightness"),
+}
+
+RampListener = Callable[[int], None]
+
+
+class _Ramp:
+    """One setting moving from a start value to a target on one device."""
+
+    __slots__ = (
+        "device",
+        "key",
+        "start_value",
+        "target",
+        "started",
+        "duration",
+        "curve",
+        "latency",
+        "sent",
+        "steps",
+        "step",
+        "done",
+    )
+
+    def __init__(
+        self,
+        device: XiaozhiDevice,
+        key: str,
+        start_value: int,
+        target: int,
+        duration: float,
+        curve: str,
+        latency: float,
+    ) -> None:
+        """Initialize the ramp."""
+        self.device = device
+        self.key = key
+        self.start_value = start_value
+        self.target = target
+        self.started = time.monotonic()
+        self.duration = duration
+        self.curve = curve
+        # Smoothed round trip of this ramp's steps
+        self.latency = latency
+        # Last value the device acknowledged during the ramp
+        self.sent: int | None = None
+        self.steps = 0
+        self.step: asyncio.Task[None] | None = None
+        self.done = False
+
+    @property
+    def ident(self) -> tuple[str, str]:
+        """Return the device and setting the ramp is registered under."""
+        return (self.device.device_id, self.key)
+
+    def value_at(self, now: float) -> int:
+        """Return the value the ramp should have reached by now."""
+        progress = min(1.0, (now - self.started) / self.duration)
+        if progress >= 1.0:
+            return self.target
+        shaped = CURVES[self.curve](progress)
+        return round(self.start_value + (self.target - self.start_value) * shaped)
+
+    @property
+    def interval(self) -> float:
+        """Return the time to leave between steps at the relay's current pace."""
+        return max(RAMP_MIN_INTERVAL, RAMP_LATENCY_FACTOR * self.latency)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the ramp's progress for diagnostics."""
+        return {
+            "key": self.key,
+            "from": self.start_value,
+            "to": self.target,
+            "curve": self.curve,
+            "duration": self.duration,
+            "elapsed": round(time.monotonic() - self.started, 1),
+            "value": self.sent,
+            "steps": self.steps,
+            "step_interval": round(self.interval, 3),
+        }
+
+
+class XiaozhiRampScheduler:
+    """Drive every active ramp on every device from one shared timer.
+
+    Ramps wait in a heap ordered by when their next step is due, behind a
+    single loop timer set for the earliest one. A due ramp sends the value
+    its curve has reached, skipping steps that would not change it, and is
+    not due again until that step has been answered and the step interval
+    has passed. The interval follows the relay: RAMP_LATENCY_FACTOR times
+    the ramp's smoothed step latency, but never less than RAMP_MIN_INTERVAL.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the scheduler."""
+        self._ramps: dict[tuple[str, str], _Ramp] = {}
+        self._heap: list[tuple[float, int, _Ramp]] = []
+        self._order = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self._listeners: dict[tuple[str, str], list[RampListener]] = {}
+
+    def start(
+        self,
+        device: XiaozhiDevice,
+        key: str,
+        target: int,
+        duration: float,
+        curve: str,
+        start_value: int | None = None,
+    ) -> dict[str, Any]:
+        """Start ramping a device's setting, replacing any ramp on it.
+
+        Without a start value the ramp starts from the device's known value;
+        if that is unknown too, the target is set in a single step.
+        """
+        self.cancel(device.device_id, key)
+        if start_value is None:
+            start_value = device.state.get(key, target)
+        endpoint, _ = RAMPED_SETTINGS[key]
+        stats = device.client.metrics.endpoints.get(endpoint)
+        ramp = _Ramp(
+            device,
+            key,
+            start_value,
+            target,
+            duration,
+            curve,
+            stats.latency_sum / stats.requests if stats and stats.requests else 0.0,
+        )
+        self._ramps[ramp.ident] = ramp
+        self._push(ramp, ramp.started)
+        return {
+            "code": CODE_OK,
+            "message": "Ramp started",
+            "from": start_value,
+            "to": target,
+        }
+
+    def cancel(self, device_id: str, key: str) -> bool:
+        """Stop a device's ramp on a setting; returns True if one was running.
+
+        A step already sent is left to finish.
+        """
+        if (ramp := self._ramps.pop((device_id, key), None)) is None:
+            return False
+        ramp.done = True
+        _LOGGER.debug("Cancelled %s ramp on %s", key, device_id)
+        return True
+
+    def cancel_device(self, device_id: str) -> None:
+        """Stop every ramp on a device."""
+        for key in RAMPED_SETTINGS:
+            self.cancel(device_id, key)
+
+    def active(self, device_id: str) -> list[dict[str, Any]]:
+        """Return a device's running ramps for diagnostics."""
+        return [
+            ramp.as_dict()
+            for (ramp_device, _), ramp in self._ramps.items()
+            if ramp_device == device_id
+        ]
+
+    def async_add_listener(
+        self, device_id: str, key: str, listener: RampListener
+    ) -> Callable[[], None]:
+        """Listen for acknowledged ramp steps; returns a callable that removes it."""
+        listeners = self._listeners.setdefault((device_id, key), [])
+        listeners.append(listener)
+
+        def _remove() -> None:
+            listeners.remove(listener)
+
+        return _remove
+
+    def _push(self, ramp: _Ramp, due: float) -> None:
+        """Schedule a ramp's next step and rearm the timer if it is earlier."""
+        heapq.heappush(self._heap, (due, next(self._order), ramp))
+        self._arm()
+
+    def _arm(self) -> None:
+        """Point the timer at the earliest due step."""
+        # Ramps that were cancelled while waiting are dropped lazily
+        while self._heap and self._heap[0][2].done:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            return
+        loop = asyncio.get_running_loop()
+        # The timer runs on the loop clock, which is time.monotonic()
+        when = self._heap[0][0]
+        if self._timer is not None:
+            if self._timer.when() <= when:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_at(when, self._fire)
+
+    def _fire(self) -> None:
+        """Run every step that is due."""
+        self._timer = None
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, ramp = heapq.heappop(self._heap)
+            if not ramp.done:
+                self._step(ramp, now)
+        self._arm()
+
+    def _step(self, ramp: _Ramp, now: float) -> None:
+        """Send the ramp's current value, or wait for the next one."""
+        value = ramp.value_at(now)
+        if value == ramp.sent:
+            if value == ramp.target and now - ramp.started >= ramp.duration:
+                # Already at the target, with nothing left to send
+                self._finish(ramp)
+                return
+            self._push(ramp, now + ramp.interval)
+            return
+        ramp.step = asyncio.get_running_loop().create_task(
+            self._async_send_step(ramp, value)
+        )
+
+    async def _async_send_step(self, ramp: _Ramp, value: int) -> None:
+        """Send one step and schedule the next once it is answered."""
+        _, setter = RAMPED_SETTINGS[ramp.key]
+        start = time.monotonic()
+        try:
+            result = await getattr(ramp.device, setter)(value)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Ramp step failed for %s", ramp.device.device_id)
+            result = {}
+        now = time.monotonic()
+        ramp.latency += RAMP_LATENCY_WEIGHT * (now - start - ramp.latency)
+        ramp.steps += 1
+        code = result.get("code")
+        if code == CODE_OK:
+            ramp.sent = value
+            # A cancelled ramp's last step must not overwrite a manual value
+            if not ramp.done:
+                for listener in list(self._listeners.get(ramp.ident, ())):
+                    listener(value)
+        elif code != CODE_SUPERSEDED:
+            _LOGGER.warning(
+                "Ramp step to %s failed for %s: %s",
+                value,
+                ramp.device.device_id,
+                result.get("message"),
+            )
+        if ramp.done:
+            return
+        if value == ramp.target and now - ramp.started >= ramp.duration:
+            # A failed final step is not retried; the outbox, if enabled,
+            # holds the target until the relay is back
+            self._finish(ramp)
+            return
+        self._push(ramp, start + ramp.interval)
+
+    def _finish(self, ramp: _Ramp) -> None:
+        """Retire a ramp that has reached its target."""
+        ramp.done = True
+        self._ramps.pop(ramp.ident, None)
+        _LOGGER.debug(
+            "Finished %s ramp on %s in %d steps",
+            ramp.key,
+            ramp.device.device_id,
+            ramp.steps,
+        )
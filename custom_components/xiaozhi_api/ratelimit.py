@@ -0,0 +1,113 @@
+"""Rate limiting for Xiaozhi relays."""
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict, deque
+import time
+
+from .const import (
+    RATE_LIMIT_DECREASE_FACTOR,
+    RATE_LIMIT_DECREASE_INTERVAL,
+    RATE_LIMIT_INCREASE_STEPS,
+    RATE_LIMIT_MIN_FRACTION,
+    RATE_LIMIT_SLOW_LATENCY,
+)
+
+
+class XiaozhiRateLimiter:
+    """Token bucket shared by every device on one relay account.
+
+    Devices waiting for a token are served round-robin, so one busy device
+    cannot starve the others. The refill rate follows AIMD: it is cut when
+    the relay is overloaded (timeouts, 429 or server errors) or answers
+    slowly, and climbs back in small steps on every other fast answer.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        """Initialize the limiter."""
+        self._max_rate = rate
+        self._min_rate = rate * RATE_LIMIT_MIN_FRACTION
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._decreased = 0.0
+        self._waiters: OrderedDict[str, deque[asyncio.Future[None]]] = OrderedDict()
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def rate(self) -> float:
+        """Return the current refill rate in requests per second."""
+        return self._rate
+
+    @property
+    def waiting(self) -> int:
+        """Return the number of requests waiting for a token."""
+        return sum(len(queue) for queue in self._waiters.values())
+
+    def _refill(self) -> None:
+        """Add the tokens earned since the last refill."""
+        now = time.monotonic()
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+
+    async def async_acquire(self, device_id: str) -> None:
+        """Wait until the device may send a request."""
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            return
+
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[None] = loop.create_future()
+        self._waiters.setdefault(device_id, deque()).append(future)
+        if self._task is None:
+            self._task = loop.create_task(self._async_grant())
+        await future
+
+    async def _async_grant(self) -> None:
+        """Hand out tokens to waiting devices in turn."""
+        try:
+            while self._waiters:
+                self._refill()
+                if self._tokens < 1:
+                    await asyncio.sleep((1 - self._tokens) / self._rate)
+                    continue
+                device_id, queue = next(iter(self._waiters.items()))
+                future = queue.popleft()
+                if queue:
+                    self._waiters.move_to_end(device_id)
+                else:
+                    del self._waiters[device_id]
+                if future.done():
+                    continue
+                self._tokens -= 1
+                future.set_result(None)
+        finally:
+            self._task = None
+
+    def record(self, overloaded: bool, latency: float) -> None:
+        """Adapt the rate to the outcome of a request."""
+        self._refill()
+        if not overloaded and latency < RATE_LIMIT_SLOW_LATENCY:
+            self._rate = min(
+                self._max_rate,
+                self._rate + self._max_rate / RATE_LIMIT_INCREASE_STEPS,
+            )
+            return
+        # Errors tend to arrive in bursts; cut the rate once per interval.
+        now = time.monotonic()
+        if now - self._decreased >= RATE_LIMIT_DECREASE_INTERVAL:
+            self._decreased = now
+            self._rate = max(self._min_rate, self._rate * RATE_LIMIT_DECREASE_FACTOR)
+
+    def shutdown(self) -> None:
+        """Cancel waiting requests."""
+        if self._task is not None:
+            self._task.cancel()
+        for queue in self._waiters.values():
+            for future in queue:
+                future.cancel()
+        self._waiters.clear()
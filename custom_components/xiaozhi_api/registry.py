@@ -0,0 +1,53 @@
+"""Device index for the Xiaozhi API integration."""
+from __future__ import annotations
+
+_MAC_SEPARATORS = str.maketrans("", "", ":-. ")
+
+
+def normalize_mac(value: str) -> str:
+    """Return a MAC address in lower case without separators."""
+    return value.translate(_MAC_SEPARATORS).lower()
+
+
+class XiaozhiDeviceIndex:
+    """Map device MACs and device registry ids to config entry ids."""
+
+    def __init__(self) -> None:
+        """Initialize the index."""
+        self._by_mac: dict[str, str] = {}
+        self._by_registry_id: dict[str, str] = {}
+        self._keys: dict[str, tuple[str, str | None]] = {}
+
+    def __len__(self) -> int:
+        """Return the number of indexed entries."""
+        return len(self._keys)
+
+    def add(
+        self, entry_id: str, device_id: str, registry_id: str | None = None
+    ) -> None:
+        """Index a config entry by its device MAC and device registry id."""
+        self.remove(entry_id)
+        mac = normalize_mac(device_id)
+        self._by_mac[mac] = entry_id
+        if registry_id is not None:
+            self._by_registry_id[registry_id] = entry_id
+        self._keys[entry_id] = (mac, registry_id)
+
+    def remove(self, entry_id: str) -> None:
+        """Drop a config entry from the index."""
+        if (keys := self._keys.pop(entry_id, None)) is None:
+            return
+        mac, registry_id = keys
+        if self._by_mac.get(mac) == entry_id:
+            del self._by_mac[mac]
+        if (
+            registry_id is not None
+            and self._by_registry_id.get(registry_id) == entry_id
+        ):
+            del self._by_registry_id[registry_id]
+
+    def get(self, key: str) -> str | None:
+        """Return the entry id for a MAC (any case or separator) or registry id."""
+        if (entry_id := self._by_registry_id.get(key)) is not None:
+            return entry_id
+        return self._by_mac.get(normalize_mac(key))
@@ -0,0 +1,383 @@
+"""Relay resources shared by Xiaozhi config entries."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+import logging
+import re
+import time
+from typing import TYPE_CHECKING, Any
+
+import aiohttp
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.start import async_at_started
+
+from .api import XiaozhiApiClient
+from .breaker import STATE_CLOSED, XiaozhiCircuitBreaker
+from .metrics import XiaozhiMetrics
+from .outbox import XiaozhiOutbox
+from .ratelimit import XiaozhiRateLimiter
+from .routing import XiaozhiRouter
+from .store import XiaozhiStateStore
+from .tracing import XiaozhiTracer
+from .transport import XiaozhiWebSocketTransport
+from .const import (
+    DATA_RELAYS,
+    CONF_API_URL,
+    CONF_API_KEY,
+    CONF_CONNECTION_LIMIT,
+    CONF_DEDICATED_SESSION,
+    CONF_FALLBACK_URLS,
+    CONF_HEDGE_DELAY,
+    CONF_OUTBOX,
+    CONF_OUTBOX_EXPIRY,
+    CONF_RATE_BURST,
+    CONF_RATE_LIMIT,
+    CONF_TRACE,
+    CONF_TRACE_THRESHOLD,
+    CONF_TRANSPORT,
+    DEFAULT_CONNECTION_LIMIT,
+    DEFAULT_HEDGE_DELAY,
+    DEFAULT_OUTBOX_EXPIRY,
+    DEFAULT_RATE_BURST,
+    DEFAULT_RATE_LIMIT,
+    DEFAULT_TRACE_THRESHOLD,
+    DEFAULT_TRANSPORT,
+    RELAY_DNS_CACHE_TTL,
+    RELAY_KEEPALIVE_TIMEOUT,
+    RELAY_PROBE_TIMEOUT,
+    ROUTE_REFRESH_INTERVAL,
+    TRANSPORT_WEBSOCKET,
+)
+
+if TYPE_CHECKING:
+    from .device import XiaozhiDevice
+
+_LOGGER = logging.getLogger(__name__)
+
+RelayKey = tuple[str, str]
+
+
+def relay_key(api_url: str, api_key: str) -> RelayKey:
+    """Return the key identifying a relay endpoint and account."""
+    return (api_url.rstrip("/"), api_key)
+
+
+# Options shared by every entry on a relay, with their defaults
+RELAY_OPTION_DEFAULTS: dict[str, Any] = {
+    CONF_DEDICATED_SESSION: False,
+    CONF_CONNECTION_LIMIT: DEFAULT_CONNECTION_LIMIT,
+    CONF_RATE_LIMIT: DEFAULT_RATE_LIMIT,
+    CONF_RATE_BURST: DEFAULT_RATE_BURST,
+    CONF_OUTBOX: False,
+    CONF_OUTBOX_EXPIRY: DEFAULT_OUTBOX_EXPIRY,
+    CONF_FALLBACK_URLS: "",
+    CONF_HEDGE_DELAY: DEFAULT_HEDGE_DELAY,
+    CONF_TRANSPORT: DEFAULT_TRANSPORT,
+    CONF_TRACE: False,
+    CONF_TRACE_THRESHOLD: DEFAULT_TRACE_THRESHOLD,
+}
+
+
+def relay_options(options: Mapping[str, Any]) -> dict[str, Any]:
+    """Return the relay-wide settings among an entry's options."""
+    return {
+        key: options.get(key, default) for key, default in RELAY_OPTION_DEFAULTS.items()
+    }
+
+
+def split_urls(value: str) -> list[str]:
+    """Split a comma, space or newline separated list of relay URLs."""
+    return [url.rstrip("/") for url in re.split(r"[\s,]+", value) if url]
+
+
+class XiaozhiRelay:
+    """Resources shared by all config entries that talk to the same relay.
+
+    Settings are taken from the first entry that opens the relay; changing
+    them on any entry copies them to the others and rebuilds the relay. With
+    fallback URLs, the entry's API URL is the primary of several relay URLs
+    serving the same account. Tracing needs its own session, so it implies
+    a dedicated one.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, key: RelayKey, entry: ConfigEntry
+    ) -> None:
+        """Initialize the relay."""
+        self.key = key
+        self.api_url, self.api_key = key
+        self.options = options = relay_options(entry.options)
+        self.entry_ids: set[str] = set()
+        self.devices: dict[str, XiaozhiDevice] = {}
+        self.breaker = XiaozhiCircuitBreaker()
+        self.metrics = XiaozhiMetrics()
+        self.state_store = XiaozhiStateStore(hass, self.api_url, self.api_key)
+        self.limiter: XiaozhiRateLimiter | None = None
+        if (rate := options[CONF_RATE_LIMIT]) > 0:
+            self.limiter = XiaozhiRateLimiter(rate, options[CONF_RATE_BURST])
+        self.outbox: XiaozhiOutbox | None = None
+        if options[CONF_OUTBOX]:
+            self.outbox = XiaozhiOutbox(
+                hass,
+                self.api_url,
+                self.api_key,
+                options[CONF_OUTBOX_EXPIRY] * 60,
+                self._async_replay_command,
+                self._async_reachable,
+            )
+        self._unsub_close: CALLBACK_TYPE | None = None
+        self._unsub_breaker: CALLBACK_TYPE | None = None
+        self._unsub_started: CALLBACK_TYPE | None = None
+        self._probe_task: asyncio.Task[None] | None = None
+        self._unsub_refresh: CALLBACK_TYPE | None = None
+        self.tracer: XiaozhiTracer | None = None
+        if options[CONF_TRACE]:
+            self.tracer = XiaozhiTracer(options[CONF_TRACE_THRESHOLD])
+        self._dedicated = options[CONF_DEDICATED_SESSION] or self.tracer is not None
+        self.router: XiaozhiRouter | None = None
+        urls = [self.api_url, *split_urls(options[CONF_FALLBACK_URLS])]
+        if len(set(urls)) > 1:
+            self.router = XiaozhiRouter(urls)
+            self._unsub_refresh = async_track_time_interval(
+                hass,
+                self._async_refresh_routes,
+                timedelta(seconds=ROUTE_REFRESH_INTERVAL),
+            )
+
+        if self._dedicated:
+            self.session = self._create_session(
+                options[CONF_CONNECTION_LIMIT], self.tracer
+            )
+            self._unsub_close = hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_CLOSE, self._async_handle_close
+            )
+        else:
+            self.session = async_get_clientsession(hass)
+        self.client = XiaozhiApiClient(
+            self.session,
+            self.api_url,
+            self.api_key,
+            breaker=self.breaker,
+            limiter=self.limiter,
+            metrics=self.metrics,
+            router=self.router,
+            hedge_delay=options[CONF_HEDGE_DELAY],
+            transport=(
+                XiaozhiWebSocketTransport(self.session, self.api_key)
+                if options[CONF_TRANSPORT] == TRANSPORT_WEBSOCKET
+                else None
+            ),
+            tracer=self.tracer,
+        )
+
+        if self.outbox is not None:
+            self._unsub_breaker = self.breaker.async_add_listener(
+                self._async_breaker_changed
+            )
+        self._unsub_started = async_at_started(hass, self._async_start_probe)
+
+    @staticmethod
+    def _create_session(
+        limit: int, tracer: XiaozhiTracer | None
+    ) -> aiohttp.ClientSession:
+        """Create a pooled keep-alive session dedicated to this relay.
+
+        aiohttp sets TCP_NODELAY on every connection; it does not pipeline
+        requests, so concurrency comes from the per-host connection pool.
+        """
+        connector = aiohttp.TCPConnector(
+            limit=limit,
+            limit_per_host=limit,
+            use_dns_cache=True,
+            ttl_dns_cache=RELAY_DNS_CACHE_TTL,
+            keepalive_timeout=RELAY_KEEPALIVE_TIMEOUT,
+            enable_cleanup_closed=True,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            trace_configs=None if tracer is None else [tracer.trace_config],
+        )
+
+    async def async_load(self) -> None:
+        """Load the relay's persisted device state and outbox."""
+        await self.state_store.async_load()
+        if self.outbox is not None:
+            await self.outbox.async_load()
+
+    async def _async_replay_command(
+        self, device_id: str, endpoint: str, data: dict[str, Any]
+    ) -> dict[str, Any] | None:
+        """Send a command from the outbox through its device."""
+        if (device := self.devices.get(device_id)) is None:
+            return None
+        return await device.async_replay(endpoint, data)
+
+    async def _async_reachable(self) -> bool:
+        """Check the relay for the outbox; an answer closes the breaker."""
+        urls = [self.api_url] if self.router is None else self.router.urls
+        if not any(await asyncio.gather(*(self._async_check(url) for url in urls))):
+            return False
+        self.breaker.record_success()
+        return True
+
+    @callback
+    def _async_breaker_changed(self) -> None:
+        """Replay the outbox once the relay is reachable again."""
+        if self.outbox is not None and self.breaker.state == STATE_CLOSED:
+            self.outbox.async_kick()
+
+    @callback
+    def _async_start_probe(self, hass: HomeAssistant) -> None:
+        """Check reachability in the background once Home Assistant has started."""
+        self._unsub_started = None
+        self._probe_task = hass.async_create_background_task(
+            self._async_probe(), f"{self.api_url} reachability probe"
+        )
+
+    async def _async_probe(self) -> None:
+        """Check the relay with requests that send no device command.
+
+        Any HTTP answer from one of its URLs shows the relay is reachable; no
+        answer opens the breaker. Real commands take precedence, so the
+        probe's outcome is ignored once they have reported the relay's state.
+        Commands left in the outbox by the previous run are replayed when the
+        relay answers. Every URL is checked, so routing starts from measured
+        latencies.
+        """
+        if self.metrics.endpoints and self.router is None:
+            return
+        urls = [self.api_url] if self.router is None else self.router.urls
+        reached = await asyncio.gather(*(self._async_check(url) for url in urls))
+        if not any(reached):
+            if not self.metrics.endpoints:
+                self.breaker.trip()
+            return
+        if not self.metrics.endpoints:
+            self.breaker.record_success()
+        if self.outbox is not None:
+            self.outbox.async_kick()
+
+    async def _async_refresh_routes(self, now: datetime) -> None:
+        """Check relay URLs that no request has used for a while.
+
+        Keeps the averages of standby URLs current, and brings a URL that
+        refused connections back into rotation once it answers again.
+        """
+        if self.router is not None:
+            await asyncio.gather(
+                *(self._async_check(url) for url in self.router.stale())
+            )
+
+    async def _async_check(self, url: str) -> bool:
+        """Ping one relay URL and report the outcome to the router."""
+        start = time.monotonic()
+        try:
+            await self._async_ping(url)
+        except (asyncio.TimeoutError, aiohttp.ClientError) as err:
+            _LOGGER.debug("Relay %s is unreachable: %s", url, err)
+            if self.router is not None:
+                self.router.record(
+                    url,
+                    time.monotonic() - start,
+                    False,
+                    refused=isinstance(err, aiohttp.ClientConnectorError),
+                )
+            return False
+        if self.router is not None:
+            self.router.record(url, time.monotonic() - start, True)
+        return True
+
+    async def _async_ping(self, url: str) -> None:
+        """Send a request that reaches the relay without a device command."""
+        async with self.session.get(
+            url,
+            timeout=aiohttp.ClientTimeout(total=RELAY_PROBE_TIMEOUT),
+        ) as response:
+            # Reading the body returns the connection to the keep-alive pool
+            await response.read()
+
+    async def async_prewarm(self, count: int) -> int:
+        """Open up to count keep-alive connections ahead of a burst of commands.
+
+        A persistent transport opens its one connection instead. Returns the
+        number of connections that reached the relay.
+        """
+        if not self.breaker.available:
+            return 0
+        if (connector := self.session.connector) is not None:
+            count = min(count, connector.limit_per_host or connector.limit or count)
+        url = (None if self.router is None else self.router.select()) or self.api_url
+        try:
+            if await self.client.transport.async_connect(url):
+                return 1
+        except (asyncio.TimeoutError, aiohttp.ClientError) as err:
+            _LOGGER.debug("Relay %s is unreachable: %s", url, err)
+            return 0
+        reached = await asyncio.gather(
+            *(self._async_check(url) for _ in range(count))
+        )
+        return sum(reached)
+
+    async def _async_handle_close(self, event: Event) -> None:
+        """Close the dedicated session when Home Assistant stops."""
+        self._unsub_close = None
+        await self.async_close()
+
+    async def async_close(self) -> None:
+        """Release the relay's resources."""
+        if self._unsub_started is not None:
+            self._unsub_started()
+            self._unsub_started = None
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+        if self._unsub_close is not None:
+            self._unsub_close()
+            self._unsub_close = None
+        if self._unsub_breaker is not None:
+            self._unsub_breaker()
+            self._unsub_breaker = None
+        if self._unsub_refresh is not None:
+            self._unsub_refresh()
+            self._unsub_refresh = None
+        if self.outbox is not None:
+            self.outbox.shutdown()
+            await self.outbox.async_flush()
+        if self.limiter is not None:
+            self.limiter.shutdown()
+        await self.state_store.async_flush()
+        await self.client.transport.async_close()
+        if self._dedicated and not self.session.closed:
+            await self.session.close()
+
+
+@callback
+def async_acquire_relay(hass: HomeAssistant, entry: ConfigEntry) -> XiaozhiRelay:
+    """Return the shared relay for an entry, creating it on first use."""
+    relays: dict[RelayKey, XiaozhiRelay] = hass.data.setdefault(DATA_RELAYS, {})
+    key = relay_key(entry.data[CONF_API_URL], entry.data[CONF_API_KEY])
+    if (relay := relays.get(key)) is None:
+        relay = relays[key] = XiaozhiRelay(hass, key, entry)
+        _LOGGER.debug("Opened relay %s", relay.api_url)
+    relay.entry_ids.add(entry.entry_id)
+    return relay
+
+
+async def async_release_relay(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Release an entry's hold on its relay, closing it after the last one."""
+    relays: dict[RelayKey, XiaozhiRelay] = hass.data.get(DATA_RELAYS, {})
+    key = relay_key(entry.data[CONF_API_URL], entry.data[CONF_API_KEY])
+    if (relay := relays.get(key)) is None:
+        return
+    relay.entry_ids.discard(entry.entry_id)
+    if not relay.entry_ids:
+        del relays[key]
+        await relay.async_close()
+        _LOGGER.debug("Closed relay %s", relay.api_url)
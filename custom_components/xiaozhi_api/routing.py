@@ -0,0 +1,109 @@
+"""Relay URL selection for Xiaozhi relays."""
+from __future__ import annotations
+
+from collections.abc import Sequence
+import time
+from typing import Any
+
+from .const import (
+    ROUTE_COOLDOWN,
+    ROUTE_EWMA_WEIGHT,
+    ROUTE_MAX_ERROR_RATE,
+    ROUTE_REFRESH_INTERVAL,
+)
+
+
+class _Route:
+    """Smoothed health of one relay URL."""
+
+    __slots__ = ("url", "latency", "error_rate", "down_until", "sampled_at")
+
+    def __init__(self, url: str) -> None:
+        """Initialize the route."""
+        self.url = url
+        self.latency: float | None = None
+        self.error_rate = 0.0
+        self.down_until = 0.0
+        self.sampled_at = 0.0
+
+
+class XiaozhiRouter:
+    """Pick the relay URL for each request.
+
+    Every URL keeps an exponentially weighted latency and error rate.
+    Requests go to the fastest URL whose error rate is acceptable; a URL
+    that refused a connection is skipped for ROUTE_COOLDOWN seconds. URLs
+    that have not answered yet are tried first, in configured order.
+    """
+
+    __slots__ = ("_routes",)
+
+    def __init__(self, urls: Sequence[str]) -> None:
+        """Initialize the router; the first URL is the primary."""
+        self._routes = [_Route(url.rstrip("/")) for url in dict.fromkeys(urls)]
+
+    @property
+    def urls(self) -> list[str]:
+        """Return the relay URLs in configured order."""
+        return [route.url for route in self._routes]
+
+    def select(self, exclude: str | None = None) -> str | None:
+        """Return the URL to send the next request to, if any."""
+        now = time.monotonic()
+        routes = [route for route in self._routes if route.url != exclude]
+        routes = [route for route in routes if route.down_until <= now] or routes
+        if not routes:
+            return None
+        for route in routes:
+            if route.latency is None:
+                return route.url
+        healthy = [
+            route for route in routes if route.error_rate < ROUTE_MAX_ERROR_RATE
+        ] or routes
+        return min(healthy, key=lambda route: route.latency or 0.0).url
+
+    def record(
+        self, url: str, latency: float, ok: bool, refused: bool = False
+    ) -> None:
+        """Fold a request's outcome into its URL's averages.
+
+        A refused connection says nothing about latency but takes the URL out
+        of rotation for a while.
+        """
+        for route in self._routes:
+            if route.url == url:
+                break
+        else:
+            return
+        now = time.monotonic()
+        route.sampled_at = now
+        sample = 0.0 if ok else 1.0
+        route.error_rate += ROUTE_EWMA_WEIGHT * (sample - route.error_rate)
+        if refused:
+            route.down_until = now + ROUTE_COOLDOWN
+            return
+        route.down_until = 0.0
+        if route.latency is None:
+            route.latency = latency
+        else:
+            route.latency += ROUTE_EWMA_WEIGHT * (latency - route.latency)
+
+    def stale(self) -> list[str]:
+        """Return the URLs without a recent sample."""
+        cutoff = time.monotonic() - ROUTE_REFRESH_INTERVAL
+        return [route.url for route in self._routes if route.sampled_at <= cutoff]
+
+    def as_dict(self) -> list[dict[str, Any]]:
+        """Return each URL's averages for diagnostics."""
+        now = time.monotonic()
+        return [
+            {
+                "url": route.url,
+                "latency_ms": (
+                    None if route.latency is None else round(route.latency * 1000, 1)
+                ),
+                "error_rate": round(route.error_rate, 3),
+                "down": route.down_until > now,
+            }
+            for route in self._routes
+        ]
@@ -1,13 +1,22 @@
 """Select platform for Xiaozhi API."""
 from __future__ import annotations
 
+from functools import partial
+
 from homeassistant.components.select import SelectEntity, SelectEntityDescription
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
-from .const import DOMAIN, CONF_DEVICE_ID, CONF_DEVICE_NAME, PLAYER_MODES, THEMES
+from .const import DOMAIN, PLAYER_MODES, THEMES
+from .device import XiaozhiDevice
+from .entity import XiaozhiEntity
+
+# Maps each select to the option values sent to the relay.
+SELECT_VALUES = {
+    "player_mode": PLAYER_MODES,
+    "theme": THEMES,
+}
 
 SELECT_DESCRIPTIONS = [
     SelectEntityDescription(
@@ -31,41 +40,33 @@ async def async_setup_entry(
     async_add_entities: AddEntitiesCallback,
 ) -> None:
     """Set up Xiaozhi selects."""
-    data = hass.data[DOMAIN][entry.entry_id]
-    client = data["client"]
-    device_id = entry.data[CONF_DEVICE_ID]
-    device_name = entry.data.get(CONF_DEVICE_NAME, device_id)
+    device: XiaozhiDevice = hass.data[DOMAIN][entry.entry_id]
 
     entities = [
-        XiaozhiSelect(client, device_id, device_name, description)
-        for description in SELECT_DESCRIPTIONS
+        XiaozhiSelect(device, description) for description in SELECT_DESCRIPTIONS
     ]
     async_add_entities(entities)
 
 
-class XiaozhiSelect(SelectEntity):
+class XiaozhiSelect(XiaozhiEntity, SelectEntity):
     """Xiaozhi select entity."""
 
-    _attr_has_entity_name = True
+    entity_description: SelectEntityDescription
+    _value_attr = "_attr_current_option"
 
     def __init__(
-        self,
-        client,
-        device_id: str,
-        device_name: str,
-        description: SelectEntityDescription,
+        self, device: XiaozhiDevice, description: SelectEntityDescription
     ) -> None:
         """Initialize the select."""
-        self._client = client
-        self._device_id = device_id
-        self.entity_description = description
-        self._attr_unique_id = f"{device_id}_{description.key}"
-        self._attr_current_option = description.options[0] if description.options else None
-        self._attr_device_info = DeviceInfo(
-            identifiers={(DOMAIN, device_id)},
-            name=device_name,
-            manufacturer="Xiaozhi",
-            model="Smart Device",
+        super().__init__(device, description)
+        stored = device.state.get(description.key)
+        self._attr_current_option = next(
+            (
+                option
+                for option, value in SELECT_VALUES[description.key].items()
+                if value == stored
+            ),
+            None,
         )
 
     async def async_select_option(self, option: str) -> None:
@@ -73,9 +74,7 @@ class XiaozhiSelect(SelectEntity):
         key = self.entity_description.key
         if key == "player_mode":
             mode = PLAYER_MODES.get(option, option)
-            await self._client.set_player_mode(mode)
+            await self._async_act(partial(self._device.set_player_mode, mode), option)
         elif key == "theme":
             theme = THEMES.get(option, option)
-            await self._client.set_theme(theme)
-        self._attr_current_option = option
-        self.async_write_ha_state()
+            await self._async_act(partial(self._device.set_theme, theme), option)
@@ -0,0 +1,135 @@
+"""Sensor platform for Xiaozhi API."""
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Any
+
+from homeassistant.components.sensor import (
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import UnitOfTime
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from .const import DOMAIN
+from .device import XiaozhiDevice
+from .metrics import EndpointStats
+
+# Diagnostic values are read from memory, so polling is cheap and keeps
+# state writes off the command path.
+SCAN_INTERVAL = timedelta(seconds=10)
+
+SENSOR_DESCRIPTIONS = [
+    SensorEntityDescription(
+        key="queue_depth",
+        translation_key="queue_depth",
+        icon="mdi:tray-full",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    SensorEntityDescription(
+        key="queue_wait",
+        translation_key="queue_wait",
+        icon="mdi:timer-sand",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    SensorEntityDescription(
+        key="request_latency",
+        translation_key="request_latency",
+        icon="mdi:timer-outline",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    SensorEntityDescription(
+        key="relay_latency",
+        translation_key="relay_latency",
+        icon="mdi:server-network",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+]
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Set up Xiaozhi sensors."""
+    device: XiaozhiDevice = hass.data[DOMAIN][entry.entry_id]
+
+    entities = [
+        XiaozhiSensor(device, description) for description in SENSOR_DESCRIPTIONS
+    ]
+    async_add_entities(entities)
+
+
+class XiaozhiSensor(SensorEntity):
+    """Xiaozhi diagnostic sensor entity."""
+
+    _attr_has_entity_name = True
+
+    def __init__(
+        self, device: XiaozhiDevice, description: SensorEntityDescription
+    ) -> None:
+        """Initialize the sensor."""
+        self._device = device
+        self.entity_description = description
+        self._attr_unique_id = f"{device.device_id}_{description.key}"
+        self._attr_device_info = device.device_info
+
+    def _latency_stats(self) -> EndpointStats | None:
+        """Return the request stats behind a latency sensor."""
+        key = self.entity_description.key
+        if key == "request_latency":
+            return self._device.metrics.total()
+        if key == "relay_latency":
+            return self._device.client.metrics.total()
+        return None
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the sensor value."""
+        key = self.entity_description.key
+        dispatcher = self._device.dispatcher
+        if key == "queue_depth":
+            return dispatcher.depth
+        if key == "queue_wait":
+            return round(dispatcher.last_wait * 1000, 1)
+        if (stats := self._latency_stats()) is not None:
+            if (p95 := stats.quantile(0.95)) is not None:
+                return p95 * 1000
+        return None
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return queue and request counters."""
+        if self.entity_description.key == "queue_wait":
+            dispatcher = self._device.dispatcher
+            return {
+                "max_wait_ms": round(dispatcher.max_wait * 1000, 1),
+                "dispatched": dispatcher.dispatched,
+                "superseded": dispatcher.superseded,
+            }
+        if (stats := self._latency_stats()) is not None:
+            p50 = stats.quantile(0.5)
+            p99 = stats.quantile(0.99)
+            return {
+                "requests": stats.requests,
+                "errors": stats.errors,
+                "p50_ms": None if p50 is None else p50 * 1000,
+                "p99_ms": None if p99 is None else p99 * 1000,
+            }
+        return None
@@ -0,0 +1,581 @@
+"""Services for the Xiaozhi API integration."""
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from functools import partial
+import logging
+import time
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv, device_registry as dr
+
+from .const import (
+    DOMAIN,
+    DATA_DEVICE_INDEX,
+    DATA_PROFILES,
+    DATA_RELAYS,
+    ATTR_AREA_ID,
+    ATTR_CLEAR,
+    ATTR_CURVE,
+    ATTR_DEVICE_ID,
+    ATTR_DURATION,
+    ATTR_MAX_CONCURRENCY,
+    ATTR_FORCE,
+    ATTR_NAME,
+    ATTR_PROFILE,
+    ATTR_EVENT_TYPE,
+    ATTR_START,
+    ATTR_TIMEOUT,
+    ALL_DEVICES,
+    BROADCAST_TIMEOUT,
+    CODE_OK,
+    CODE_CLIENT_ERROR,
+    CHAT_STREAM_TIMEOUT,
+    DEFAULT_MAX_CONCURRENCY,
+    MUSIC_TRACK_MAX_DURATION,
+    PLAYER_MODES,
+    RAMP_MAX_DURATION,
+    THEMES,
+)
+from .broadcast import XiaozhiBarrier
+from .chat import EventTextSource
+from .device import XiaozhiDevice
+from .profiles import XiaozhiProfileStore
+from .ramp import CURVES
+from .registry import XiaozhiDeviceIndex
+from .relay import XiaozhiRelay
+
+_LOGGER = logging.getLogger(__name__)
+
+DeviceCommand = Callable[[XiaozhiDevice], Awaitable[dict[str, Any]]]
+ServiceCommand = Callable[[ServiceCall, XiaozhiDevice], Awaitable[dict[str, Any]]]
+
+TARGET_SCHEMA = {
+    vol.Optional(ATTR_DEVICE_ID): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional(ATTR_AREA_ID): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional(ATTR_MAX_CONCURRENCY, default=DEFAULT_MAX_CONCURRENCY): vol.All(
+        vol.Coerce(int), vol.Range(min=1, max=100)
+    ),
+    vol.Optional(ATTR_FORCE, default=False): cv.boolean,
+}
+
+PERCENT = vol.All(vol.Coerce(int), vol.Range(min=0, max=100))
+
+# Settings a profile can hold, with the option names the entities use
+PROFILE_SCHEMA = {
+    vol.Optional("volume"): PERCENT,
+    vol.Optional("brightness"): PERCENT,
+    vol.Optional("theme"): vol.In(list(THEMES)),
+    vol.Optional("player_mode"): vol.In(list(PLAYER_MODES)),
+}
+PROFILE_SETTINGS = [str(key) for key in PROFILE_SCHEMA]
+
+RAMP_SCHEMA = {
+    vol.Required(ATTR_DURATION): vol.All(
+        vol.Coerce(float), vol.Range(min=1, max=RAMP_MAX_DURATION)
+    ),
+    vol.Optional(ATTR_CURVE, default="linear"): vol.In(list(CURVES)),
+    vol.Optional(ATTR_START): PERCENT,
+}
+
+
+def _async_resolve_targets(
+    hass: HomeAssistant, call: ServiceCall
+) -> tuple[list[XiaozhiDevice], list[str]]:
+    """Resolve device MACs, device registry ids, areas or "all" to devices.
+
+    Returns the matched devices and the requested ids that matched nothing.
+    """
+    entries: dict[str, XiaozhiDevice] = hass.data.get(DOMAIN, {})
+    requested: list[str] = call.data.get(ATTR_DEVICE_ID, [])
+    if ALL_DEVICES in requested:
+        return list(entries.values()), []
+
+    index: XiaozhiDeviceIndex | None = hass.data.get(DATA_DEVICE_INDEX)
+    if index is None:
+        return [], list(requested)
+
+    requested_keys = set(requested)
+    keys = list(requested)
+    if area_ids := call.data.get(ATTR_AREA_ID):
+        dev_reg = dr.async_get(hass)
+        for area_id in area_ids:
+            keys.extend(
+                device.id for device in dr.async_entries_for_area(dev_reg, area_id)
+            )
+
+    targets: dict[str, XiaozhiDevice] = {}
+    missing: list[str] = []
+    for key in keys:
+        if (entry_id := index.get(key)) is not None and entry_id in entries:
+            targets[entry_id] = entries[entry_id]
+        elif key in requested_keys:
+            _LOGGER.error("Device not found: %s", key)
+            missing.append(key)
+    return list(targets.values()), missing
+
+
+async def _async_fan_out(
+    hass: HomeAssistant, call: ServiceCall, command: DeviceCommand
+) -> ServiceResponse:
+    """Run a command on every targeted device with bounded concurrency."""
+    targets, missing = _async_resolve_targets(hass, call)
+    return await _async_run_on_targets(
+        targets, missing, call.data[ATTR_MAX_CONCURRENCY], command
+    )
+
+
+async def _async_run_on_targets(
+    targets: list[XiaozhiDevice],
+    missing: list[str],
+    max_concurrency: int,
+    command: DeviceCommand,
+) -> dict[str, Any]:
+    """Run a command on resolved devices and collect per-device results."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _async_run(device: XiaozhiDevice) -> dict[str, Any]:
+        async with semaphore:
+            start = time.monotonic()
+            try:
+                result = await command(device)
+            except Exception as err:  # pylint: disable=broad-except
+                _LOGGER.exception("Command failed for %s", device.device_id)
+                result = {"code": CODE_CLIENT_ERROR, "message": str(err)}
+            latency = time.monotonic() - start
+        response = {
+            "device_id": device.device_id,
+            "ok": result.get("code") == CODE_OK,
+            "code": result.get("code"),
+            "message": result.get("message"),
+            "latency_ms": round(latency * 1000, 1),
+        }
+        # Commands may add details, such as per-setting results
+        response.update(
+            (key, value)
+            for key, value in result.items()
+            if key not in ("code", "message")
+        )
+        return response
+
+    results = list(await asyncio.gather(*(_async_run(device) for device in targets)))
+    results.extend(
+        {
+            "device_id": device_id,
+            "ok": False,
+            "code": None,
+            "message": "Device not found",
+            "latency_ms": None,
+        }
+        for device_id in missing
+    )
+    return {"results": results}
+
+
+async def _send_chat_message(
+    call: ServiceCall, device: XiaozhiDevice
+) -> dict[str, Any]:
+    """Send chat message service."""
+    return await device.async_send_chat_text(
+        call.data["message"], call.data[ATTR_FORCE]
+    )
+
+
+async def _play_music(
+    call: ServiceCall, device: XiaozhiDevice
+) -> dict[str, Any]:
+    """Play music service."""
+    return await device.play_music(call.data["keywords"], call.data[ATTR_FORCE])
+
+
+async def _enqueue_music(
+    call: ServiceCall, device: XiaozhiDevice
+) -> dict[str, Any]:
+    """Enqueue music service."""
+    result = await device.async_enqueue_music(
+        call.data["keywords"], call.data.get(ATTR_DURATION)
+    )
+    return {**result, **device.music_queue.as_dict()}
+
+
+async def _clear_queue(
+    call: ServiceCall, device: XiaozhiDevice
+) -> dict[str, Any]:
+    """Clear queue service."""
+    return device.clear_music_queue()
+
+
+async def _set_volume(
+    call: ServiceCall, device: XiaozhiDevice
+) -> dict[str, Any]:
+    """Set volume service."""
+    if device.ramps is not None:
+        device.ramps.cancel(device.device_id, "volume")
+    return await device.coalescer.async_submit(
+        "volume",
+        call.data["volume"],
+        partial(device.set_volume, force=call.data[ATTR_FORCE]),
+    )
+
+
+async def _set_brightness(
+    call: ServiceCall, device: XiaozhiDevice
+) -> dict[str, Any]:
+    """Set brightness service."""
+    if device.ramps is not None:
+        device.ramps.cancel(device.device_id, "brightness")
+    return await device.coalescer.async_submit(
+        "brightness",
+        call.data["brightness"],
+        partial(device.set_brightness, force=call.data[ATTR_FORCE]),
+    )
+
+
+async def _async_ramp(
+    key: str, call: ServiceCall, device: XiaozhiDevice
+) -> dict[str, Any]:
+    """Start a volume or brightness ramp; returns once it is scheduled."""
+    if device.ramps is None:
+        return {"code": CODE_CLIENT_ERROR, "message": "Ramps are not available"}
+    return device.ramps.start(
+        device,
+        key,
+        call.data[key],
+        call.data[ATTR_DURATION],
+        call.data[ATTR_CURVE],
+        call.data.get(ATTR_START),
+    )
+
+
+async def _set_player_mode(
+    call: ServiceCall, device: XiaozhiDevice
+) -> dict[str, Any]:
+    """Set player mode service."""
+    mode = PLAYER_MODES.get(call.data["mode"], call.data["mode"])
+    return await device.set_player_mode(mode, call.data[ATTR_FORCE])
+
+
+async def _set_theme(
+    call: ServiceCall, device: XiaozhiDevice
+) -> dict[str, Any]:
+    """Set theme service."""
+    return await device.set_theme(call.data["theme"], call.data[ATTR_FORCE])
+
+
+async def _async_handle_service(
+    hass: HomeAssistant, handler: ServiceCommand, call: ServiceCall
+) -> ServiceResponse:
+    """Fan a service call out to every targeted device."""
+    response = await _async_fan_out(
+        hass, call, lambda device: handler(call, device)
+    )
+    return response if call.return_response else None
+
+
+async def _async_stream_chat_message(
+    hass: HomeAssistant, call: ServiceCall
+) -> ServiceResponse:
+    """Speak text streamed through events on every targeted device."""
+    source = EventTextSource(hass, call.data[ATTR_EVENT_TYPE], call.data[ATTR_TIMEOUT])
+    try:
+        response = await _async_fan_out(
+            hass,
+            call,
+            lambda device: device.async_send_chat_stream(
+                source.iterate(), call.data[ATTR_FORCE]
+            ),
+        )
+    except BaseException:
+        source.close()
+        raise
+    # Streams still reading close the source on its end event or timeout
+    if not any(result.get("streaming") for result in response["results"]):
+        source.close()
+    return response if call.return_response else None
+
+
+async def _async_broadcast(
+    hass: HomeAssistant, call: ServiceCall
+) -> ServiceResponse:
+    """Start a chat message or song on every targeted device at once.
+
+    Connections to each relay are opened beforehand, then all requests are
+    held at a barrier and released together. The response reports the
+    spread between the first and last request as skew_ms.
+    """
+    targets, missing = _async_resolve_targets(hass, call)
+    relays = Counter(device.relay for device in targets if device.relay is not None)
+    warmed = await asyncio.gather(
+        *(relay.async_prewarm(count) for relay, count in relays.items())
+    )
+
+    barrier = XiaozhiBarrier(len(targets), call.data[ATTR_TIMEOUT])
+    force = call.data[ATTR_FORCE]
+
+    async def _async_send(device: XiaozhiDevice) -> dict[str, Any]:
+        try:
+            if (message := call.data.get("message")) is not None:
+                return await device.send_chat_message(message, force, barrier)
+            return await device.play_music(call.data["keywords"], force, barrier)
+        finally:
+            barrier.leave(device.device_id)
+
+    # Every device must be able to reach the barrier at once
+    response = await _async_run_on_targets(
+        targets, missing, max(len(targets), 1), _async_send
+    )
+    for result in response["results"]:
+        offset = barrier.offset(result["device_id"])
+        result["offset_ms"] = None if offset is None else round(offset * 1000, 1)
+    skew = barrier.skew
+    response["skew_ms"] = None if skew is None else round(skew * 1000, 1)
+    response["warmed_connections"] = sum(warmed)
+    return response if call.return_response else None
+
+
+def _profile_to_relay(settings: dict[str, Any]) -> dict[str, Any]:
+    """Translate profile option names to the values sent to the relay."""
+    relay_settings = dict(settings)
+    if "theme" in settings:
+        relay_settings["theme"] = THEMES[settings["theme"]]
+    if "player_mode" in settings:
+        relay_settings["player_mode"] = PLAYER_MODES[settings["player_mode"]]
+    return relay_settings
+
+
+async def _async_apply_profile(
+    hass: HomeAssistant, call: ServiceCall
+) -> ServiceResponse:
+    """Apply a stored profile and/or inline settings to every targeted device.
+
+    Inline settings override the profile's.
+    """
+    settings: dict[str, Any] = {}
+    if (name := call.data.get(ATTR_PROFILE)) is not None:
+        profiles: XiaozhiProfileStore = hass.data[DATA_PROFILES]
+        if (profile := profiles.get(name)) is None:
+            raise HomeAssistantError(f"Unknown profile: {name}")
+        settings.update(profile)
+    settings.update(
+        {key: call.data[key] for key in PROFILE_SETTINGS if key in call.data}
+    )
+    relay_settings = _profile_to_relay(settings)
+    response = await _async_fan_out(
+        hass,
+        call,
+        lambda device: device.async_apply(relay_settings, call.data[ATTR_FORCE]),
+    )
+    return response if call.return_response else None
+
+
+async def _async_save_profile(
+    hass: HomeAssistant, call: ServiceCall
+) -> ServiceResponse:
+    """Create or replace a named profile."""
+    profiles: XiaozhiProfileStore = hass.data[DATA_PROFILES]
+    settings = {key: call.data[key] for key in PROFILE_SETTINGS if key in call.data}
+    await profiles.async_save_profile(call.data[ATTR_NAME], settings)
+    if not call.return_response:
+        return None
+    return {
+        "code": CODE_OK,
+        "message": "Profile saved",
+        "profile": call.data[ATTR_NAME],
+        "settings": settings,
+    }
+
+
+async def _async_delete_profile(
+    hass: HomeAssistant, call: ServiceCall
+) -> ServiceResponse:
+    """Delete a named profile."""
+    profiles: XiaozhiProfileStore = hass.data[DATA_PROFILES]
+    if not await profiles.async_delete_profile(call.data[ATTR_NAME]):
+        raise HomeAssistantError(f"Unknown profile: {call.data[ATTR_NAME]}")
+    if not call.return_response:
+        return None
+    return {
+        "code": CODE_OK,
+        "message": "Profile deleted",
+        "profile": call.data[ATTR_NAME],
+    }
+
+
+async def _async_get_slow_requests(
+    hass: HomeAssistant, call: ServiceCall
+) -> ServiceResponse:
+    """Return the slow commands traced on the targeted devices' relays.
+
+    Without targets every relay is included.
+    """
+    relays: list[XiaozhiRelay]
+    if ATTR_DEVICE_ID in call.data or ATTR_AREA_ID in call.data:
+        targets, _ = _async_resolve_targets(hass, call)
+        relays = list(
+            dict.fromkeys(
+                device.relay for device in targets if device.relay is not None
+            )
+        )
+    else:
+        relays = list(hass.data.get(DATA_RELAYS, {}).values())
+    response: list[dict[str, Any]] = []
+    for relay in relays:
+        if relay.tracer is None:
+            response.append({"api_url": relay.api_url, "tracing": False})
+            continue
+        response.append(
+            {"api_url": relay.api_url, "tracing": True, **relay.tracer.as_dict()}
+        )
+        if call.data[ATTR_CLEAR]:
+            relay.tracer.clear()
+    return {"relays": response}
+
+
+SERVICES: dict[str, tuple[ServiceCommand, dict[Any, Any]]] = {
+    "send_chat_message": (_send_chat_message, {vol.Required("message"): cv.string}),
+    "play_music": (_play_music, {vol.Required("keywords"): cv.string}),
+    "enqueue_music": (
+        _enqueue_music,
+        {
+            vol.Required("keywords"): cv.string,
+            vol.Optional(ATTR_DURATION): vol.All(
+                vol.Coerce(float), vol.Range(min=1, max=MUSIC_TRACK_MAX_DURATION)
+            ),
+        },
+    ),
+    "clear_queue": (_clear_queue, {}),
+    "set_volume": (_set_volume, {vol.Required("volume"): PERCENT}),
+    "set_brightness": (_set_brightness, {vol.Required("brightness"): PERCENT}),
+    "ramp_volume": (
+        partial(_async_ramp, "volume"),
+        {vol.Required("volume"): PERCENT, **RAMP_SCHEMA},
+    ),
+    "ramp_brightness": (
+        partial(_async_ramp, "brightness"),
+        {vol.Required("brightness"): PERCENT, **RAMP_SCHEMA},
+    ),
+    "set_player_mode": (_set_player_mode, {vol.Required("mode"): cv.string}),
+    "set_theme": (_set_theme, {vol.Required("theme"): cv.string}),
+}
+
+
+async def async_setup_services(hass: HomeAssistant) -> None:
+    """Set up services for Xiaozhi API."""
+    if hass.services.has_service(DOMAIN, "send_chat_message"):
+        return
+
+    for service, (handler, fields) in SERVICES.items():
+        hass.services.async_register(
+            DOMAIN,
+            service,
+            partial(_async_handle_service, hass, handler),
+            schema=vol.All(
+                vol.Schema({**TARGET_SCHEMA, **fields}),
+                cv.has_at_least_one_key(ATTR_DEVICE_ID, ATTR_AREA_ID),
+            ),
+            supports_response=SupportsResponse.OPTIONAL,
+        )
+
+    hass.services.async_register(
+        DOMAIN,
+        "stream_chat_message",
+        partial(_async_stream_chat_message, hass),
+        schema=vol.All(
+            vol.Schema(
+                {
+                    **TARGET_SCHEMA,
+                    vol.Required(ATTR_EVENT_TYPE): cv.string,
+                    vol.Optional(ATTR_TIMEOUT, default=CHAT_STREAM_TIMEOUT): vol.All(
+                        vol.Coerce(float), vol.Range(min=1, max=600)
+                    ),
+                }
+            ),
+            cv.has_at_least_one_key(ATTR_DEVICE_ID, ATTR_AREA_ID),
+        ),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    hass.services.async_register(
+        DOMAIN,
+        "broadcast",
+        partial(_async_broadcast, hass),
+        schema=vol.All(
+            vol.Schema(
+                {
+                    vol.Optional(ATTR_DEVICE_ID): TARGET_SCHEMA[ATTR_DEVICE_ID],
+                    vol.Optional(ATTR_AREA_ID): TARGET_SCHEMA[ATTR_AREA_ID],
+                    vol.Optional(ATTR_FORCE, default=False): cv.boolean,
+                    vol.Exclusive("message", "content"): cv.string,
+                    vol.Exclusive("keywords", "content"): cv.string,
+                    vol.Optional(ATTR_TIMEOUT, default=BROADCAST_TIMEOUT): vol.All(
+                        vol.Coerce(float), vol.Range(min=1, max=60)
+                    ),
+                }
+            ),
+            cv.has_at_least_one_key(ATTR_DEVICE_ID, ATTR_AREA_ID),
+            cv.has_at_least_one_key("message", "keywords"),
+        ),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    hass.services.async_register(
+        DOMAIN,
+        "get_slow_requests",
+        partial(_async_get_slow_requests, hass),
+        schema=vol.Schema(
+            {
+                vol.Optional(ATTR_DEVICE_ID): TARGET_SCHEMA[ATTR_DEVICE_ID],
+                vol.Optional(ATTR_AREA_ID): TARGET_SCHEMA[ATTR_AREA_ID],
+                vol.Optional(ATTR_CLEAR, default=False): cv.boolean,
+            }
+        ),
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    profiles = hass.data[DATA_PROFILES] = XiaozhiProfileStore(hass)
+    await profiles.async_load()
+    hass.services.async_register(
+        DOMAIN,
+        "apply_profile",
+        partial(_async_apply_profile, hass),
+        schema=vol.All(
+            vol.Schema(
+                {
+                    **TARGET_SCHEMA,
+                    vol.Optional(ATTR_PROFILE): cv.string,
+                    **PROFILE_SCHEMA,
+                }
+            ),
+            cv.has_at_least_one_key(ATTR_DEVICE_ID, ATTR_AREA_ID),
+            cv.has_at_least_one_key(ATTR_PROFILE, *PROFILE_SETTINGS),
+        ),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "save_profile",
+        partial(_async_save_profile, hass),
+        schema=vol.All(
+            vol.Schema({vol.Required(ATTR_NAME): cv.string, **PROFILE_SCHEMA}),
+            cv.has_at_least_one_key(*PROFILE_SETTINGS),
+        ),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "delete_profile",
+        partial(_async_delete_profile, hass),
+        schema=vol.Schema({vol.Required(ATTR_NAME): cv.string}),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
@@ -0,0 +1,78 @@
+"""Persistent device state for Xiaozhi relays."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, STATE_SAVE_DELAY, STATE_STORE_VERSION
+
+
+def relay_storage_key(kind: str, api_url: str, api_key: str) -> str:
+    """Return the storage key for one kind of data kept per relay account."""
+    digest = hashlib.sha256(f"{api_url}\n{api_key}".encode()).hexdigest()
+    return f"{DOMAIN}.{kind}_{digest[:16]}"
+
+
+class XiaozhiStateStore:
+    """Last acknowledged settings of every device on a relay.
+
+    The file is read once, however many entries share the relay, and saves
+    are batched so a burst of writes costs a single disk write.
+    """
+
+    def __init__(self, hass: HomeAssistant, api_url: str, api_key: str) -> None:
+        """Initialize the store."""
+        self._store: Store[dict[str, dict[str, Any]]] = Store(
+            hass, STATE_STORE_VERSION, relay_storage_key("state", api_url, api_key)
+        )
+        self._devices: dict[str, dict[str, Any]] = {}
+        self._load_task: asyncio.Task[None] | None = None
+        self._save_pending = False
+
+    async def async_load(self) -> None:
+        """Load the stored state; concurrent and repeated calls share one read."""
+        if self._load_task is None:
+            self._load_task = asyncio.ensure_future(self._async_load())
+        await asyncio.shield(self._load_task)
+
+    async def _async_load(self) -> None:
+        """Read the state file."""
+        if stored := await self._store.async_load():
+            for device_id, state in stored.items():
+                self._devices.setdefault(device_id, {}).update(state)
+
+    @callback
+    def device(self, device_id: str) -> dict[str, Any]:
+        """Return the live state dict of a device."""
+        return self._devices.setdefault(device_id, {})
+
+    @callback
+    def async_schedule_save(self) -> None:
+        """Save the state after a short delay."""
+        self._save_pending = True
+        self._store.async_delay_save(self._data_to_save, STATE_SAVE_DELAY)
+
+    async def async_flush(self) -> None:
+        """Write a save that is still waiting for its delay.
+
+        A store created later for the same relay reads the file, so a
+        pending save must not be lost when the relay closes.
+        """
+        if self._save_pending:
+            await self._store.async_save(self._data_to_save())
+
+    @callback
+    def _data_to_save(self) -> dict[str, dict[str, Any]]:
+        """Return the devices that have known state."""
+        self._save_pending = False
+        return {device_id: state for device_id, state in self._devices.items() if state}
+
+    async def async_remove_device(self, device_id: str) -> None:
+        """Forget a device's state."""
+        await self.async_load()
+        if self._devices.pop(device_id, None):
+            await self._store.async_save(self._data_to_save())
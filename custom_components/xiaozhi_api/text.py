@@ -1,13 +1,18 @@
 """Text platform for Xiaozhi API."""
 from __future__ import annotations
 
+from functools import partial
+from typing import Any
+
 from homeassistant.components.text import TextEntity, TextEntityDescription, TextMode
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import MAX_LENGTH_STATE_STATE
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
-from .const import DOMAIN, CONF_DEVICE_ID, CONF_DEVICE_NAME
+from .const import DOMAIN
+from .device import XiaozhiDevice
+from .entity import XiaozhiEntity
 
 TEXT_DESCRIPTIONS = [
     TextEntityDescription(
@@ -29,51 +34,52 @@ async def async_setup_entry(
     async_add_entities: AddEntitiesCallback,
 ) -> None:
     """Set up Xiaozhi text entities."""
-    data = hass.data[DOMAIN][entry.entry_id]
-    client = data["client"]
-    device_id = entry.data[CONF_DEVICE_ID]
-    device_name = entry.data.get(CONF_DEVICE_NAME, device_id)
+    device: XiaozhiDevice = hass.data[DOMAIN][entry.entry_id]
 
     entities = [
-        XiaozhiText(client, device_id, device_name, description)
-        for description in TEXT_DESCRIPTIONS
+        XiaozhiText(device, description) for description in TEXT_DESCRIPTIONS
     ]
     async_add_entities(entities)
 
 
-class XiaozhiText(TextEntity):
+class XiaozhiText(XiaozhiEntity, TextEntity):
     """Xiaozhi text entity."""
 
-    _attr_has_entity_name = True
+    entity_description: TextEntityDescription
+    _value_attr = "_attr_native_value"
     _attr_mode = TextMode.TEXT
-    _attr_native_max = 500
+    # The value is kept as the entity state, which Home Assistant caps;
+    # longer messages go through the send_chat_message service.
+    _attr_native_max = MAX_LENGTH_STATE_STATE
 
     def __init__(
-        self,
-        client,
-        device_id: str,
-        device_name: str,
-        description: TextEntityDescription,
+        self, device: XiaozhiDevice, description: TextEntityDescription
     ) -> None:
         """Initialize the text entity."""
-        self._client = client
-        self._device_id = device_id
-        self.entity_description = description
-        self._attr_unique_id = f"{device_id}_{description.key}"
+        super().__init__(device, description)
         self._attr_native_value = ""
-        self._attr_device_info = DeviceInfo(
-            identifiers={(DOMAIN, device_id)},
-            name=device_name,
-            manufacturer="Xiaozhi",
-            model="Smart Device",
-        )
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the music queue on the play music entity."""
+        if self.entity_description.key == "play_music":
+            self.async_on_remove(
+                self._device.music_queue.async_add_listener(self.async_write_ha_state)
+            )
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return the music queue along with the command status."""
+        attributes = super().extra_state_attributes
+        if self.entity_description.key == "play_music":
+            attributes.update(self._device.music_queue.as_dict())
+        return attributes
 
     async def async_set_value(self, value: str) -> None:
         """Set the value and send to device."""
         key = self.entity_description.key
         if key == "chat_message":
-            await self._client.send_chat_message(value)
+            await self._async_act(
+                partial(self._device.async_send_chat_text, value), value
+            )
         elif key == "play_music":
-            await self._client.play_music(value)
-        self._attr_native_value = value
-        self.async_write_ha_state()
+            await self._async_act(partial(self._device.play_music, value), value)
@@ -0,0 +1,285 @@
+"""Per-phase request tracing for Xiaozhi relays."""
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import time
+from types import SimpleNamespace
+from typing import Any
+
+import aiohttp
+
+from .const import TRACE_BUFFER_SIZE
+
+# The command whose HTTP requests are being traced in the current task
+_current: ContextVar[CommandTrace | None] = ContextVar(
+    "xiaozhi_command_trace", default=None
+)
+
+
+def _ms(seconds: float) -> float:
+    """Return seconds as milliseconds rounded for display."""
+    return round(seconds * 1000, 1)
+
+
+class RequestTrace:
+    """Phase timings of one HTTP request made for a command."""
+
+    __slots__ = (
+        "url",
+        "start",
+        "pool_wait",
+        "dns",
+        "connect",
+        "send",
+        "server",
+        "read",
+        "end",
+        "reused",
+        "error",
+        "_mark",
+    )
+
+    def __init__(self, url: str, start: float) -> None:
+        """Initialize the trace."""
+        self.url = url
+        self.start = start
+        self.pool_wait = 0.0
+        self.dns = 0.0
+        self.connect = 0.0
+        self.send = 0.0
+        self.server = 0.0
+        self.read = 0.0
+        self.end: float | None = None
+        self.reused = False
+        self.error: str | None = None
+        # When the phase in progress started
+        self._mark = start
+
+    def lap(self) -> float:
+        """Return the time since the last mark and move the mark to now."""
+        now = time.monotonic()
+        elapsed = now - self._mark
+        self._mark = now
+        return elapsed
+
+    def as_dict(self, origin: float) -> dict[str, Any]:
+        """Return the phases in milliseconds, timed from the command's start."""
+        return {
+            "url": self.url,
+            "at_ms": _ms(self.start - origin),
+            "reused_connection": self.reused,
+            "pool_wait_ms": _ms(self.pool_wait),
+            "dns_ms": _ms(self.dns),
+            "connect_ms": _ms(self.connect),
+            "send_ms": _ms(self.send),
+            "server_ms": _ms(self.server),
+            "read_ms": _ms(self.read),
+            "total_ms": None if self.end is None else _ms(self.end - self.start),
+            "error": self.error,
+        }
+
+
+class CommandTrace:
+    """One command sent for a device and the HTTP requests it took."""
+
+    __slots__ = (
+        "device_id",
+        "endpoint",
+        "started",
+        "start",
+        "total",
+        "code",
+        "requests",
+    )
+
+    def __init__(self, device_id: str, endpoint: str) -> None:
+        """Initialize the trace."""
+        self.device_id = device_id
+        self.endpoint = endpoint
+        self.started = datetime.now(timezone.utc)
+        self.start = time.monotonic()
+        self.total = 0.0
+        self.code: Any = None
+        self.requests: list[RequestTrace] = []
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the command's timings as plain data."""
+        return {
+            "time": self.started.isoformat(),
+            "device_id": self.device_id,
+            "endpoint": self.endpoint,
+            "code": self.code,
+            "total_ms": _ms(self.total),
+            "requests": [request.as_dict(self.start) for request in self.requests],
+        }
+
+
+class XiaozhiTracer:
+    """Time every phase of a relay's HTTP requests and keep the slow ones.
+
+    The trace config is attached to the relay's own session. Each request is
+    tied to the command being sent in the same task, so a command that was
+    retried, failed over or hedged lists every request it made; the time
+    before its first request was spent waiting for the rate limiter or a
+    broadcast barrier. Commands taking at least threshold seconds go into a
+    ring buffer of the last TRACE_BUFFER_SIZE slow commands. Commands sent
+    over a WebSocket only report their total time.
+    """
+
+    def __init__(self, threshold: float) -> None:
+        """Initialize the tracer."""
+        self.threshold = threshold
+        self.traced = 0
+        self.slow: deque[CommandTrace] = deque(maxlen=TRACE_BUFFER_SIZE)
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_request_start.append(self._async_request_start)
+        self.trace_config.on_connection_queued_end.append(self._async_queued_end)
+        self.trace_config.on_dns_resolvehost_start.append(self._async_dns_start)
+        self.trace_config.on_dns_resolvehost_end.append(self._async_dns_end)
+        self.trace_config.on_connection_create_end.append(self._async_connected)
+        self.trace_config.on_connection_reuseconn.append(self._async_reused)
+        self.trace_config.on_request_chunk_sent.append(self._async_sent)
+        self.trace_config.on_request_end.append(self._async_request_end)
+        self.trace_config.on_response_chunk_received.append(self._async_read)
+        self.trace_config.on_request_exception.append(self._async_request_exception)
+
+    @contextmanager
+    def trace(self, device_id: str, endpoint: str) -> Iterator[CommandTrace]:
+        """Trace the requests made while sending one command."""
+        command = CommandTrace(device_id, endpoint)
+        token = _current.set(command)
+        try:
+            yield command
+        finally:
+            _current.reset(token)
+            command.total = time.monotonic() - command.start
+            self.traced += 1
+            if command.total >= self.threshold:
+                self.slow.append(command)
+
+    def clear(self) -> None:
+        """Forget the slow commands collected so far."""
+        self.slow.clear()
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the slow commands, slowest first, for diagnostics."""
+        return {
+            "threshold_ms": _ms(self.threshold),
+            "traced": self.traced,
+            "slow_requests": [
+                command.as_dict()
+                for command in sorted(
+                    self.slow, key=lambda command: command.total, reverse=True
+                )
+            ],
+        }
+
+    @staticmethod
+    async def _async_request_start(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceRequestStartParams,
+    ) -> None:
+        """Start timing a request if it was made for a traced command."""
+        context.request = None
+        if (command := _current.get()) is not None:
+            context.request = RequestTrace(str(params.url), time.monotonic())
+            command.requests.append(context.request)
+
+    @staticmethod
+    async def _async_queued_end(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceConnectionQueuedEndParams,
+    ) -> None:
+        """Record the wait for a free connection in the pool."""
+        if (request := context.request) is not None:
+            request.pool_wait += request.lap()
+
+    @staticmethod
+    async def _async_dns_start(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceDnsResolveHostStartParams,
+    ) -> None:
+        """Count the time before DNS resolution as part of connecting."""
+        if (request := context.request) is not None:
+            request.connect += request.lap()
+
+    @staticmethod
+    async def _async_dns_end(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceDnsResolveHostEndParams,
+    ) -> None:
+        """Record the DNS lookup."""
+        if (request := context.request) is not None:
+            request.dns += request.lap()
+
+    @staticmethod
+    async def _async_connected(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceConnectionCreateEndParams,
+    ) -> None:
+        """Record opening a new connection, including any TLS handshake."""
+        if (request := context.request) is not None:
+            request.connect += request.lap()
+
+    @staticmethod
+    async def _async_reused(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceConnectionReuseconnParams,
+    ) -> None:
+        """Note that a keep-alive connection was reused."""
+        if (request := context.request) is not None:
+            request.reused = True
+            request.connect += request.lap()
+
+    @staticmethod
+    async def _async_sent(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceRequestChunkSentParams,
+    ) -> None:
+        """Record writing the request body."""
+        if (request := context.request) is not None:
+            request.send += request.lap()
+
+    @staticmethod
+    async def _async_request_end(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceRequestEndParams,
+    ) -> None:
+        """Record the wait for the relay's response headers."""
+        if (request := context.request) is not None:
+            request.server += request.lap()
+            request.end = time.monotonic()
+
+    @staticmethod
+    async def _async_read(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceResponseChunkReceivedParams,
+    ) -> None:
+        """Record reading the response body."""
+        if (request := context.request) is not None:
+            request.read += request.lap()
+            request.end = time.monotonic()
+
+    @staticmethod
+    async def _async_request_exception(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceRequestExceptionParams,
+    ) -> None:
+        """Record why a request failed."""
+        if (request := context.request) is not None:
+            request.error = repr(params.exception)
+            request.end = time.monotonic()
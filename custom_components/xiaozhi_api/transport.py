@@ -0,0 +1,277 @@
+"""Transports carrying commands to Xiaozhi relays."""
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+import asyncio
+from collections.abc import Callable
+import json
+import logging
+from typing import Any
+
+import aiohttp
+from aiohttp import hdrs
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from .const import (
+    API_WEBSOCKET,
+    CODE_BAD_RESPONSE,
+    MAX_RESPONSE_BYTES,
+    RESPONSE_SNIPPET_LENGTH,
+    WEBSOCKET_HEARTBEAT,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_LOGGER = logging.getLogger(__name__)
+
+json_loads: Callable[[bytes | str], Any]
+if orjson is not None:
+    json_dumps: Callable[[Any], bytes] = orjson.dumps
+    json_loads = orjson.loads
+else:
+
+    def json_dumps(data: Any) -> bytes:
+        """Encode data as compact UTF-8 JSON."""
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+    json_loads = json.loads
+
+
+class XiaozhiTransport(ABC):
+    """How a command travels to a relay URL and its answer comes back."""
+
+    @abstractmethod
+    async def async_request(
+        self,
+        base_url: str,
+        endpoint: str,
+        data: dict[str, Any],
+        timeout: aiohttp.ClientTimeout,
+    ) -> dict[str, Any]:
+        """Send a command and return the relay's decoded answer.
+
+        Raises asyncio.TimeoutError or aiohttp.ClientError when the relay
+        gives no answer; aiohttp.ClientConnectorError means the command
+        cannot have reached it.
+        """
+
+    async def async_connect(self, base_url: str) -> bool:
+        """Open a persistent connection ahead of a burst of commands.
+
+        Returns False if the transport does not keep one.
+        """
+        return False
+
+    # Deliberately not abstract: transports without connections keep this
+    async def async_close(self) -> None:  # noqa: B027
+        """Close any persistent connections."""
+
+
+class XiaozhiHttpTransport(XiaozhiTransport):
+    """One HTTP POST per command over the session's keep-alive pool.
+
+    Endpoint URLs are parsed once per relay URL and the headers once per
+    transport. Bodies are encoded with orjson when it is installed, and
+    answers are read only up to MAX_RESPONSE_BYTES; an answer that is not
+    a JSON object becomes a CODE_BAD_RESPONSE result instead of an error.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, api_key: str) -> None:
+        """Initialize the transport."""
+        self._session = session
+        self._headers = CIMultiDictProxy(
+            CIMultiDict(
+                {
+                    hdrs.AUTHORIZATION: f"Bearer {api_key}",
+                    hdrs.CONTENT_TYPE: "application/json",
+                }
+            )
+        )
+        self._urls: dict[str, dict[str, URL]] = {}
+
+    async def async_request(
+        self,
+        base_url: str,
+        endpoint: str,
+        data: dict[str, Any],
+        timeout: aiohttp.ClientTimeout,
+    ) -> dict[str, Any]:
+        """Post a command and return the decoded response."""
+        if (urls := self._urls.get(base_url)) is None:
+            urls = self._urls[base_url] = {}
+        if (url := urls.get(endpoint)) is None:
+            url = urls[endpoint] = URL(f"{base_url}{endpoint}")
+        async with self._session.post(
+            url, data=json_dumps(data), headers=self._headers, timeout=timeout
+        ) as response:
+            if response.status >= 500:
+                response.raise_for_status()
+            return await _async_read_result(response)
+
+
+async def _async_read_result(response: aiohttp.ClientResponse) -> dict[str, Any]:
+    """Decode a relay answer without reading more than MAX_RESPONSE_BYTES."""
+    code = response.status if response.status >= 400 else CODE_BAD_RESPONSE
+    if (length := response.content_length) is not None:
+        if length > MAX_RESPONSE_BYTES:
+            return {"code": code, "message": f"Response too large ({length} bytes)"}
+        body = await response.read()
+    else:
+        body = bytearray()
+        async for chunk in response.content.iter_any():
+            body += chunk
+            if len(body) > MAX_RESPONSE_BYTES:
+                return {"code": code, "message": "Response too large"}
+    # The raw header is much cheaper than the parsed content_type property
+    if "application/json" in response.headers.get(hdrs.CONTENT_TYPE, "").lower():
+        try:
+            result = json_loads(body)
+        except ValueError:
+            pass
+        else:
+            if isinstance(result, dict):
+                return result
+    snippet = body[:RESPONSE_SNIPPET_LENGTH].decode("utf-8", "replace")
+    return {"code": code, "message": f"Unexpected response: {snippet}"}
+
+
+class _Connection:
+    """An open WebSocket and the requests waiting for an answer on it."""
+
+    __slots__ = ("socket", "pending", "reader")
+
+    def __init__(self, socket: aiohttp.ClientWebSocketResponse) -> None:
+        """Initialize the connection."""
+        self.socket = socket
+        self.pending: dict[int, asyncio.Future[dict[str, Any]]] = {}
+        self.reader: asyncio.Task[None] | None = None
+
+
+class XiaozhiWebSocketTransport(XiaozhiTransport):
+    """Send commands over one persistent WebSocket per relay URL.
+
+    Each command is a JSON message {"id", "endpoint", "data"} and the relay
+    answers {"id", "code", "message"}, in any order, so commands for every
+    device share the connection without waiting for each other. The socket
+    is opened on first use and again after it drops; requests in flight
+    when it drops fail as disconnected.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, api_key: str) -> None:
+        """Initialize the transport."""
+        self._session = session
+        self._headers = {"Authorization": f"Bearer {api_key}"}
+        self._connections: dict[str, _Connection] = {}
+        self._connecting: dict[str, asyncio.Future[_Connection]] = {}
+        self._next_id = 0
+
+    async def async_request(
+        self,
+        base_url: str,
+        endpoint: str,
+        data: dict[str, Any],
+        timeout: aiohttp.ClientTimeout,
+    ) -> dict[str, Any]:
+        """Send a command on the relay URL's socket and wait for its answer."""
+        return await asyncio.wait_for(
+            self._async_request(base_url, endpoint, data), timeout.total
+        )
+
+    async def _async_request(
+        self, base_url: str, endpoint: str, data: dict[str, Any]
+    ) -> dict[str, Any]:
+        """Send a command and wait for the answer carrying its id."""
+        connection = await self._async_connection(base_url)
+        self._next_id += 1
+        request_id = self._next_id
+        future: asyncio.Future[dict[str, Any]] = (
+            asyncio.get_running_loop().create_future()
+        )
+        connection.pending[request_id] = future
+        try:
+            await connection.socket.send_str(
+                json_dumps(
+                    {"id": request_id, "endpoint": endpoint, "data": data}
+                ).decode()
+            )
+            return await future
+        except ConnectionResetError as err:
+            raise aiohttp.ServerDisconnectedError(str(err)) from err
+        finally:
+            connection.pending.pop(request_id, None)
+
+    async def async_connect(self, base_url: str) -> bool:
+        """Open the relay URL's socket unless it is already open."""
+        await self._async_connection(base_url)
+        return True
+
+    async def _async_connection(self, base_url: str) -> _Connection:
+        """Return the open connection to a relay URL, opening it if needed.
+
+        Concurrent callers share a single connection attempt.
+        """
+        connection = self._connections.get(base_url)
+        if connection is not None and not connection.socket.closed:
+            return connection
+        if (connecting := self._connecting.get(base_url)) is None:
+            connecting = self._connecting[base_url] = asyncio.ensure_future(
+                self._async_open(base_url)
+            )
+            connecting.add_done_callback(
+                lambda _: self._connecting.pop(base_url, None)
+            )
+        return await asyncio.shield(connecting)
+
+    async def _async_open(self, base_url: str) -> _Connection:
+        """Open a socket to a relay URL and start reading its answers."""
+        socket = await self._session.ws_connect(
+            f"{base_url}{API_WEBSOCKET}",
+            headers=self._headers,
+            heartbeat=WEBSOCKET_HEARTBEAT,
+        )
+        connection = self._connections[base_url] = _Connection(socket)
+        connection.reader = asyncio.get_running_loop().create_task(
+            self._async_read(base_url, connection)
+        )
+        _LOGGER.debug("Opened WebSocket to %s", base_url)
+        return connection
+
+    async def _async_read(self, base_url: str, connection: _Connection) -> None:
+        """Hand each answer to the request with the same id."""
+        try:
+            async for message in connection.socket:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                try:
+                    answer = message.json(loads=json_loads)
+                    future = connection.pending.pop(answer.pop("id"), None)
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    _LOGGER.warning(
+                        "Ignoring malformed relay message: %s", message.data
+                    )
+                    continue
+                if future is not None and not future.done():
+                    future.set_result(answer)
+        finally:
+            if self._connections.get(base_url) is connection:
+                del self._connections[base_url]
+            for future in connection.pending.values():
+                if not future.done():
+                    future.set_exception(
+                        aiohttp.ServerDisconnectedError("WebSocket closed")
+                    )
+            connection.pending.clear()
+            _LOGGER.debug("WebSocket to %s closed", base_url)
+
+    async def async_close(self) -> None:
+        """Close every socket."""
+        for connecting in list(self._connecting.values()):
+            connecting.cancel()
+        for connection in list(self._connections.values()):
+            await connection.socket.close()
+            if connection.reader is not None:
+                await connection.reader
@@ -0,0 +1 @@
+"""Tests for the Xiaozhi API integration."""
@@ -0,0 +1,28 @@
+"""Fixtures for the Xiaozhi API integration tests."""
+from __future__ import annotations
+
+from collections.abc import Generator
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from custom_components.xiaozhi_api.transport import XiaozhiHttpTransport
+
+pytest_plugins = "pytest_homeassistant_custom_component"
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations):
+    """Load the integration from custom_components/ in every test."""
+    yield
+
+
+@pytest.fixture
+def relay_request() -> Generator[AsyncMock, None, None]:
+    """Answer every relay command with success; calls are (url, endpoint, data)."""
+    with patch.object(
+        XiaozhiHttpTransport,
+        "async_request",
+        AsyncMock(return_value={"code": 200, "message": "success"}),
+    ) as request:
+        yield request
@@ -0,0 +1,97 @@
+"""Tests for the local music queue."""
+from __future__ import annotations
+
+from datetime import timedelta
+from unittest.mock import AsyncMock
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_fire_time_changed,
+)
+from pytest_homeassistant_custom_component.test_util.aiohttp import (
+    AiohttpClientMocker,
+)
+
+from custom_components.xiaozhi_api.const import (
+    API_PLAY_MUSIC,
+    CONF_API_KEY,
+    CONF_API_URL,
+    CONF_DEVICE_ID,
+    CONF_DEVICE_NAME,
+    DOMAIN,
+)
+
+API_URL = "http://relay.local/Xiaozhi"
+ENTITY_ID = "text.speaker_play_music"
+
+
+async def _async_setup(
+    hass: HomeAssistant, aioclient_mock: AiohttpClientMocker
+) -> MockConfigEntry:
+    """Set up one device on a relay that answers the reachability check."""
+    aioclient_mock.get(API_URL, text="")
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            CONF_API_URL: API_URL,
+            CONF_API_KEY: "key",
+            CONF_DEVICE_ID: "00:11:22:33:44:55",
+            CONF_DEVICE_NAME: "Speaker",
+        },
+        options={"coalesce_window": 0},
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    return entry
+
+
+async def _async_enqueue(
+    hass: HomeAssistant, keywords: str, duration: int | None = None
+) -> None:
+    """Queue a song on the test device."""
+    data = {"device_id": "all", "keywords": keywords}
+    if duration is not None:
+        data["duration"] = duration
+    await hass.services.async_call(DOMAIN, "enqueue_music", data, blocking=True)
+
+
+def _played(relay_request: AsyncMock) -> list[str]:
+    """Return the songs sent to the relay, in order."""
+    return [
+        call.args[2]["keywords"]
+        for call in relay_request.call_args_list
+        if call.args[1] == API_PLAY_MUSIC
+    ]
+
+
+async def test_queue_survives_reload(
+    hass: HomeAssistant,
+    aioclient_mock: AiohttpClientMocker,
+    relay_request: AsyncMock,
+) -> None:
+    """The queue and the song playing are kept across an entry reload."""
+    entry = await _async_setup(hass, aioclient_mock)
+    await _async_enqueue(hass, "first", 600)
+    await _async_enqueue(hass, "second")
+    state = hass.states.get(ENTITY_ID)
+    assert state.attributes["now_playing"] == "first"
+    assert state.attributes["queue"] == ["second"]
+
+    assert await hass.config_entries.async_reload(entry.entry_id)
+    await hass.async_block_till_done()
+
+    state = hass.states.get(ENTITY_ID)
+    assert state.attributes["now_playing"] == "first"
+    assert state.attributes["queue"] == ["second"]
+
+    # The restored song's duration still starts the next one
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=601))
+    await hass.async_block_till_done()
+
+    state = hass.states.get(ENTITY_ID)
+    assert state.attributes["now_playing"] == "second"
+    assert state.attributes["queue"] == []
+    assert _played(relay_request) == ["first", "second"]